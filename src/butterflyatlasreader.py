@@ -20,19 +20,20 @@ limitations under the License.
 """
 
 import argparse
-from skimage.io import imread
-import matplotlib.pyplot as plt
-import pandas as pd
 import re
 from pathlib import PurePath, Path
-from wand.image import Image
-import numpy as np
 
 from labelreader.ocr import tesseract
+from labelreader.util.sink import RecordSink
+from labelreader.util.inputs import iterinputs, natsortkey
+from labelreader.util.debugimages import DebugImages
+from labelreader.util.pdfpages import iterpages
 #from labelreader.util.util import checkfilepath
 
 
 def empty_dataframe():
+    import pandas as pd  # Deferred: slow to import
+
     record = pd.DataFrame({
         "Sub-Order": [],
         "Super-Family": [],
@@ -170,10 +171,10 @@ class TaxonTreeParser():
         """Parse table content
 
             ocrtext: list of lists of strings to be parsed
-            Return df, taxon_tree: A Pandas dataframe with parsed data and the current taxon_tree dictionary containing
-                                   the state of the parser.
+            Return records: A list of dictionaries with parsed data - one for each species line. The state of the
+                            parser is kept in the taxon_tree_dict attribute.
         """
-        df = empty_dataframe()
+        records = []
 
         # Loop over lines in ocrtext
         for line in ocrtext:
@@ -206,15 +207,15 @@ class TaxonTreeParser():
                 if "Genus" in self.taxon_tree_dict:
                     level5 = self.taxon_tree_dict["Genus"]
 
-                record = pd.DataFrame({
-                            "Sub-Order": [level1],
-                            "Super-Family": [level2],
-                            "Family": [level3],
-                            "Sub-Family": [level4],
-                            "Genus": [level5],
-                            "Species": [species]
-                })
-                df = pd.concat([df, record], axis=0, ignore_index=True)
+                record = {
+                            "Sub-Order": level1,
+                            "Super-Family": level2,
+                            "Family": level3,
+                            "Sub-Family": level4,
+                            "Genus": level5,
+                            "Species": species
+                }
+                records.append(record)
             else:
                 #  Else reset taxon_tree = dict() and read other fields in order
 
@@ -279,16 +280,31 @@ class TaxonTreeParser():
                     if not (readingDoubleLineFamilyName or readingDoubleLineGenusName):
                         print("Line not processed = '" + linetext + "'")
 
-        return df
+        return records
 
 
 
 
-def process_image(img, no_pages, args, ocrreader, master_table, taxon_tree):
-    """Parse one image and create a row in the master_table"""
-    if args["verbose"]:
-        plt.figure()
-        plt.imshow(img)
+def pagenumber(imgfilename):
+    """Page number of a scanned page, which is the fourth field of the file name separated by '_'"""
+    return int(Path(imgfilename).name.split('_')[3])
+
+
+def pagesortkey(name):
+    """Sort key that orders scanned pages by page number, since the taxon tree continues from page to page.
+       Names without a page number are sorted after the pages in natural sort order."""
+    try:
+        return (0, pagenumber(name)), natsortkey(name)
+    except (IndexError, ValueError):
+        return (1, 0), natsortkey(name)
+
+
+def process_image(img, no_pages, args, ocrreader, sink, taxon_tree, debug=None, name=""):
+    """Parse one image and append the rows to the sink. If debug is given and selects the image, the image and
+       the half page that is OCR'ed are written as debug images named after name."""
+    writedebug = debug is not None and debug.select()
+    if writedebug:
+        debug.save(name, "image", img)
 
     # Remove right half of the image
     (_, width, _) = img.shape
@@ -300,9 +316,8 @@ def process_image(img, no_pages, args, ocrreader, master_table, taxon_tree):
         #imghalf = img[900:10800, 0:int(width*0.45)]
         imghalf = img[500:5400, 0:int(width * 0.44), :]
 
-    if args["verbose"]:
-        plt.figure()
-        plt.imshow(imghalf)
+    if writedebug:
+        debug.save(name, "half", imghalf)
 
     ocrreader.read_image(imghalf)
 
@@ -312,12 +327,13 @@ def process_image(img, no_pages, args, ocrreader, master_table, taxon_tree):
         for i in range(len(ocrtext)):
             print(ocrtext[i])
 
-    df = taxon_tree.parsetable(ocrtext)
+    records = taxon_tree.parsetable(ocrtext)
 
     # Add to master table
-    master_table = pd.concat([master_table, df], axis=0, ignore_index=True)
+    for record in records:
+        sink.append(record)
 
-    return master_table, taxon_tree
+    return taxon_tree
 
 
 
@@ -328,7 +344,8 @@ def main():
     ap.add_argument("-t", "--tesseract", required=True,
                     help="path to tesseract executable")
     ap.add_argument("-i", "--image", required=True, action="extend", nargs="+", type=str,
-                    help="file name for and path to input image")
+                    help="input image files, directories, glob patterns (quote these) or @ followed by a file with "
+                         "one input per line. Files in directories are taken in page number order")
     ap.add_argument("-o", "--output", required=False, default="../output/output.xlsx",
                     help="path and filename for Excel spreadsheet to write result to.")
     ap.add_argument("-l", "--language", required=False, default="deu",
@@ -336,7 +353,12 @@ def main():
     ap.add_argument("-r", "--resolution", required=False, default=600, type=int,
                     help="Set resolution in DPI of scanned images - used for rendering pdf pages so only relevant for PDF files")
     ap.add_argument("-v", "--verbose", required=False, action='store_true', default=False,
-                    help="If set the program is verbose and will print out debug information")
+                    help="If set the program is verbose and will print out debug information and write debug images")
+    ap.add_argument("--debug-dir", required=False, default=None,
+                    help="directory to write downscaled page images to. Implied by --verbose with the default "
+                         "debug directory next to the Excel spreadsheet")
+    ap.add_argument("--debug-every", required=False, default=1, type=int,
+                    help="only write debug images for every Nth page. Default=1")
 
     args = vars(ap.parse_args())
 
@@ -346,44 +368,54 @@ def main():
     # Initialize the OCR reader object
     ocrreader = tesseract.OCR(args["tesseract"], args["language"], config='--psm 6 -c preserve_interword_spaces=1 --dpi ' + str(args["resolution"]))
 
-    master_table = empty_dataframe()
+    # Records are appended to a JSON lines file next to the Excel sheet as soon as they are ready
+    sink = RecordSink(Path(args["output"]).with_suffix(".jsonl"), columns=empty_dataframe().columns)
+
     #taxon_tree = dict() # Initialize with an empty dictionary representing the taxon tree
     taxon_tree = TaxonTreeParser()
 
+    # Debug images are written to disk as they are produced instead of being kept for display
+    debug = None
+    if args["verbose"] or args["debug_dir"] is not None:
+        debugdir = args["debug_dir"] if args["debug_dir"] is not None else Path(args["output"]).parent.joinpath("debug")
+        debug = DebugImages(debugdir, every=args["debug_every"])
+
+    from skimage.io import imread  # Deferred: slow to import
+
     # Loop over a directory of images
     no_img = 0  # Count number of images
-    for imgfilename in args["image"]:
+    for imgfilename in iterinputs(args["image"], key=pagesortkey):
         print("Transcribing " + imgfilename)
         no_img += 1
         # Check if it is a pdf file
         if Path(imgfilename).suffix == '.pdf':
             print("Reading pages in a pdf file")
-            with Image(filename=imgfilename, resolution=args["resolution"]) as img_wand_all:
-                no_pages = 0
-                # Read all pages
-                for img_wand in img_wand_all.sequence:
-                    img = np.array(img_wand)
-                    no_pages += 1
-                    print("Processing page " + str(no_pages))
-                    master_table, taxon_tree = process_image(img, no_pages, args, ocrreader, master_table, taxon_tree)
+            # The pages are rendered one at a time into the same array
+            for no_pages, img in iterpages(imgfilename, args["resolution"]):
+                print("Processing page " + str(no_pages))
+                taxon_tree = process_image(img, no_pages, args, ocrreader, sink, taxon_tree, debug,
+                                           Path(imgfilename).stem + "_page" + str(no_pages))
         elif Path(imgfilename).suffix == '.tif':
-            no_pages = int(imgfilename.split('_')[3])
+            no_pages = pagenumber(imgfilename)
             # Read image file
             img = imread(imgfilename, plugin='pil')
-            master_table, taxon_tree = process_image(img, no_pages, args, ocrreader, master_table, taxon_tree)
+            taxon_tree = process_image(img, no_pages, args, ocrreader, sink, taxon_tree, debug,
+                                       Path(imgfilename).stem)
         else:
-            no_pages = int(imgfilename.split('_')[3])
+            no_pages = pagenumber(imgfilename)
             # Read image file
             img = imread(imgfilename)
-            master_table, taxon_tree = process_image(img, no_pages, args, ocrreader, master_table, taxon_tree)
+            taxon_tree = process_image(img, no_pages, args, ocrreader, sink, taxon_tree, debug,
+                                       Path(imgfilename).stem)
+
 
+    sink.close()
 
     # Write Excel sheet to disk
-    master_table.to_excel(PurePath(args["output"]).as_posix(), index=False)
+    sink.to_excel(PurePath(args["output"]).as_posix())
 
-    # If verbose mode then show all opened figures
-    if args["verbose"]:
-        plt.show()
+    if debug is not None:
+        print("Wrote " + str(debug.count) + " debug images to " + str(debug.directory))
 
 
 if __name__ == '__main__':
@@ -20,23 +20,39 @@ limitations under the License.
 """
 
 import argparse
-from skimage.io import imread, imsave
-import pandas as pd
+import functools
+import os
 import re
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from wand.image import Image
-import numpy as np
 import lark
 import datetime
 
 
 from labelreader.ocr import tesseract
-from labelreader.util.util import checkfilepath
+from labelreader.ocr.triage import BlankTriage
+from labelreader.util.util import FilenameAllocator
+from labelreader.util.sink import RecordSink
+from labelreader.util.manifest import RunManifest, filehash
+from labelreader.util.jobqueue import JobQueue, QueueWorker, shard_units
+from labelreader.util.inputs import iterinputs
+from labelreader.util.attachments import AttachmentWriter, CODECS, save_tiff
 from labelreader.taxonchecker import gbiftaxonchecker
+from labelreader.taxonchecker.resolver import TaxonResolver
+from labelreader.grammars import grammars
 from labelreader.util.util import parseromandate
+from labelreader.util.timelimit import time_limit, TimeLimitExceeded
+from labelreader.util.pdfpages import iterpages, pagecount
+from labelreader.util.pipeline import ordered_map
+
+
+# Per process state of the worker processes - set by init_worker
+worker_state = dict()
 
 
 def empty_dataframe():
+    import pandas as pd  # Deferred: slow to import
+
     record = pd.DataFrame({
         "Alt Cat Number": [],
         "Other Remarks": [],
@@ -54,7 +70,8 @@ def empty_dataframe():
         "Date": [],
         "Parsed date DD-MM-YYYY": [],
         "Date range": [],
-        "Attachment": []
+        "Attachment": [],
+        "Parse status": []
     })
     return record
 
@@ -105,6 +122,90 @@ def clean_catalogue_number(text: str) -> str:
 
 
 
+def parse_romandate(date: str) -> str:
+    """Return a date with the month in roman numerals in the format DD-MM-YYYY.
+
+        date: String with the date, e.g. 16-V-1905
+        Return: The parsed date
+    """
+    # Remove OCR errors
+    date = re.sub(r"[ \.,…\-/]+", "-", date)
+
+    return parseromandate(date, sep=r"-")
+
+
+def parse_dmydate(date: str) -> str:
+    """Return a date given as day, month and year in numbers in the format DD-MM-YYYY.
+
+        date: String with the date, e.g. 28.06.1994
+        Return: The parsed date or an empty string if it could not be parsed
+    """
+    # Split into Day, Month, Year parts
+    parts = re.split(r"[ .,/-]{1}", date)
+    if len(parts) == 3:
+        day = parts[0]
+        month = parts[1]
+        year = parts[2]
+    else:
+        day = "00"
+        month = "00"
+        year = "0000"
+
+    try:
+        parsed_date = "%02d" % int(day) + "-" + "%02d" % int(month) + "-" + "%04d" % int(year)
+    except ValueError:
+        parsed_date = ""
+    return parsed_date
+
+
+def parse_monthnamedate(day: str, month: str, year: str) -> tuple:
+    """Return a date with the month name and the date in the format DD-MM-YYYY.
+
+        day: String with the day or an empty string
+        month: String with the month name, e.g. Jan.
+        year: String with the year
+        Return: Tuple with the date and the parsed date, which is an empty string if it could not be parsed
+    """
+    date = ""
+    if len(day) != 0:
+        date += day + " "
+    if len(month) != 0:
+        date += month + " "
+    date += year
+
+    # Parse the month name
+    month_map = {"januar": "01", "january": "01",  "jan": "01",
+                 "februar": "02", "february": "02", "feb": "02",
+                 "marts": "03", "march": "03", "mar": "03",
+                 "april": "04",
+                 "maj": "05", "may": "05",
+                 "juni": "06", "june": "06",
+                 "juli": "07", "july": "07",
+                 "august": "08", "aug": "08",
+                 "september": "09", "sep": "09",
+                 "oktober": "10", "october": "10", "okt": "10", "oct": "10",
+                 "november": "11", "nov": "11", "novbr": "11",
+                 "december": "12", "dec": "12"
+                 }
+
+    month = re.sub(r"[.,]", "", month).lower()
+    if month in month_map:
+        month_num = month_map[month]
+    else:
+        month_num = "00"
+
+    try:
+        parsed_date = ""
+        if len(day) != 0:
+            parsed_date += "%02d" % int(day) + "-"
+        else:
+            parsed_date += "00-"
+        parsed_date += month_num + "-" + "%04d" % int(year)
+    except ValueError:
+        parsed_date = ""
+    return date, parsed_date
+
+
 class CSADVisitor(lark.Visitor):
     def  __init__(self):
         super().__init__()
@@ -205,10 +306,7 @@ class CSADVisitor(lark.Visitor):
         else:
             self.data["date"] = date
 
-        # Remove OCR errors
-        date = re.sub(r"[ \.,…\-/]+", "-", date)
-
-        parsed_date  = parseromandate(date, sep=r"-")
+        parsed_date = parse_romandate(date)
         if "parsed_date" in self.data:
             self.data["parsed_date"] += ";" + parsed_date
         else:
@@ -242,21 +340,7 @@ class CSADVisitor(lark.Visitor):
         else:
             self.data["date"] = date
 
-        # Split into Day, Month, Year parts
-        parts = re.split(r"[ .,/-]{1}", date)
-        if len(parts) == 3:
-            day = parts[0]
-            month = parts[1]
-            year = parts[2]
-        else:
-            day = "00"
-            month = "00"
-            year = "0000"
-
-        try:
-            parsed_date = "%02d" % int(day) + "-" + "%02d" % int(month) + "-" + "%04d" % int(year)
-        except ValueError:
-            parsed_date = ""
+        parsed_date = parse_dmydate(date)
 
         if "parsed_date" in self.data:
             self.data["parsed_date"] += ";" + parsed_date
@@ -265,56 +349,17 @@ class CSADVisitor(lark.Visitor):
 
 
     def monthnamedate(self, tree):
-        date = ""
         day = ""
         if len(tree.children) == 3:
             day = str(tree.children[0])
 
-        month = str(tree.children[-2])
-        year = str(tree.children[-1])
-
-        if len(day) != 0:
-            date += day + " "
-        if len(month) != 0:
-            date += month + " "
-        date += year
+        date, parsed_date = parse_monthnamedate(day, str(tree.children[-2]), str(tree.children[-1]))
 
         if "date" in self.data:
             self.data["date"] += ";" + date
         else:
             self.data["date"] = date
 
-        # Parse the month name
-        month_map = {"januar": "01", "january": "01",  "jan": "01",
-                     "februar": "02", "february": "02", "feb": "02",
-                     "marts": "03", "march": "03", "mar": "03",
-                     "april": "04",
-                     "maj": "05", "may": "05",
-                     "juni": "06", "june": "06",
-                     "juli": "07", "july": "07",
-                     "august": "08", "aug": "08",
-                     "september": "09", "sep": "09",
-                     "oktober": "10", "october": "10", "okt": "10", "oct": "10",
-                     "november": "11", "nov": "11", "novbr": "11",
-                     "december": "12", "dec": "12"
-                     }
-
-        month = re.sub(r"[.,]", "", month).lower()
-        if month in month_map:
-            month_num = month_map[month]
-        else:
-            month_num = "00"
-
-        try:
-            parsed_date = ""
-            if len(day) != 0:
-                parsed_date += "%02d" % int(day) + "-"
-            else:
-                parsed_date += "00-"
-            parsed_date += month_num + "-" + "%04d" % int(year)
-        except ValueError:
-            parsed_date = ""
-
         if "parsed_date" in self.data:
             self.data["parsed_date"] += ";" + parsed_date
         else:
@@ -323,37 +368,252 @@ class CSADVisitor(lark.Visitor):
 
 
 
-def larkparsetext(ocrtext: str, family: str, checker: gbiftaxonchecker.GBIFTaxonChecker, parser: lark.Lark, args: dict) -> pd.DataFrame:
+class CSADFields(list):
+    """The fields found below a node of the parse tree by CSADTransformer as [depth, field, value] entries, where
+       depth is the number of nodes between the node of the field and the node."""
+
+
+class CSADTransformer(lark.Transformer):
+    """
+        Collect the same fields as CSADVisitor while the cards are parsed, such that no parse tree is built. Use as
+        the inline transformer of an LALR parser, i.e. lark.Lark(..., parser='lalr', transformer=CSADTransformer()),
+        and parse returns the fields as a dictionary like CSADVisitor.data.
+
+        CSADVisitor visits the deepest nodes of the tree first, so the fields are collected in lists with the depth
+        of their node and joined in the order of the visitor when the card has been parsed.
+    """
+
+    # Separators of the values of fields found more than once. catcode and catnumber keep the last value.
+    SEPARATORS = {"genus": " ", "species": " ", "subspecies": " ", "author": " "}
+    LAST = {"catcode", "catnumber"}
+
+    def _collect(self, children):
+        # Nodes without fields pass on the fields found below them
+        fields = CSADFields()
+        for child in children:
+            if isinstance(child, CSADFields):
+                fields.extend([depth + 1, field, value] for depth, field, value in child)
+        return fields
+
+    def __default__(self, data, children, meta):
+        if data.startswith("_"):
+            return lark.Tree(data, children)  # Rules inlined into their parent by the parser
+        return self._collect(children)
+
+    def card(self, children):
+        entries = self._collect(children)
+        entries.sort(key=lambda entry: -entry[0])  # Stable, so nodes at the same depth stay in text order
+
+        data = {}
+        for depth, field, value in entries:
+            if field in self.LAST:
+                data[field] = [value]
+            else:
+                data.setdefault(field, []).append(value)
+        return {field: self.SEPARATORS.get(field, ";").join(values) for field, values in data.items()}
+
+    def _field(self, field, children):
+        return CSADFields([[0, field, str(children[0])]])
+
+    # top_line methods
+    def family(self, children):
+        return self._field("family", children)
+
+    def catcode(self, children):
+        return self._field("catcode", children)
+
+    def catnumber(self, children):
+        return CSADFields([[0, "catnumber", clean_catalogue_number(str(children[0]))]])
+
+    def nodot(self, children):
+        return self._field("nodot", children)
+
+    # taxon_lines methods
+    def genus(self, children):
+        return self._field("genus", children)
+
+    def species(self, children):
+        return self._field("species", children)
+
+    def subspecies(self, children):
+        return self._field("subspecies", children)
+
+    def author(self, children):
+        return self._field("author", children)
+
+    # leg and det methods
+    def person(self, children):
+        return str(children[0])
+
+    def leg(self, children):
+        return CSADFields([[0, "leg", children[1]]])
+
+    def det(self, children):
+        return CSADFields([[0, "det", children[1]]])
+
+    def legdet(self, children):
+        return CSADFields([[0, "leg", children[1]], [0, "det", children[1]]])
+
+    # locality and other methods
+    def locality(self, children):
+        return self._field("locality", children)
+
+    def other(self, children):
+        return self._field("other", children)
+
+    # date methods
+    def daterange(self, children):
+        return self._field("daterange", children)
+
+    def romandate(self, children):
+        date = str(children[0])
+        return CSADFields([[0, "date", date], [0, "parsed_date", parse_romandate(date)]])
+
+    def year(self, children):
+        year = str(children[0])
+        parsed_date = "00-00-" + year
+        if isvaliddate(parsed_date):
+            return CSADFields([[0, "date", year], [0, "parsed_date", parsed_date]])
+        return CSADFields([[0, "other", year]])
+
+    def dmydate(self, children):
+        date = str(children[0])
+        return CSADFields([[0, "date", date], [0, "parsed_date", parse_dmydate(date)]])
+
+    def monthnamedate(self, children):
+        day = str(children[0]) if len(children) == 3 else ""
+        date, parsed_date = parse_monthnamedate(day, str(children[-2]), str(children[-1]))
+        return CSADFields([[0, "date", date], [0, "parsed_date", parsed_date]])
+
+
+class LineClassifier:
+    """
+        Classify the lines of a card with the regular expressions of the terminals of the grammar. This is a cheap
+        fallback for cards that take too long to parse. It finds the family, catalogue code and number on the first
+        line and lines starting with a collector, determiner, number or date, and returns them like
+        CSADVisitor.data. The remaining lines are kept as other text.
+    """
+
+    def __init__(self, parser: lark.Lark):
+        self.terminals = {terminal.name: re.compile(terminal.pattern.to_regexp()) for terminal in parser.terminals}
+
+    def _match(self, name, text):
+        if name not in self.terminals:
+            return None
+        return self.terminals[name].match(text)
+
+    def _fullmatch(self, name, text):
+        # The terminal must cover the text apart from trailing punctuation
+        match = self._match(name, text)
+        if match is not None and len(text[match.end():].strip(" .,;:—-")) == 0:
+            return match
+        return None
+
+    def classify(self, text: str) -> dict:
+        """Classify the lines of a card.
+
+            text: The text of the card with one line per card line
+            Return: Dictionary with the fields found, like CSADVisitor.data
+        """
+        data = {}
+
+        def add(field, value):
+            if field in data:
+                data[field] += ";" + value
+            else:
+                data[field] = value
+
+        lines = [line.strip(" .,;:—-|…") for line in text.split("\n")]
+        lines = [line for line in lines if len(line) > 0]
+        if len(lines) == 0:
+            return data
+
+        # The top line has the family and the catalogue number
+        top = lines[0]
+        if "FAMILY" in self.terminals:
+            for match in self.terminals["FAMILY"].finditer(top):
+                add("family", match.group(0))
+        if "CATCODE" in self.terminals:
+            match = self.terminals["CATCODE"].search(top)
+            if match is not None:
+                data["catcode"] = match.group(0)
+                top = top[match.end():]
+        if "CATNUMBER" in self.terminals:
+            match = self.terminals["CATNUMBER"].search(top)
+            if match is not None:
+                data["catnumber"] = clean_catalogue_number(match.group(0))
+
+        for line in lines[1:]:
+            # Collector and determiner
+            for name, fields in [("LEGDET", ["leg", "det"]), ("LEG", ["leg"]), ("DET", ["det"])]:
+                match = self._match(name, line)
+                if match is not None:
+                    person = self._match("PERSON", line[match.end():])
+                    if person is not None:
+                        for field in fields:
+                            add(field, person.group(0))
+                        break
+            else:
+                if self._fullmatch("NODOT", line):
+                    add("nodot", line)
+                    continue
+
+                # Dates, possibly after a date text
+                match = self._match("DATE_TEXT", line)
+                date = line[match.end():].strip() if match is not None else line
+                if self._fullmatch("DATERANGE", date) or self._fullmatch("YEARRANGE", date):
+                    add("daterange", date)
+                elif self._fullmatch("ROMANDATE", date):
+                    add("date", date)
+                    add("parsed_date", parse_romandate(date))
+                elif self._fullmatch("DMYDATE", date):
+                    add("date", date)
+                    add("parsed_date", parse_dmydate(date))
+                elif self._fullmatch("YEAR", date) and isvaliddate("00-00-" + date):
+                    add("date", date)
+                    add("parsed_date", "00-00-" + date)
+                else:
+                    add("other", line)
+        return data
+
+
+def larkparsetext(ocrtext: str, family: str, resolver: TaxonResolver, parser: lark.Lark, args: dict) -> dict:
     """Parses the OCR text from a paper card into appropriate data fields using the Lark parser generator
         and a context-free grammar.
 
        ocrtext: A list of lists of strings - one for each line on the paper card.
        family: A string with the taxonomic family name of the plant
-       checker: A TaxonChecker object
-       Return record: Returns a Pandas data frame with the parsed transcribed data.
+       resolver: A TaxonResolver that checks the taxon name when the results are written. None in the worker
+                 processes, where the main process adds the names of the records to its resolver.
+       parser: The parser of the card text, see create_parser
+       args: The arguments of the script. args["parse_budget"] is the maximum number of seconds used for parsing
+       Return record: Returns a dictionary with the parsed transcribed data. "Parse status" is parsed, timeout if
+                      the lines were classified by LineClassifier because parsing took too long, or error if the
+                      text could not be parsed.
     """
 
     # If ocrtext is empty then stop here!
     if len(ocrtext) == 0:
-        record = pd.DataFrame({
-            "Alt Cat Number": [""],
-            "Other Remarks": [""],
-            "Family": [family],
-            "Genus": [""],
-            "Species": [""],
-            "Subspecies": [""],
-            "Author name": [""],
-            "Scientific name": [""],
-            "GBIF checked scientific name": [""],
-            "Determiner": [""],
-            "Collector": [""],
-            "Number": [""],
-            "Locality": [""],
-            "Date": [""],
-            "Parsed date DD-MM-YYYY": [""],
-            "Date range": [""],
-            "Attachment": [""]
-        })
+        record = {
+            "Alt Cat Number": "",
+            "Other Remarks": "",
+            "Family": family,
+            "Genus": "",
+            "Species": "",
+            "Subspecies": "",
+            "Author name": "",
+            "Scientific name": "",
+            "GBIF checked scientific name": "",
+            "Determiner": "",
+            "Collector": "",
+            "Number": "",
+            "Locality": "",
+            "Date": "",
+            "Parsed date DD-MM-YYYY": "",
+            "Date range": "",
+            "Attachment": "",
+            "Parse status": ""
+        }
         return record
 
     # Initialize variables
@@ -382,116 +642,340 @@ def larkparsetext(ocrtext: str, family: str, checker: gbiftaxonchecker.GBIFTaxon
                 text += elem + " "
         text += "\n"
 
+    status = "parsed"
     try:
-        # Create the parse tree
-        ptree = parser.parse(text)
-
-        # Process the parse tree
-        visitor  = CSADVisitor()
-        visitor.visit(ptree)
-        if args["verbose"]:
-            print(visitor.data)
-            print(ptree.pretty())
-
-        # Extract the data from the visitor
-        if "catcode" in visitor.data:
-            alt_cat_number += visitor.data["catcode"]
-        if "catnumber" in visitor.data:
-            alt_cat_number += visitor.data["catnumber"]
-        if "family" in visitor.data:
-            family = visitor.data["family"].lower().capitalize()
-        if "genus" in visitor.data:
-            genus = visitor.data["genus"].lower().capitalize()
-        if "species" in visitor.data:
-            species = visitor.data["species"].lower()
-        if "subspecies" in visitor.data:
-            subspecies = visitor.data["subspecies"]
-        if "author" in visitor.data:
-            author_name = visitor.data["author"]
-        if "leg" in visitor.data:
-            collector = visitor.data["leg"]
-        if "det" in visitor.data:
-            determiner = visitor.data["det"]
-        if "nodot" in visitor.data:
-            col_number = visitor.data["nodot"]
-        if "locality" in visitor.data:
-            locality = visitor.data["locality"]
-        if "other" in visitor.data:
-            other = visitor.data["other"]
-        if "date" in visitor.data:
-            datetext = visitor.data["date"]
-        if "parsed_date" in visitor.data:
-            parseddate = visitor.data["parsed_date"]
-        if "daterange" in visitor.data:
-            daterange = visitor.data["daterange"]
+        # A parser with CSADTransformer as inline transformer returns the fields, other parsers the parse tree.
+        # Badly OCR'ed cards can take very long to parse, so the lines are classified instead when parsing takes
+        # more than the budget.
+        try:
+            with time_limit(args["parse_budget"]):
+                result = parser.parse(text)
+        except TimeLimitExceeded:
+            print("Parsing took more than " + str(args["parse_budget"]) + " seconds - classifying the lines instead")
+            result = LineClassifier(parser).classify(text)
+            status = "timeout"
+
+        if isinstance(result, dict):
+            data = result
+            if args["verbose"]:
+                print(data)
+        else:
+            # Process the parse tree
+            visitor  = CSADVisitor()
+            visitor.visit(result)
+            data = visitor.data
+            if args["verbose"]:
+                print(data)
+                print(result.pretty())
+
+        # Extract the data found by the visitor or transformer
+        if "catcode" in data:
+            alt_cat_number += data["catcode"]
+        if "catnumber" in data:
+            alt_cat_number += data["catnumber"]
+        if "family" in data:
+            family = data["family"].lower().capitalize()
+        if "genus" in data:
+            genus = data["genus"].lower().capitalize()
+        if "species" in data:
+            species = data["species"].lower()
+        if "subspecies" in data:
+            subspecies = data["subspecies"]
+        if "author" in data:
+            author_name = data["author"]
+        if "leg" in data:
+            collector = data["leg"]
+        if "det" in data:
+            determiner = data["det"]
+        if "nodot" in data:
+            col_number = data["nodot"]
+        if "locality" in data:
+            locality = data["locality"]
+        if "other" in data:
+            other = data["other"]
+        if "date" in data:
+            datetext = data["date"]
+        if "parsed_date" in data:
+            parseddate = data["parsed_date"]
+        if "daterange" in data:
+            daterange = data["daterange"]
 
         # check taxonomic full name
         ocr_taxonname = " ".join([genus, species, author_name])
-        checked_gbif_taxonname = checker.check_full_name(" ".join([genus, species]))
+        checked_gbif_taxonname = None  # Filled in by the resolver when the results are written
+        if resolver is not None:
+            resolver.add(" ".join([genus, species]))
     except lark.UnexpectedInput as e:
         print("Error in parsing:")
         print("\"" + text + "\"\n")
         print(e.get_context(text))
         other = text # Save the misread text in the other field
-
-    record = pd.DataFrame({
-        "Alt Cat Number": [alt_cat_number],
-        "Other Remarks": [other],
-        "Family": [family],
-        "Genus": [genus],
-        "Species": [species],
-        "Subspecies": [subspecies],
-        "Author name": [author_name],
-        "Scientific name": [ocr_taxonname],
-        "GBIF checked scientific name": [checked_gbif_taxonname],
-        "Determiner": [determiner],
-        "Collector": [collector],
-        "Number": [col_number],
-        "Locality": [locality],
-        "Date": [datetext],
-        "Parsed date DD-MM-YYYY": [parseddate],
-        "Date range": [daterange],
-        "Attachment": [""]
-    })
+        status = "error"
+
+    record = {
+        "Alt Cat Number": alt_cat_number,
+        "Other Remarks": other,
+        "Family": family,
+        "Genus": genus,
+        "Species": species,
+        "Subspecies": subspecies,
+        "Author name": author_name,
+        "Scientific name": ocr_taxonname,
+        "GBIF checked scientific name": checked_gbif_taxonname,
+        "Determiner": determiner,
+        "Collector": collector,
+        "Number": col_number,
+        "Locality": locality,
+        "Date": datetext,
+        "Parsed date DD-MM-YYYY": parseddate,
+        "Date range": daterange,
+        "Attachment": "",
+        "Parse status": status
+    }
 
     return record
 
 
-def process_image(img, imgfilename, no_img, no_pages, args, ocrreader, master_table, checker, parser):
-    """Parse one image and create a row in the master_table"""
+# Grammars and Lark options of the parsers that can be selected with --parser. Both create the trees that
+# CSADVisitor expects. The LALR grammar is much faster, but resolves some ambiguous cards differently.
+PARSERS = {
+    "earley": ("csad.lark", {}),
+    "lalr": ("csad_lalr.lark", {"parser": "lalr", "lexer": "contextual"})
+}
 
-    ocrreader.read_image(img)
 
-    ocrtext = ocrreader.get_text()
+def create_parser(kind: str = "earley", use_cache: bool = True, transformer: lark.Transformer = None) -> lark.Lark:
+    """Create the parser of the C-SAD cards from a grammar shipped with labelreader.
+
+       kind: Name of the parser in PARSERS
+       use_cache: If False the parser is created from the grammar and not cached
+       transformer: Inline transformer, e.g. CSADTransformer, applied while parsing instead of building a parse
+                    tree. Only for the lalr parser. The LALR grammar analysis is fast, so these parsers are not cached.
+       Return: The parser
+    """
+    name, options = PARSERS[kind]
+    if transformer is not None:
+        return grammars.load_parser(name, use_cache=False, start='card', transformer=transformer, **options)
+    return grammars.load_parser(name, use_cache=use_cache, start='card', **options)
+
+
+def taxonquery(record):
+    """Return the name that is checked against the GBIF taxon backbone for a record made by larkparsetext"""
+    return " ".join([record["Genus"], record["Species"]])
+
+
+def transcribe_page(img, imgfilename, no_pages, args, ocrreader, resolver, parser, triage):
+    """OCR and parse one page image.
+       Returns a dictionary with the parsed transcribed data without the attachment."""
+
+    blank = triage.isblank(img, Path(imgfilename).name + " page " + str(no_pages))
+    if blank:
+        ocrtext = []  # Skip OCR of blank pages, but still emit the row with the attachment
+    else:
+        ocrreader.read_image(img)
+        ocrtext = ocrreader.get_text()
 
     if args["verbose"]:
         for i in range(len(ocrtext)):
             print(ocrtext[i])
 
     family = Path(imgfilename).stem # Assume that the family name is the filename
-    df = larkparsetext(ocrtext, family, checker, parser, args)
+    record = larkparsetext(ocrtext, family, resolver, parser, args)
+    if blank:
+        record["Parse status"] = "blank"
+    return record
+
+
+def attach(record, write, imgfilename, no_img, no_pages, args, sink, allocator):
+    """Allocate a unique file name for the page image of a record, write the image with write(path) and append
+       the record to the sink. The file names are allocated in page order, also when the pages are transcribed
+       in parallel. Returns the path of the attachment relative to the output directory."""
 
     #  In case of no Alt Cat Number just pick a unique random file name
-    if df["Alt Cat Number"][0] == "":
+    if record["Alt Cat Number"] == "":
         outfilename = Path(imgfilename).stem + "_image" + str(no_img) + "_page" + str(no_pages) + ".tif"
     else:
-        outfilename = df["Alt Cat Number"][0] + ".tif"
+        outfilename = record["Alt Cat Number"] + ".tif"
 
     # Check that filename is unique otherwise create an extension of it to make unique
     outpath = Path(args["output"], Path(imgfilename).stem)
     outfilepath = Path(outpath, outfilename)
-    outfilepath = checkfilepath(outfilepath)
+    outfilepath = allocator.allocate(outfilepath)
     outfilename = outfilepath.name
 
-    imsave(str(outfilepath), img, check_contrast=False, plugin='pil', compression="tiff_lzw",
-           resolution_unit=2, resolution=args["resolution"])
+    write(outfilepath)
 
-    df.at[0, "Attachment"] = outfilename  # Add filename to data record
+    record["Attachment"] = outfilename  # Add filename to data record
 
     # Add to master table
-    master_table = pd.concat([master_table, df], axis=0, ignore_index=True)
+    sink.append(record)
+
+    return str(Path(Path(imgfilename).stem, outfilename))
+
 
-    return master_table
+def process_image(img, imgfilename, no_img, no_pages, args, ocrreader, sink, resolver, parser, triage, writer,
+                  allocator):
+    """Parse one image, append a row to the sink and queue the page image to be written by the writer.
+       Returns the path of the attachment relative to the output directory."""
+    record = transcribe_page(img, imgfilename, no_pages, args, ocrreader, resolver, parser, triage)
+    return attach(record, lambda outfilepath: writer.submit(outfilepath, img, resolution=args["resolution"]),
+                  imgfilename, no_img, no_pages, args, sink, allocator)
+
+
+def create_readers(args):
+    """Create the OCR reader, the blank page detection and the parser used to transcribe the pages.
+
+       args: The arguments of the script
+       Return: Tuple (ocrreader, triage, parser)
+    """
+    # Initialize the OCR reader object
+    ocrreader = tesseract.OCR(args["tesseract"], args["language"], config='--oem 1 --psm 6')
+    #ocrreader = tesseract.OCR(args["tesseract"], args["language"], config='--oem 3')
+
+    # Initialize the blank page detection used to skip OCR of empty pages
+    triage = BlankTriage(enabled=not args["no_triage"])
+
+    # Create the parser from the grammar shipped with labelreader. The grammar analysis takes long, so the parser
+    # is cached on disk and reused by later runs and other workers.
+    # The fields are collected while parsing with the LALR parser, unless the parse tree is printed
+    transformer = CSADTransformer() if args["parser"] == "lalr" and not args["verbose"] else None
+    parser = create_parser(args["parser"], use_cache=not args["no_parser_cache"], transformer=transformer)
+    return ocrreader, triage, parser
+
+
+def init_worker(args):
+    """Initialize the state of a worker process."""
+    worker_state["args"] = args
+    worker_state["ocrreader"], worker_state["triage"], worker_state["parser"] = create_readers(args)
+
+
+def process_pages(pages):
+    """Transcribe a range of pages of a PDF file in a worker process. The page images are written to hidden
+       temporary files in the output directory, which the main process renames when it has allocated their names.
+
+        pages: Tuple (imgfilename, no_img, first, last) with the PDF file, its image number and the numbers of the
+               first and last page
+        Return: Tuple (results, checked, blank) with a list of (page number, record, temporary file) and the
+                number of pages checked and found blank by the triage
+    """
+    args = worker_state["args"]
+    triage = worker_state["triage"]
+    checked, blank = triage.checked, triage.blank
+
+    imgfilename, no_img, first, last = pages
+    outpath = Path(args["output"], Path(imgfilename).stem)
+    results = []
+    tmpfilepaths = []  # Temporary files written so far, which are removed if the range fails
+    try:
+        # The pages are written before the next page is rendered, so they can share the array
+        for no_pages, img in iterpages(imgfilename, args["resolution"], first, last):
+            print("Reading page " + str(no_pages))
+            record = transcribe_page(img, imgfilename, no_pages, args, worker_state["ocrreader"], None,
+                                     worker_state["parser"], triage)
+            tmpfilepaths.append(tmpfilepath(outpath, imgfilename, no_img, no_pages))
+            save_tiff(tmpfilepaths[-1], img, args["resolution"], args["codec"], args["level"])
+            results.append((no_pages, record, str(tmpfilepaths[-1])))
+    except BaseException:
+        for filepath in tmpfilepaths:
+            if filepath.exists():
+                filepath.unlink()
+        raise
+    return results, triage.checked - checked, triage.blank - blank
+
+
+def tmpfilepath(outpath, imgfilename, no_img, no_pages):
+    """Return the hidden temporary file a worker process writes the image of a page of a PDF file to."""
+    return Path(outpath, "." + Path(imgfilename).stem + "_image" + str(no_img) + "_page" + str(no_pages) + ".tif")
+
+
+def remove_tmpfiles(outpath, imgfilename, no_img=None):
+    """Remove the temporary page images of a PDF file left by failed worker processes or an interrupted run.
+
+        outpath: Output directory of the PDF file
+        imgfilename: The PDF file
+        no_img: Only remove the page images with this image number. Default is all page images of the file.
+        Return: Number of files removed
+    """
+    pattern = re.compile(re.escape("." + Path(imgfilename).stem + "_image")
+                         + (r"\d+" if no_img is None else str(no_img)) + r"_page\d+\.tif")
+    removed = 0
+    for filepath in Path(outpath).iterdir():
+        if pattern.fullmatch(filepath.name):
+            filepath.unlink()
+            removed += 1
+    return removed
+
+
+def pageranges(imgfilename, no_img, pages_per_job, first=1, last=None):
+    """Split the pages first to last of a PDF file into ranges processed by process_pages. Default is all pages."""
+    if last is None:
+        last = pagecount(imgfilename)
+    for start in range(first, last + 1, pages_per_job):
+        yield imgfilename, no_img, start, min(start + pages_per_job - 1, last)
+
+
+def queue_units(images, pages_per_unit):
+    """Split the input files into the work units of a job queue - a range of pages of a PDF file, named like
+       ImageMagick selects pages, e.g. 'cards.pdf[5-8]', or a whole image file.
+
+        images: Iterable over input file names in processing order
+        pages_per_unit: Number of consecutive pages of a PDF file in a unit
+        Return: Iterator over lists with the name of one unit
+    """
+    for imgfilename in images:
+        if Path(imgfilename).suffix == '.pdf':
+            for _, _, first, last in pageranges(imgfilename, None, pages_per_unit):
+                yield [imgfilename + "[" + str(first) + "-" + str(last) + "]"]
+        else:
+            yield [imgfilename]
+
+
+def splitpages(unitname):
+    """Split the name of a unit made by queue_units into the input file name and the numbers of the first and
+       last page. A whole input file has the pages (1, None), i.e. all pages.
+
+        unitname: Name of the unit, or the name of an input file
+        Return: Tuple (imgfilename, first, last)
+    """
+    match = re.match(r"^(.+\.pdf)\[(\d+)-(\d+)\]$", unitname)
+    if match is None:
+        return unitname, 1, None
+    return match.group(1), int(match.group(2)), int(match.group(3))
+
+
+def merge_queue(queue, output, resolver):
+    """Merge the result rows of all workers of a job queue into one Excel sheet per input file, like the sheets
+       written without a queue. The units are merged in queue order, so the rows of the page ranges of a PDF file
+       are in page order."""
+    sinks = dict()  # Excel sheet -> sink of its rows
+    for unit, rows in shard_units(queue):
+        imgfilename, _, _ = splitpages(unit["inputs"][0])
+        if Path(imgfilename).suffix == '.pdf':
+            outfilepath = Path(output, Path(imgfilename).stem, Path(imgfilename).stem + ".xlsx")
+        else:
+            outfilepath = Path(output, "output.xlsx")
+        if outfilepath not in sinks:
+            outfilepath.parent.mkdir(parents=True, exist_ok=True)
+            sinks[outfilepath] = RecordSink(outfilepath.with_suffix(".jsonl"), columns=empty_dataframe().columns)
+        for record in rows:
+            # The names of all sheets are looked up in parallel before the first sheet is written
+            resolver.add_record(record)
+            sinks[outfilepath].append(record)
+    for outfilepath, sink in sinks.items():
+        sink.close()
+        sink.to_excel(outfilepath, transform=resolver.fill)
+
+
+def positive_int(text):
+    """Parse a count that must be at least 1, e.g. the number of worker processes.
+
+        text: String with an integer
+        Return: The integer
+    """
+    value = int(text)
+    if value < 1:
+        raise argparse.ArgumentTypeError("must be at least 1, got " + text)
+    return value
 
 
 def main():
@@ -500,8 +984,9 @@ def main():
     ap = argparse.ArgumentParser(description="Transcribe NHMD Herbarium catalogue cards from images.")
     ap.add_argument("-t", "--tesseract", required=True,
                     help="path to tesseract executable")
-    ap.add_argument("-i", "--image", required=True, action="extend", nargs="+", type=str,
-                    help="file name for and path to input image")
+    ap.add_argument("-i", "--image", required=False, action="extend", nargs="+", type=str,
+                    help="input image files, directories, glob patterns (quote these) or @ followed by a file with one input per line. "
+                         "With --queue the files are added to the queue if it is empty")
     ap.add_argument("-o", "--output", required=False, default="../output",
                     help="path and filename for Excel spreadsheet to write result to.")
     ap.add_argument("-l", "--language", required=False, default="dan+eng",
@@ -510,63 +995,214 @@ def main():
                     help="Set resolution in DPI of scanned images - used for rendering pdf pages so only relevant for PDF files")
     ap.add_argument("-v", "--verbose", required=False, action='store_true', default=False,
                     help="If set the program is verbose and will print out debug information")
+    ap.add_argument("--no-triage", required=False, action='store_true', default=False,
+                    help="If set all pages are OCR'ed, also pages detected as blank")
+    ap.add_argument("--no-parser-cache", required=False, action='store_true', default=False,
+                    help="If set the parser is created from the grammar and not cached. The cache is in "
+                         "$LABELREADER_CACHE or ~/.cache/labelreader")
+    ap.add_argument("--parser", required=False, default="earley", choices=list(PARSERS),
+                    help="parser of the card text. lalr is much faster than the default earley parser, but "
+                         "some ambiguous cards are parsed differently")
+    ap.add_argument("--parse-budget", required=False, default=60, type=float,
+                    help="maximum seconds used for parsing the text of a card. The lines of cards that take longer "
+                         "are classified one by one instead, which is marked in the Parse status column. "
+                         "0 means no limit. Default=60")
+    ap.add_argument("--resume", required=False, action='store_true', default=False,
+                    help="If set input files completed in a previous run with the same output directory are skipped")
+    ap.add_argument("--queue", required=False, default=None,
+                    help="directory of a job queue shared by several workers, also on other hosts. Each worker "
+                         "leases image files and ranges of pages of PDF files from the queue")
+    ap.add_argument("--lease", required=False, default=600, type=float,
+                    help="seconds a worker may work on a unit of the job queue before it is given to another worker")
+    ap.add_argument("--merge", required=False, action='store_true', default=False,
+                    help="only merge the results of the job queue given by --queue into the output directory")
+    ap.add_argument("--codec", required=False, default="lzw", choices=list(CODECS),
+                    help="TIFF compression of the page images. Default=lzw")
+    ap.add_argument("--level", required=False, default=None, type=int,
+                    help="quality (0-100) of the page images - only used with --codec jpeg")
+    ap.add_argument("-j", "--jobs", required=False, default=os.cpu_count(), type=positive_int,
+                    help="number of worker processes transcribing the pages of PDF files in parallel. "
+                         "1 transcribes the pages one by one in the main process")
+    ap.add_argument("--pages-per-job", required=False, default=4, type=positive_int,
+                    help="number of consecutive pages of a PDF file a worker process renders and transcribes at a time")
+    ap.add_argument("--writers", required=False, default=2, type=int,
+                    help="number of page images compressed and written in parallel in the background")
+    ap.add_argument("--write-buffer", required=False, default=256, type=int,
+                    help="maximum megabytes of page images waiting to be written")
 
     args = vars(ap.parse_args())
+    if args["image"] is None and args["queue"] is None:
+        ap.error("the following arguments are required: -i/--image (or --queue)")
 
 
     print("Using language = " + args["language"] + "\n")
 
-    # Initialize the OCR reader object
-    ocrreader = tesseract.OCR(args["tesseract"], args["language"], config='--oem 1 --psm 6')
-    #ocrreader = tesseract.OCR(args["tesseract"], args["language"], config='--oem 3')
-
-    # Initialize taxon checker
-    checker = gbiftaxonchecker.GBIFTaxonChecker()
-
-    # Read the grammar and create the parser
-    gf = open("../grammars/csad.lark", "r")
-    grammar = gf.read()
-    parser = lark.Lark(grammar, start='card')
-
-    master_table = empty_dataframe()
+    ocrreader, triage, parser = create_readers(args)
+
+    # Taxon names are checked in the background while the cards are read and each distinct name only once
+    resolver = TaxonResolver(gbiftaxonchecker.GBIFTaxonChecker(), query=taxonquery)
+
+    queue = None
+    if args["queue"] is not None:
+        # Image files and page ranges of PDF files are leased from a job queue. The worker is used like the run
+        # manifest.
+        Path(args["queue"]).mkdir(parents=True, exist_ok=True)
+        queue = JobQueue(Path(args["queue"], "jobs.sqlite"), lease_seconds=args["lease"])
+        if args["merge"]:
+            merge_queue(queue, args["output"], resolver)
+            resolver.close()
+            queue.close()
+            return
+        if args["image"] is not None and sum(queue.counts().values()) == 0:
+            # A unit of a PDF file keeps the worker processes of a worker busy
+            added = queue.add(queue_units(iterinputs(args["image"]), args["pages_per_job"] * args["jobs"]))
+            print("Added " + str(added) + " units to the job queue")
+        manifest = QueueWorker(queue)
+        # The rows are appended to the shard of the worker and merged into the Excel sheets when the queue is done
+        shard = RecordSink(manifest.shardpath, columns=empty_dataframe().columns)
+        print("Job queue worker " + manifest.name)
+        # The image number used in the generated file names is the position of the unit in the queue
+        images = ((unit["seq"] + 1, unit["inputs"][0]) for unit in manifest.leases())
+    else:
+        # The manifest records the completed input files such that an interrupted run can be resumed
+        manifest = RunManifest(Path(args["output"], "csadcards.manifest.jsonl"), resume=args["resume"])
+        images = enumerate(iterinputs(args["image"]), start=1)
+    # Unique page image names are allocated in memory, also for images queued but not written yet. Attachments
+    # left over by an interrupted run are written again, so their names can be reused. Workers of a job queue
+    # share the output directory, so their names are also reserved on disk.
+    allocator = FilenameAllocator(exclusive=queue is not None,
+                                  overwrite=[Path(args["output"], name) for name in manifest.leftover_attachments()])
+
+    # The pages of PDF files are transcribed in parallel by worker processes, which are started when needed
+    executor = None
+    no_worker_pages = 0  # Pages transcribed and written by the worker processes
+    if args["jobs"] > 1:
+        executor = ProcessPoolExecutor(max_workers=args["jobs"], initializer=init_worker, initargs=(args,))
+
+    # Page images are compressed and written in the background while the next page is OCR'ed
+    writer = AttachmentWriter(workers=args["writers"], max_bytes=args["write_buffer"] * 1024 * 1024,
+                              codec=args["codec"], level=args["level"])
+
+    from skimage.io import imread  # Deferred: slow to import
 
     # Loop over a directory of images
-    no_img = 0 # Count number of images
     no_pages = 0 # Count number of pages
     outfilepath = Path(args["output"], "output.xlsx")
-    for imgfilename in args["image"]:
-        print("Transcribing " + imgfilename)
-        no_img += 1
-        # Check if it is a pdf file
+    # The images are also counted when skipped to keep the generated file names of a resumed run
+    for no_img, unitname in images:
+        # A unit of the job queue can be a range of pages of a PDF file
+        imgfilename, first, last = splitpages(unitname)
+        inputs = [(unitname, filehash(imgfilename))]
+        if manifest.iscompleted(unitname, inputs[0][1]):
+            print("Skipping " + unitname + " - completed in a previous run")
+            manifest.skipped += 1
+            continue
+
+        print("Transcribing " + unitname)
+        attachments = []
         if Path(imgfilename).suffix == '.pdf':
-            print("Reading pages in a pdf file in " + str(args["resolution"]) + " DPI")
-            # Make sure output directory exists
+            # Make sure output directory exists. Workers of a job queue may create it at the same time.
             outpath = Path(args["output"], Path(imgfilename).stem)
             outfilepath = Path(outpath, Path(imgfilename).stem + ".xlsx")
-            if not outpath.exists():
-                outpath.mkdir()
-
-            with Image(filename=imgfilename, resolution=args["resolution"]) as img_wand_all:
-                no_pages = 0
-                # Read all pages
-                for img_wand in img_wand_all.sequence:
-                    img = np.array(img_wand)
-                    no_pages += 1
-                    print("Reading page " + str(no_pages))
-                    master_table = process_image(img, imgfilename, no_img, no_pages, args, ocrreader, master_table, checker, parser)
-
-        elif Path(imgfilename).suffix == '.tif':
-            # Read image file
-            img = imread(imgfilename, plugin='pil')
-            master_table = process_image(img, imgfilename, no_img, no_pages, args, ocrreader, master_table, checker, parser)
+            outpath.mkdir(exist_ok=True)
+            # Workers of a job queue share the output directory, so they only remove the page images of their unit
+            removed = remove_tmpfiles(outpath, imgfilename, None if queue is None else no_img)
+            if removed > 0:
+                print("Removed " + str(removed) + " temporary page images left by an interrupted run")
+
+        if queue is None:
+            # Records are appended to a JSON lines file next to the Excel sheet as soon as they are ready
+            sink = RecordSink(outfilepath.with_suffix(".jsonl"), columns=empty_dataframe().columns)
         else:
-            # Read image file
-            img = imread(imgfilename)
-            master_table = process_image(img, imgfilename, no_img, no_pages, args, ocrreader, master_table, checker, parser)
+            sink = shard
+        no_rows = sink.count  # Rows of earlier units in the shard
 
-        # Write Excel sheet to disk
-        master_table.to_excel(outfilepath.as_posix(), index=False)
-        master_table = empty_dataframe()
+        try:
+            # Check if it is a pdf file
+            if Path(imgfilename).suffix == '.pdf':
+                print("Reading pages in a pdf file in " + str(args["resolution"]) + " DPI")
+                if executor is None:
+                    # The pages are rendered one at a time. The page images are written in the background, so each
+                    # page gets its own array.
+                    for no_pages, img in iterpages(imgfilename, args["resolution"], first, last, reuse=False):
+                        print("Reading page " + str(no_pages))
+                        attachments.append(process_image(img, imgfilename, no_img, no_pages, args, ocrreader, sink,
+                                                         resolver, parser, triage, writer, allocator))
+                        manifest.record(inputs, 0, attachments[-1:], status="partial")
+                else:
+                    # Page ranges are transcribed in parallel. The results come in page order, so the rows and the
+                    # names of the page images are the same as when the pages are transcribed one by one.
+                    ranges = pageranges(imgfilename, no_img, args["pages_per_job"], first, last)
+                    transcribed = ordered_map(executor, process_pages, ranges, maxsize=2 * args["jobs"])
+                    try:
+                        for _, (results, checked, blank) in transcribed:
+                            triage.checked += checked
+                            triage.blank += blank
+                            for no_pages, record, tmpfilename in results:
+                                resolver.add_record(record)
+                                attachments.append(attach(record, functools.partial(os.replace, tmpfilename),
+                                                          imgfilename, no_img, no_pages, args, sink, allocator))
+                                manifest.record(inputs, 0, attachments[-1:], status="partial")
+                                no_worker_pages += 1
+                    except BaseException:
+                        # Cancel the ranges not started, wait for the running ones and remove the page images that
+                        # were not renamed
+                        transcribed.close()
+                        remove_tmpfiles(outpath, imgfilename, no_img)
+                        raise
+
+            elif Path(imgfilename).suffix == '.tif':
+                # Read image file
+                img = imread(imgfilename, plugin='pil')
+                attachments.append(process_image(img, imgfilename, no_img, no_pages, args, ocrreader, sink,
+                                                 resolver, parser, triage, writer, allocator))
+            else:
+                # Read image file
+                img = imread(imgfilename)
+                attachments.append(process_image(img, imgfilename, no_img, no_pages, args, ocrreader, sink,
+                                                 resolver, parser, triage, writer, allocator))
+
+            if queue is None:
+                sink.close()
+
+                # Write Excel sheet to disk with the checked taxon names
+                sink.to_excel(outfilepath, transform=resolver.fill)
+
+            # Mark the input file as completed once its page images are written
+            writer.after_written(manifest.record, inputs, sink.count - no_rows, attachments)
+        except Exception as e:
+            if queue is None:
+                raise
+            # Give the unit back to the job queue and continue with the next unit. Its rows are not merged and
+            # its page images are removed once they are written.
+            print("Failed to transcribe " + unitname + ": " + repr(e))
+            writer.after_written(manifest.fail, inputs, sink.count - no_rows, repr(e),
+                                 [Path(args["output"], name) for name in attachments])
+
+    if executor is not None:
+        executor.shutdown()
+    # Wait for all page images to be written
+    writer.close()
+    manifest.close()
+    if manifest.skipped > 0:
+        print("Resumed run: skipped " + str(manifest.skipped) + " input files completed in a previous run")
+    if queue is not None and manifest.failed > 0:
+        print("Gave " + str(manifest.failed) + " failed units back to the job queue")
+    # The last worker of a job queue to finish merges the shards of all workers into the Excel sheets
+    if queue is not None:
+        shard.close()
+        if queue.claim_merge(manifest.name):
+            merge_queue(queue, args["output"], resolver)
+    resolver.close()
+    print(triage.report())
+    print(writer.report())
+    if no_worker_pages > 0:
+        print("Worker processes transcribed and wrote " + str(no_worker_pages) + " pages")
+    print(resolver.report())
+    if queue is not None:
+        counts = queue.counts()
+        print("Job queue: " + ", ".join(str(counts[status]) + " " + status for status in sorted(counts)))
+        queue.close()
 
 
 if __name__ == '__main__':
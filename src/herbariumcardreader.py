@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 15:20:00 2026
+
+@author: Kim Steenstrup Pedersen, NHMD
+
+Copyright 2026 Natural History Museum of Denmark (NHMD)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import argparse
+import logging
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from labelreader.ocr import tesseract
+from labelreader.barcode import barcode
+from labelreader.util.inputs import iterinputs, RASTER_SUFFIXES
+from labelreader.util.pipeline import ordered_map
+from labelreader.util.sink import RecordSink
+
+
+# Per process state of the worker processes - set by init_worker
+worker_state = dict()
+
+
+def empty_dataframe():
+    """Create and return an empty data frame for herbarium sheet data.
+    """
+    import pandas as pd  # Deferred: slow to import
+
+    record = pd.DataFrame({
+        "Catalogue Number": [],
+        "Barcode": [],
+        "Barcode format": [],
+        "Label text": [],
+        "OCR": [],
+        "Original image": [],
+        "Status": [],
+        "Error": []
+    })
+    return record
+
+
+def catalogue_number_from_barcode(text):
+    """Extract the catalogue number from the text of a NHMD barcode, e.g. 'NHMD-681096' gives '681096'.
+
+        text: String with the decoded barcode text
+        Return: String with the catalogue number or empty string if the text contains no number.
+    """
+    res = re.findall(r"\d+", text)
+    if len(res) == 0:
+        return ""
+    else:
+        return res[-1]
+
+
+def parse_region(text):
+    """Parse a label region given as 'top,left,bottom,right' in fractions of the sheet height and width.
+
+        text: String with four comma separated numbers in [0, 1]
+        Return: Tuple of four floats
+    """
+    region = tuple(float(x) for x in text.split(","))
+    if len(region) != 4 or not (0.0 <= region[0] < region[2] <= 1.0 and 0.0 <= region[1] < region[3] <= 1.0):
+        raise argparse.ArgumentTypeError("label region must be 'top,left,bottom,right' fractions in [0, 1]")
+    return region
+
+
+def crop_region(img, region):
+    """Crop a region given in fractions of the image height and width.
+
+        img: Image as a numpy array
+        region: Tuple (top, left, bottom, right) with fractions of the image height and width
+        Return: The cropped image
+    """
+    rows, cols = img.shape[0:2]
+    return img[int(region[0] * rows):int(region[2] * rows), int(region[1] * cols):int(region[3] * cols)]
+
+
+def init_worker(args):
+    """Initialize the state of a worker process."""
+    worker_state["args"] = args
+    if args["ocr"] != "never":
+        worker_state["ocrreader"] = tesseract.OCR(args["tesseract"], args["language"], config='--oem 3')
+
+
+def process_sheet(imgfilename):
+    """Read the barcode and, if needed, the label of one herbarium sheet. Errors are reported in the Status
+        and Error columns of the row, so a bad sheet does not stop the run.
+
+        imgfilename: Path to the image of the herbarium sheet
+        Return: Dictionary with one row of data
+    """
+    from skimage.io import imread  # Deferred: slow to import
+
+    args = worker_state["args"]
+
+    record = dict()
+    record["Catalogue Number"] = ""
+    record["Barcode"] = ""
+    record["Barcode format"] = ""
+    record["Label text"] = ""
+    record["OCR"] = False
+    record["Original image"] = Path(imgfilename).name
+    record["Status"] = "ok"
+    record["Error"] = ""
+
+    try:
+        if Path(imgfilename).suffix == '.tif':
+            img = imread(imgfilename, plugin='pil')
+        else:
+            img = imread(imgfilename)
+
+        # Barcode first - it gives the catalogue number without any OCR
+        codes = barcode.read_barcodes(img, max_codes=1, fallback=True)
+        if len(codes) > 0:
+            record["Catalogue Number"] = catalogue_number_from_barcode(codes[0]["text"])
+            record["Barcode"] = codes[0]["text"]
+            record["Barcode format"] = codes[0]["format"]
+        else:
+            record["Status"] = "no code"
+
+        # Only OCR the label region and only if needed
+        run_ocr = args["ocr"] == "always" or (args["ocr"] == "fallback" and record["Catalogue Number"] == "")
+        record["OCR"] = run_ocr
+        if run_ocr:
+            ocrreader = worker_state["ocrreader"]
+            ocrreader.read_image(crop_region(img, args["label_region"]))
+            ocrtext = ocrreader.get_text()
+            record["Label text"] = "\n".join(" ".join(str(word) for word in line) for line in ocrtext)
+    except Exception as e:
+        record["Status"] = "error"
+        record["Error"] = repr(e)
+
+    return record
+
+
+def main():
+    """The main function of this script."""
+    # construct the argument parser and parse the arguments
+    ap = argparse.ArgumentParser(description="Read catalogue numbers and labels from NHMD herbarium sheet images.")
+    ap.add_argument("-t", "--tesseract", required=True,
+                    help="path to tesseract executable")
+    ap.add_argument("-i", "--image", required=True, action="extend", nargs="+", type=str,
+                    help="input image files, directories, glob patterns (quote these) or @ followed by a file with one input per line")
+    ap.add_argument("-o", "--output", required=False, default="../output",
+                    help="path to write results in the form of Excel spreadsheet.")
+    ap.add_argument("-l", "--language", required=False, default="dan+eng",
+                    help="language that tesseract uses - depends on installed tesseract language packages")
+    ap.add_argument("--ocr", required=False, default="fallback", choices=["always", "fallback", "never"],
+                    help="OCR the label region always, only if no barcode is found (fallback), or never")
+    ap.add_argument("--label-region", required=False, default="0.7,0.5,1.0,1.0", type=parse_region,
+                    help="label region as 'top,left,bottom,right' in fractions of the sheet height and width")
+    ap.add_argument("-j", "--jobs", required=False, default=os.cpu_count(), type=int,
+                    help="number of sheets processed in parallel")
+    ap.add_argument("-v", "--verbose", required=False, action='store_true', default=False,
+                    help="If set the program is verbose and will print out debug information")
+
+    args = vars(ap.parse_args())
+
+    if args["verbose"]:
+        logging.basicConfig(level=logging.INFO)
+    else:
+        logging.basicConfig(level=logging.WARNING)
+
+    # Rows are appended to a JSON lines file next to the Excel sheet as soon as they are ready
+    sink = RecordSink(Path(args["output"], "herbariumsheets.jsonl"), columns=empty_dataframe().columns)
+    no_ocr = 0
+    no_errors = 0
+    with ProcessPoolExecutor(max_workers=args["jobs"], initializer=init_worker, initargs=(args,)) as executor:
+        # Results come in input order. The input files are found and submitted lazily.
+        images = iterinputs(args["image"], suffixes=RASTER_SUFFIXES)
+        for imgfilename, record in ordered_map(executor, process_sheet, images, maxsize=2 * args["jobs"]):
+            if record["Status"] == "error":
+                print("Failed to transcribe " + Path(imgfilename).name + ": " + record["Error"])
+                no_errors += 1
+            else:
+                print("Transcribed " + Path(imgfilename).name + " - catalogue number '"
+                      + record["Catalogue Number"] + "'")
+                if not record["OCR"]:
+                    no_ocr += 1
+            sink.append(record)
+    sink.close()
+
+    print("OCR skipped for " + str(no_ocr) + " of " + str(sink.count) + " sheets")
+    if no_errors > 0:
+        print("Failed to transcribe " + str(no_errors) + " of " + str(sink.count) + " sheets")
+
+    # Write final table to disk as Excel sheet
+    sink.to_excel(Path(args["output"], "herbariumsheets.xlsx"))
+
+
+if __name__ == '__main__':
+    main()
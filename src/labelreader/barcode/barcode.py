@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+"""
+The barcode module implements region-of-interest based reading of Data Matrix and QR codes on specimen scans.
+Candidate code regions are found in a downscaled version of the image and only crops of these regions are
+decoded at full resolution, which is much faster than decoding the whole image.
+
+LICENSE
+
+Created on Mon Oct 19 13:05:00 2026
+
+@author: Kim Steenstrup Pedersen, NHMD
+
+Copyright (c) 2026  Natural History Museum of Denmark (NHMD)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import time
+import cv2
+import numpy as np
+import zxingcpp
+from typing import List, Optional, Tuple
+
+# Default code formats used on NHMD specimen scans
+DEFAULT_FORMATS = zxingcpp.DataMatrix | zxingcpp.QRCode
+
+
+def to_gray(img: np.ndarray) -> np.ndarray:
+    """Convert an image to an 8-bit grayscale image.
+
+       :param img: Image as a numpy array in grayscale (N,M) or color (N,M,C) format
+       :type img: numpy.ndarray
+       :return: 8-bit grayscale image (N,M)
+       :rtype: numpy.ndarray
+    """
+    if img.ndim == 3:
+        img = img[:, :, 0:3]  # Drop any alpha channel
+        if img.dtype == np.uint8:
+            img = cv2.cvtColor(np.ascontiguousarray(img), cv2.COLOR_RGB2GRAY)
+        else:
+            img = img.mean(axis=2)
+    if img.dtype != np.uint8:
+        if np.issubdtype(img.dtype, np.floating) and img.max() <= 1.0:
+            img = img * 255.0
+        img = np.clip(img, 0, 255).astype(np.uint8)
+    return img
+
+
+def find_code_regions(img: np.ndarray, max_side: int = 1000, min_size: int = 12, max_fraction: float = 0.2,
+                      max_aspect: float = 2.0, min_fill: float = 0.5, padding: float = 0.3,
+                      max_candidates: int = 10) -> List[Tuple[int, int, int, int]]:
+    """Find candidate regions of 2D codes (Data Matrix or QR) in a downscaled version of the image.
+       Codes are dense patterns of dark and light modules and show up as compact, roughly square, blobs
+       in the morphological gradient image.
+
+       :param img: Image as a numpy array in grayscale (N,M) or color (N,M,C) format
+       :type img: numpy.ndarray
+       :param max_side: Maximum side length in pixels of the downscaled image used for the search
+       :type max_side: int
+       :param min_size: Minimum side length of a candidate region in pixels in the downscaled image
+       :type min_size: int
+       :param max_fraction: Maximum side length of a candidate region as a fraction of the longest image side
+       :type max_fraction: float
+       :param max_aspect: Maximum ratio between the long and short side of a candidate region
+       :type max_aspect: float
+       :param min_fill: Minimum fraction of a candidate bounding box covered by the blob
+       :type min_fill: float
+       :param padding: Fraction of the region size added on each side to include the quiet zone of the code
+       :type padding: float
+       :param max_candidates: Maximum number of candidate regions returned
+       :type max_candidates: int
+       :return: List of bounding boxes (min_row, min_col, max_row, max_col) in full image coordinates, sorted
+                with the most likely code region first
+       :rtype: list
+    """
+    gray = to_gray(img)
+    rows, cols = gray.shape
+    scale = max(1.0, max(rows, cols) / max_side)
+    small = cv2.resize(gray, (int(round(cols / scale)), int(round(rows / scale))), interpolation=cv2.INTER_AREA)
+
+    # Dense module patterns have a strong local gradient everywhere
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
+    gradient = cv2.morphologyEx(small, cv2.MORPH_GRADIENT, kernel)
+    _, binary = cv2.threshold(gradient, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    # Fill the gaps between modules and remove thin structures such as text strokes and lines
+    binary = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, (5, 5)))
+    binary = cv2.morphologyEx(binary, cv2.MORPH_OPEN, cv2.getStructuringElement(cv2.MORPH_RECT, (5, 5)))
+
+    num, labels, stats, _ = cv2.connectedComponentsWithStats(binary, connectivity=8)
+
+    candidates = []
+    for idx in range(1, num):  # Skip background
+        left, top, width, height, area = stats[idx]
+        if min(width, height) < min_size or max(width, height) > max_fraction * max(small.shape):
+            continue
+        if max(width, height) / min(width, height) > max_aspect:
+            continue
+        fill = area / float(width * height)
+        if fill < min_fill:
+            continue
+
+        # Pad the region and map it to full image coordinates
+        pad_rows = padding * height
+        pad_cols = padding * width
+        min_row = max(0, int((top - pad_rows) * scale))
+        min_col = max(0, int((left - pad_cols) * scale))
+        max_row = min(rows, int(np.ceil((top + height + pad_rows) * scale)))
+        max_col = min(cols, int(np.ceil((left + width + pad_cols) * scale)))
+        candidates.append((fill, (min_row, min_col, max_row, max_col)))
+
+    candidates.sort(key=lambda candidate: candidate[0], reverse=True)
+    return [bbox for _, bbox in candidates[0:max_candidates]]
+
+
+def barcode_to_dict(code, offset: Tuple[int, int] = (0, 0)) -> dict:
+    """Convert a zxingcpp result into a dictionary with the position given in full image coordinates.
+
+       :param code: Barcode result as returned by zxingcpp.read_barcodes
+       :param offset: (row, col) offset of the decoded crop in the full image
+       :type offset: tuple
+       :return: Dictionary with the keys 'text', 'format', 'position' (list of four (x, y) corner points
+                starting from the top left corner of the code) and 'bbox' (min_row, min_col, max_row, max_col)
+       :rtype: dict
+    """
+    position = code.position
+    corners = [(point.x + offset[1], point.y + offset[0]) for point in
+               (position.top_left, position.top_right, position.bottom_right, position.bottom_left)]
+    xs = [corner[0] for corner in corners]
+    ys = [corner[1] for corner in corners]
+
+    code_data = dict()
+    code_data['text'] = code.text
+    code_data['format'] = str(code.format)
+    code_data['position'] = corners
+    code_data['bbox'] = (min(ys), min(xs), max(ys) + 1, max(xs) + 1)
+    return code_data
+
+
+def read_barcodes_full(img: np.ndarray, formats=DEFAULT_FORMATS) -> List[dict]:
+    """Decode codes by passing the whole image to zxingcpp. This is slow on large scans.
+
+       :param img: Image as a numpy array in grayscale (N,M) or color (N,M,C) format
+       :type img: numpy.ndarray
+       :param formats: zxingcpp barcode formats to search for
+       :return: List of dictionaries as returned by barcode_to_dict
+       :rtype: list
+    """
+    return [barcode_to_dict(code) for code in zxingcpp.read_barcodes(to_gray(img), formats=formats)]
+
+
+def read_barcodes(img: np.ndarray, formats=DEFAULT_FORMATS, fallback: bool = False,
+                  max_codes: Optional[int] = None, **kwargs) -> List[dict]:
+    """Decode codes by first finding candidate code regions at low resolution and then decoding only crops
+       of these regions at full resolution.
+
+       :param img: Image as a numpy array in grayscale (N,M) or color (N,M,C) format
+       :type img: numpy.ndarray
+       :param formats: zxingcpp barcode formats to search for
+       :param fallback: If True the whole image is decoded when no code is found in the candidate regions
+       :type fallback: bool
+       :param max_codes: Stop searching when this number of codes has been found. None means no limit.
+       :type max_codes: Optional[int]
+       :param kwargs: Extra keyword arguments passed on to find_code_regions
+       :return: List of dictionaries as returned by barcode_to_dict
+       :rtype: list
+    """
+    gray = to_gray(img)
+
+    codes = []
+    seen = set()
+    for (min_row, min_col, max_row, max_col) in find_code_regions(gray, **kwargs):
+        crop = gray[min_row:max_row, min_col:max_col]
+        for code in zxingcpp.read_barcodes(crop, formats=formats):
+            code_data = barcode_to_dict(code, offset=(min_row, min_col))
+            # Overlapping regions can contain the same code
+            key = (code_data['text'], code_data['bbox'][0] // 10, code_data['bbox'][1] // 10)
+            if key not in seen:
+                seen.add(key)
+                codes.append(code_data)
+        if max_codes is not None and len(codes) >= max_codes:
+            break
+
+    if len(codes) == 0 and fallback:
+        codes = read_barcodes_full(gray, formats=formats)
+
+    return codes
+
+
+def compare_decoding(img: np.ndarray, formats=DEFAULT_FORMATS, repeat: int = 1) -> dict:
+    """Compare the time used for region-of-interest decoding with decoding of the whole image.
+
+       :param img: Image as a numpy array in grayscale (N,M) or color (N,M,C) format
+       :type img: numpy.ndarray
+       :param formats: zxingcpp barcode formats to search for
+       :param repeat: Number of repetitions used for the timing. The best time is reported.
+       :type repeat: int
+       :return: Dictionary with the keys 'roi_time' and 'full_time' (best time in seconds), 'speedup',
+                'roi_codes' and 'full_codes' (the decoded codes) and 'same' (True if the same texts are found)
+       :rtype: dict
+    """
+    gray = to_gray(img)
+
+    roi_time = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        roi_codes = read_barcodes(gray, formats=formats)
+        roi_time = min(roi_time, time.perf_counter() - start)
+
+    full_time = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        full_codes = read_barcodes_full(gray, formats=formats)
+        full_time = min(full_time, time.perf_counter() - start)
+
+    comparison = dict()
+    comparison['roi_time'] = roi_time
+    comparison['full_time'] = full_time
+    comparison['speedup'] = full_time / roi_time if roi_time > 0 else np.inf
+    comparison['roi_codes'] = roi_codes
+    comparison['full_codes'] = full_codes
+    comparison['same'] = sorted(code['text'] for code in roi_codes) == sorted(code['text'] for code in full_codes)
+    return comparison
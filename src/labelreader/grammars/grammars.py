@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+"""
+The grammars module loads the Lark grammars shipped as package data with labelreader and creates parsers from them.
+Creating a parser from a large grammar is slow - the grammar analysis of the C-SAD card grammar takes several
+seconds - so the created parsers are cached on disk, keyed by a hash of the grammar and the parser options, and
+reused by later runs and by other processes.
+
+LICENSE
+
+Created on Tue Oct 20 01:10:00 2026
+
+@author: Kim Steenstrup Pedersen, NHMD
+
+Copyright (c) 2026  Natural History Museum of Denmark (NHMD)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import copyreg
+import hashlib
+import importlib
+import importlib.resources
+import io
+import json
+import logging
+import os
+import pickle
+import sys
+import tempfile
+import types
+from pathlib import Path
+from typing import Optional, Union
+
+import lark
+
+CACHE_ENVIRONMENT_VARIABLE = "LABELREADER_CACHE"  # Overrides the default cache directory
+
+
+def read_grammar(name: str) -> str:
+    """Read a grammar shipped with labelreader.
+
+       :param name: File name of the grammar, e.g. 'csad.lark'
+       :type name: str
+       :return: The grammar
+       :rtype: str
+    """
+    if hasattr(importlib.resources, "files"):
+        return importlib.resources.files(__package__).joinpath(name).read_text(encoding="utf-8")
+    return importlib.resources.read_text(__package__, name, encoding="utf-8")  # Python 3.8
+
+
+def default_cache_dir() -> Path:
+    """Return the directory of the parser cache, which is $LABELREADER_CACHE if set and otherwise labelreader in
+       the user cache directory ($XDG_CACHE_HOME or ~/.cache).
+
+       :return: Path to the cache directory
+       :rtype: pathlib.Path
+    """
+    if os.environ.get(CACHE_ENVIRONMENT_VARIABLE):
+        return Path(os.environ[CACHE_ENVIRONMENT_VARIABLE])
+    cachehome = os.environ.get("XDG_CACHE_HOME") or Path.home().joinpath(".cache")
+    return Path(cachehome, "labelreader")
+
+
+def grammar_key(grammar: str, **options) -> str:
+    """Hash a grammar and the parser options. The versions of Lark and Python are included, since a cached
+       parser can only be used with the versions that created it.
+
+       :param grammar: The grammar
+       :type grammar: str
+       :return: Hexadecimal digest
+       :rtype: str
+    """
+    digest = hashlib.sha256(grammar.encode("utf-8"))
+    digest.update(json.dumps(options, sort_keys=True, default=str).encode("utf-8"))
+    digest.update((lark.__version__ + " " + sys.version).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _reduce_module(module: types.ModuleType):
+    # Lark keeps a reference to the re module, which is pickled by name
+    return importlib.import_module, (module.__name__,)
+
+
+def _dumps(parser: lark.Lark) -> bytes:
+    buffer = io.BytesIO()
+    if parser.options.parser == "lalr":
+        # Lark saves LALR parsers itself, the parse table can not be pickled as it is
+        parser.save(buffer)
+    else:
+        pickler = pickle.Pickler(buffer, protocol=pickle.HIGHEST_PROTOCOL)
+        pickler.dispatch_table = copyreg.dispatch_table.copy()
+        pickler.dispatch_table[types.ModuleType] = _reduce_module
+        pickler.dump(parser)
+    return buffer.getvalue()
+
+
+def _load(f, **options) -> lark.Lark:
+    if options.get("parser") == "lalr":
+        return lark.Lark.load(f)
+    return pickle.load(f)
+
+
+def create_parser(grammar: str, name: str = "grammar", cache_dir: Optional[Union[str, Path]] = None,
+                  use_cache: bool = True, **options) -> lark.Lark:
+    """Create a Lark parser or load it from the cache if it was created before with the same grammar and options.
+       A new parser is written to the cache through a temporary file, so processes starting at the same time
+       never read an incomplete file. The cache files are pickles, so the cache directory must only be writable
+       by trusted users.
+
+       :param grammar: The grammar
+       :type grammar: str
+       :param name: Name used for the cache file
+       :type name: str
+       :param cache_dir: Cache directory. Default is default_cache_dir().
+       :type cache_dir: Optional[Union[str, pathlib.Path]]
+       :param use_cache: If False the parser is always created and not cached
+       :type use_cache: bool
+       :param options: Options for lark.Lark, e.g. start='card'
+       :return: The parser
+       :rtype: lark.Lark
+    """
+    if not use_cache:
+        return lark.Lark(grammar, **options)
+
+    cache_dir = Path(cache_dir) if cache_dir is not None else default_cache_dir()
+    cachepath = cache_dir.joinpath(name + "-" + grammar_key(grammar, **options)[0:16] + ".pickle")
+
+    if cachepath.exists():
+        try:
+            with open(cachepath, "rb") as f:
+                return _load(f, **options)
+        except Exception as e:
+            logging.warning("Could not load the cached parser " + str(cachepath) + " - creating it again: " + str(e))
+
+    parser = lark.Lark(grammar, **options)
+    try:
+        # The parser objects are deeply nested
+        limit = sys.getrecursionlimit()
+        sys.setrecursionlimit(max(limit, 10000))
+        try:
+            data = _dumps(parser)
+        finally:
+            sys.setrecursionlimit(limit)
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        fd, temppath = tempfile.mkstemp(prefix=cachepath.name, suffix=".tmp", dir=cache_dir)
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(temppath, cachepath)
+    except Exception as e:
+        logging.warning("Could not cache the parser in " + str(cache_dir) + ": " + str(e))
+    return parser
+
+
+def load_parser(name: str, cache_dir: Optional[Union[str, Path]] = None, use_cache: bool = True,
+                **options) -> lark.Lark:
+    """Create a parser from a grammar shipped with labelreader, using the parser cache.
+
+       :param name: File name of the grammar, e.g. 'csad.lark'
+       :type name: str
+       :param cache_dir: Cache directory. Default is default_cache_dir().
+       :type cache_dir: Optional[Union[str, pathlib.Path]]
+       :param use_cache: If False the parser is always created and not cached
+       :type use_cache: bool
+       :param options: Options for lark.Lark, e.g. start='card'
+       :return: The parser
+       :rtype: lark.Lark
+    """
+    return create_parser(read_grammar(name), name=Path(name).stem, cache_dir=cache_dir, use_cache=use_cache,
+                         **options)
@@ -18,12 +18,9 @@ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 See the License for the specific language governing permissions and 
 limitations under the License. 
 """
+import logging
 import numpy as np
 #import math
-from skimage.color import rgb2hsv
-from skimage.morphology import disk, closing, opening
-import skimage.measure  # Needed for label function and regionprop
-from skimage.transform import EuclideanTransform, warp
 
 def color_segment_labels(img, huerange=(0.0, 0.05)):
     """Perform a simple color-based foreground-background segmentation to find all labels in an image.
@@ -39,6 +36,7 @@ def color_segment_labels(img, huerange=(0.0, 0.05)):
        Returns:
          binary segmentation mask as a ndarray (N,M). 
     """
+    from skimage.color import rgb2hsv  # Deferred: slow to import
     img_hsv = rgb2hsv(img)
         
     # TODO: Consider switching to use numpy.where instead - maybe faster? but at least does not lead to boolean result
@@ -53,8 +51,30 @@ def color_segment_labels(img, huerange=(0.0, 0.05)):
     mask[np.logical_and(np.logical_and(np.logical_and(low, high), notwhite), notblack)] = 0  # Set all background pixels to zero
     
     return mask
-    
-    
+
+
+def color_segment_in_labels(img, label_img, huerange=(0.0, 0.05)):
+    """Perform the color-based segmentation of color_segment_labels only inside the bounding boxes of the labels.
+       This is used to find finer structures on the labels, such as a colored line, at full resolution
+       without segmenting the whole image.
+
+       Parameters:
+         img: image to be segmented as a ndarray (N,M,C) in either grayscale (C=1) or RGB (C=3) format.
+         label_img: Labelled connected components image (N,M) as produced by find_labels.
+         huerange: a 2-tuple indicating the range of hue values segmented as zeros.
+
+       Returns:
+         binary segmentation mask as a ndarray (N,M). Pixels outside the bounding boxes of the labels are one.
+    """
+    import skimage.measure  # Deferred: slow to import
+
+    mask = np.ones(label_img.shape, dtype=np.uint8)
+    for prop in skimage.measure.regionprops(label_img):
+        r0, c0, r1, c1 = prop.bbox
+        mask[r0:r1, c0:c1] = color_segment_labels(img[r0:r1, c0:c1], huerange=huerange)
+    return mask
+
+
 def improve_binary_mask(mask, radius=10, border_margin = 50):
     """Close holes in a binary mask by applying mathematical morphology.
     
@@ -72,6 +92,8 @@ def improve_binary_mask(mask, radius=10, border_margin = 50):
     mask[:, 0:border_margin] = 0
     mask[:, -border_margin:] = 0
 
+    from skimage.morphology import disk, closing, opening  # Deferred: slow to import
+
     selem = disk(radius)
     new_mask = opening(mask, footprint=selem)
     #selem_big = disk(2*radius)
@@ -89,9 +111,146 @@ def find_labels(mask):
        Returns:
          (label_img, num_labels): Returns a tuple containing labelled image and number of unique labels.
     """
+    import skimage.measure  # Deferred: slow to import
+
     label_img, num_labels = skimage.measure.label(mask, background=0, return_num=True)
     return label_img, num_labels
 
+
+def upsample_nearest(img, factor, shape):
+    """Upsample an image by an integer factor using nearest neighbour interpolation (pixel repetition).
+
+       Parameters:
+         img: ndarray (N,M) to upsample, e.g. a mask or a labelled connected components image.
+         factor: Integer upsampling factor.
+         shape: 2-tuple with the wanted output shape. The upsampled image is cropped to this shape.
+       Returns:
+         ndarray with the given shape and same dtype as img.
+    """
+    if factor == 1:
+        return img[0:shape[0], 0:shape[1]]
+    upsampled = np.repeat(np.repeat(img, factor, axis=0), factor, axis=1)
+    return upsampled[0:shape[0], 0:shape[1]]
+
+
+def check_label_geometry(label_img, expected_count, min_area, max_aspect=0.8, max_area_ratio=1.5):
+    """Check that a labelled connected components image contains the expected number of label sized regions
+       and that these regions have similar areas.
+       Regions are only counted if they pass the same aspect ratio and area test as used when resampling labels.
+
+       Parameters:
+         label_img: Labelled connected components image as produced by find_labels.
+         expected_count: The number of labels we expect to find.
+         min_area: Minimum area in pixels of a region counted as a label.
+         max_aspect: Maximum ratio between minor and major axis length of a region counted as a label.
+         max_area_ratio: Maximum allowed ratio between largest and smallest label area.
+       Returns:
+         (accepted, count): Tuple with a boolean which is True if the geometry is sane and the number
+                            of label sized regions found.
+    """
+    import skimage.measure  # Deferred: slow to import
+
+    areas = []
+    for prop in skimage.measure.regionprops(label_img):
+        if (prop.axis_major_length != 0) and (prop.axis_minor_length / prop.axis_major_length < max_aspect) \
+                and (prop.area > min_area):
+            areas.append(prop.area)
+
+    count = len(areas)
+    if count != expected_count or count == 0:
+        return False, count
+
+    return max(areas) / min(areas) <= max_area_ratio, count
+
+
+def detect_labels_tiered(img, huerange=(0.0, 0.05), alt_hueranges=(), expected_count=9, factors=(4, 2, 1),
+                         radius=10, border_margin=50, min_area=30000, max_aspect=0.8, max_area_ratio=1.5):
+    """Find labels by color segmentation using a cheap-first strategy.
+       A coarse pass is performed on a subsampled image first and its result is accepted if the expected number
+       of labels is found with sane geometry (see check_label_geometry). Otherwise the detection escalates
+       to finer resolutions and then to the alternative hue ranges. The tiers are tried in order of decreasing
+       subsampling factor, and for each factor the hue range comes before the alternative hue ranges.
+       If no tier is accepted the full resolution result using huerange is returned, which is the same
+       result as running color_segment_labels, improve_binary_mask and find_labels on the full image.
+
+       Parameters:
+         img: Image to process as an ndarray (N,M,3) in RGB format.
+         huerange: a 2-tuple indicating the range of hue values corresponding to background.
+         alt_hueranges: a sequence of 2-tuples with alternative background hue ranges to try if huerange fails.
+         expected_count: The number of labels expected in the image.
+         factors: Sequence of integer subsampling factors to try. The parameters radius, border_margin and
+                  min_area are given at full resolution and are scaled with the factor.
+         radius: Radius in pixels of the structuring element used by improve_binary_mask.
+         border_margin: Border margin in pixels used by improve_binary_mask.
+         min_area: Minimum area in pixels of a label.
+         max_aspect: Maximum ratio between minor and major axis length of a label.
+         max_area_ratio: Maximum allowed ratio between largest and smallest label area.
+       Returns:
+         A dictionary with the keys
+           'label_img': Labelled connected components image at full resolution,
+           'num_labels': Number of connected components in label_img,
+           'mask': The segmentation mask at full resolution (before morphology but with border removed).
+                   When the labels are found in a subsampled image this mask is upsampled and too coarse for
+                   finer structures on the labels. Use color_segment_in_labels on label_img to segment these
+                   at full resolution inside the labels only,
+           'edges': Boolean mask at full resolution of the label pixels next to the label boundaries.
+                    These pixels are uncertain when the labels are found in a subsampled image.
+           'huerange': The hue range used,
+           'factor': The subsampling factor used,
+           'tier': Index of the tier used (0 is the cheapest),
+           'accepted': True if the result passed the count and geometry check.
+    """
+    tiers = []
+    for factor in sorted(set(factors), reverse=True):
+        tiers.append((factor, huerange))
+        for alt_huerange in alt_hueranges:
+            tiers.append((factor, alt_huerange))
+    if (1, huerange) not in tiers:
+        tiers.append((1, huerange))  # Always have the full resolution result to fall back on
+
+    fallback = None
+    for tier, (factor, hues) in enumerate(tiers):
+        small = img[::factor, ::factor]
+        mask = color_segment_labels(small, huerange=hues)
+        mask_improved = improve_binary_mask(mask, radius=max(1, int(round(radius / factor))),
+                                            border_margin=max(1, int(round(border_margin / factor))))
+        label_img, num_labels = find_labels(mask_improved)
+        accepted, count = check_label_geometry(label_img, expected_count, min_area / factor**2,
+                                               max_aspect=max_aspect, max_area_ratio=max_area_ratio)
+        logging.debug("Label detection tier %d (factor %d, hue range %s): %d labels found, accepted = %s",
+                      tier, factor, str(hues), count, str(accepted))
+
+        result = dict()
+        result['label_img'] = label_img
+        result['num_labels'] = num_labels
+        result['mask'] = mask
+        result['huerange'] = hues
+        result['factor'] = factor
+        result['tier'] = tier
+        result['accepted'] = accepted
+
+        if accepted:
+            break
+        if factor == 1 and hues == huerange:
+            fallback = result
+    else:
+        result = fallback
+
+    # Mark the label pixels on the boundary of the subsampled labels
+    foreground = (result['label_img'] > 0).astype(np.uint8)
+    if result['factor'] > 1:
+        from skimage.morphology import disk, erosion  # Deferred: slow to import
+        edges = np.logical_and(foreground, np.logical_not(erosion(foreground, footprint=disk(1))))
+    else:
+        edges = np.zeros(foreground.shape, dtype=bool)
+
+    # Bring the masks back to full resolution
+    result['label_img'] = upsample_nearest(result['label_img'], result['factor'], img.shape[0:2])
+    result['mask'] = upsample_nearest(result['mask'], result['factor'], img.shape[0:2])
+    result['edges'] = upsample_nearest(edges, result['factor'], img.shape[0:2])
+
+    return result
+
     
 def resample_label(img, label_img):
     """Crop and rotate the label image to be axis aligned by resampling the label pixels.
@@ -105,6 +264,9 @@ def resample_label(img, label_img):
          a list of numpy arrays with same number of channels as img which contain the resampled labels.
     """
 
+    import skimage.measure  # Deferred: slow to import
+    from skimage.transform import EuclideanTransform, warp  # Deferred: slow to import
+
     lst_resampled_labels = []
 
     props = skimage.measure.regionprops(label_img)
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+Pairing of labels detected on two scans of the same sheet, e.g. the back side labels of a sheet with the front
+side labels of the previous scan. Labels are paired by their centroids using a distance matrix and a globally
+optimal one-to-one assignment, such that two back side labels never get the same front side label.
+
+Created on Mon Oct 19 21:05:00 2026
+
+@author: Kim Steenstrup Pedersen, NHMD
+
+Copyright 2026 Natural History Museum of Denmark (NHMD)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import numpy as np
+
+
+def centroid_array(labels):
+    """Collect the centroids of a list of labels in an array.
+
+       Parameters:
+         labels: list of label dictionaries with a 'centroid' key holding a (row, col) pair.
+
+       Returns:
+         ndarray (N,2) with one (row, col) centroid per label.
+    """
+    if len(labels) == 0:
+        return np.zeros((0, 2))
+    return np.array([label['centroid'] for label in labels], dtype=float)
+
+
+def mirror_centroids(centroids, width):
+    """Mirror centroids left to right, e.g. to map positions on the back side of a sheet that has been turned
+       over to positions on the front side.
+
+       Parameters:
+         centroids: ndarray (N,2) with (row, col) centroids.
+         width: width in pixels of the image the centroids are found in.
+
+       Returns:
+         ndarray (N,2) with the mirrored centroids.
+    """
+    mirrored = np.array(centroids, dtype=float, copy=True)
+    mirrored[:, 1] = (width - 1) - mirrored[:, 1]
+    return mirrored
+
+
+def assign_labels(centroids, reference_centroids, max_distance=None, ambiguity_ratio=0.8):
+    """Find the one-to-one assignment of labels to reference labels with the smallest total centroid distance.
+       The assignment is computed from the full distance matrix with the Hungarian algorithm, so it also works
+       for other layouts than 3x3 sheets and for pairing all labels of a batch at once.
+
+       Parameters:
+         centroids: ndarray (N,2) with (row, col) centroids of the labels to pair, e.g. back side labels.
+         reference_centroids: ndarray (M,2) with (row, col) centroids of the reference labels, e.g. front side labels.
+         max_distance: pairs further apart than this distance in pixels are not accepted. None means no limit.
+         ambiguity_ratio: a pair is ambiguous if the label has another reference label at a distance less than
+                          the pair distance divided by this ratio, i.e. the nearest candidates are almost equally close.
+
+       Returns:
+         dictionary with the keys
+           'match': ndarray (N,) with the index of the assigned reference label for each label or -1 if unmatched.
+           'distance': ndarray (N,) with the distance to the assigned reference label or inf if unmatched.
+           'unmatched': list of indices of labels without a reference label.
+           'unmatched_reference': list of indices of reference labels without a label.
+           'ambiguous': list of indices of labels with an ambiguous pair.
+    """
+    centroids = np.asarray(centroids, dtype=float).reshape(-1, 2)
+    reference_centroids = np.asarray(reference_centroids, dtype=float).reshape(-1, 2)
+    num, num_reference = centroids.shape[0], reference_centroids.shape[0]
+
+    match = np.full(num, -1, dtype=int)
+    distance = np.full(num, np.inf)
+    ambiguous = []
+
+    if num > 0 and num_reference > 0:
+        from scipy.optimize import linear_sum_assignment  # Deferred: slow to import
+        from scipy.spatial.distance import cdist
+
+        dist = cdist(centroids, reference_centroids)
+
+        rows, cols = linear_sum_assignment(dist)
+        if max_distance is not None:
+            accepted = dist[rows, cols] <= max_distance
+            rows, cols = rows[accepted], cols[accepted]
+        match[rows] = cols
+        distance[rows] = dist[rows, cols]
+
+        if num_reference > 1:
+            # A pair is ambiguous if another reference label is (almost) as close as the assigned one
+            nearest_two = np.partition(dist, 1, axis=1)[rows, 0:2]
+            other = np.where(nearest_two[:, 0] == distance[rows], nearest_two[:, 1], nearest_two[:, 0])
+            ambiguous = [int(row) for row in rows[distance[rows] >= ambiguity_ratio * other]]
+
+    assignment = dict()
+    assignment['match'] = match
+    assignment['distance'] = distance
+    assignment['unmatched'] = [int(idx) for idx in np.flatnonzero(match < 0)]
+    assignment['unmatched_reference'] = [int(idx) for idx in np.setdiff1d(np.arange(num_reference), match)]
+    assignment['ambiguous'] = ambiguous
+    return assignment
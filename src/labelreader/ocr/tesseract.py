@@ -19,7 +19,6 @@ See the License for the specific language governing permissions and
 limitations under the License. 
 """
 
-import pytesseract
 #import pandas as pd
 import cv2
 
@@ -35,6 +34,8 @@ class OCR():
         language: String setting the language to use by tesseract. Multi-languages can be defined as e.g. 'eng+dan'
         config: A string with extra options for tesseract - see PyTesseract documentatiton for possibilities.
         """
+        import pytesseract  # Deferred: slow to import
+
         self._tesseract_cmd = tesseract_cmd
         pytesseract.tesseract_cmd = self._tesseract_cmd
         self._language = language
@@ -46,6 +47,8 @@ class OCR():
         """Parses the image and populates the internal data structures of this class.
 
         image - Must be either a path to an image file or a numpy array in RGB color channel order."""
+        import pytesseract  # Deferred: slow to import
+
         self.image = image
         self.ocr_result = pytesseract.image_to_data(image, lang=self._language, output_type=pytesseract.Output.DATAFRAME, config=self._config)
         
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+The triage module implements a fast pre-OCR test for blank labels and pages, such that the
+expensive OCR engine can be skipped for these.
+
+LICENSE
+
+Created on Mon Oct 19 10:12:00 2026
+
+@author: Kim Steenstrup Pedersen, NHMD
+
+Copyright (c) 2026  Natural History Museum of Denmark (NHMD)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import logging
+import numpy as np
+
+
+def downscale_min(img: np.ndarray, max_side: int = 256, margin: float = 0.1) -> np.ndarray:
+    """Crop away a margin and downscale an image by taking the minimum over blocks of pixels and color channels.
+       Using the minimum (instead of the mean) keeps thin dark pen and print strokes visible after downscaling.
+
+       :param img: Image as a numpy array in grayscale (N,M) or color (N,M,C) format
+       :type img: numpy.ndarray
+       :param max_side: Maximum side length in pixels of the downscaled image
+       :type max_side: int
+       :param margin: Fraction of the height and width to crop away on each side before downscaling
+       :type margin: float
+       :return: Downscaled grayscale image with values in [0, 1]
+       :rtype: numpy.ndarray
+    """
+    rows, cols = img.shape[0:2]
+    crop = img[int(margin * rows):rows - int(margin * rows), int(margin * cols):cols - int(margin * cols)]
+    if crop.size == 0:
+        crop = img
+
+    rows, cols = crop.shape[0:2]
+    block = max(1, int(np.ceil(max(rows, cols) / max_side)))
+    rows, cols = (rows // block) * block, (cols // block) * block
+    if rows == 0 or cols == 0:
+        block, rows, cols = 1, crop.shape[0], crop.shape[1]
+
+    crop = crop[0:rows, 0:cols]
+    if crop.ndim == 3:
+        small = crop.reshape(rows // block, block, cols // block, block, crop.shape[2]).min(axis=(1, 3, 4))
+    else:
+        small = crop.reshape(rows // block, block, cols // block, block).min(axis=(1, 3))
+
+    if np.issubdtype(small.dtype, np.integer):
+        return small.astype(float) / np.iinfo(small.dtype).max
+    return small.astype(float)
+
+
+def ink_coverage(img: np.ndarray, ink_contrast: float = 0.25, max_side: int = 256, margin: float = 0.1) -> float:
+    """Estimate the fraction of an image covered with ink. Pixels are considered ink if they are darker than
+       the median (background) intensity by more than ink_contrast.
+
+       :param img: Image as a numpy array in grayscale (N,M) or color (N,M,C) format
+       :type img: numpy.ndarray
+       :param ink_contrast: Intensity difference in [0, 1] to the background for a pixel to be ink
+       :type ink_contrast: float
+       :param max_side: Maximum side length in pixels of the downscaled image used for the estimate
+       :type max_side: int
+       :param margin: Fraction of the height and width to ignore on each side of the image
+       :type margin: float
+       :return: Fraction of ink pixels in the range [0, 1]
+       :rtype: float
+    """
+    small = downscale_min(img, max_side=max_side, margin=margin)
+    background = np.median(small)
+    return float(np.mean(small < background - ink_contrast))
+
+
+def isblank(img: np.ndarray, max_ink_fraction: float = 0.002, min_std: float = 0.03, ink_contrast: float = 0.25,
+            max_side: int = 256, margin: float = 0.1) -> bool:
+    """Return True if the image is blank, i.e. it has (almost) no ink.
+       An image with nearly constant intensity is always blank. Otherwise the ink coverage decides.
+
+       :param img: Image as a numpy array in grayscale (N,M) or color (N,M,C) format
+       :type img: numpy.ndarray
+       :param max_ink_fraction: Maximum fraction of ink pixels in a blank image
+       :type max_ink_fraction: float
+       :param min_std: Images with a standard deviation of intensities below this are blank
+       :type min_std: float
+       :param ink_contrast: Intensity difference in [0, 1] to the background for a pixel to be ink
+       :type ink_contrast: float
+       :param max_side: Maximum side length in pixels of the downscaled image used for the test
+       :type max_side: int
+       :param margin: Fraction of the height and width to ignore on each side of the image
+       :type margin: float
+       :return: True if the image is blank, False otherwise
+       :rtype: bool
+    """
+    small = downscale_min(img, max_side=max_side, margin=margin)
+    if np.std(small) < min_std:
+        return True
+
+    # The image is already cropped and downscaled
+    return ink_coverage(small, ink_contrast=ink_contrast, max_side=max_side, margin=0.0) <= max_ink_fraction
+
+
+class BlankTriage:
+    """
+        Pre-OCR stage that marks blank labels and pages, such that the OCR engine can be skipped for these.
+        The object counts the number of checked and blank items to report the number of saved OCR calls.
+    """
+
+    def __init__(self, enabled: bool = True, **kwargs):
+        """Initialize the triage stage.
+
+            :param enabled: If False no image is considered blank and OCR is always performed
+            :type enabled: bool
+            :param kwargs: Extra keyword arguments passed on to isblank
+        """
+        self.enabled = enabled
+        self.kwargs = kwargs
+        self.checked = 0
+        self.blank = 0
+
+    def isblank(self, img: np.ndarray, name: str = "") -> bool:
+        """Return True if the image is blank and OCR can be skipped.
+
+            :param img: Image as a numpy array in grayscale (N,M) or color (N,M,C) format
+            :type img: numpy.ndarray
+            :param name: Name of the item used for logging
+            :type name: str
+            :return: True if the image is blank, False otherwise
+            :rtype: bool
+        """
+        self.checked += 1
+        if not self.enabled:
+            return False
+
+        blank = isblank(img, **self.kwargs)
+        if blank:
+            self.blank += 1
+            logging.info("Blank item detected - skipping OCR of " + name)
+        return blank
+
+    def report(self) -> str:
+        """Return a text summary of the number of blank items and the number of OCR calls saved.
+
+            :return: Summary text
+            :rtype: str
+        """
+        return "Blank triage: " + str(self.blank) + " of " + str(self.checked) + " items were blank - saved " \
+               + str(self.blank) + " OCR calls"
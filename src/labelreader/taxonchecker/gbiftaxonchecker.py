@@ -22,7 +22,6 @@ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 See the License for the specific language governing permissions and
 limitations under the License.
 """
-from pygbif import species
 from typing import Optional
 
 
@@ -46,6 +45,8 @@ class GBIFTaxonChecker:
             :rtype: Optional[str]
         """
 
+        from pygbif import species  # Deferred: slow to import
+
         # TODO: Restrict the search to Danish national checklist? Or make it optional?
         # https://www.gbif.org/dataset/4b3e4a71-704a-485c-917c-20a89944ea37
         res = species.name_lookup(q=querystring, rank="species", type="checklist", limit=1)
@@ -0,0 +1,148 @@
+"""
+This module implements a taxon name resolution stage for a whole run of a reader. The names found in the parsed
+records are collected while the cards are read, each distinct name is looked up once with a taxon checker in a few
+background threads, and the checked names are filled into the records when the results are written. Parsing and
+OCR therefore never wait for the taxon checker.
+
+LICENSE
+
+Created on Tue Oct 20 00:30:00 2026
+
+@author: Kim Steenstrup Pedersen, NHMD
+
+Copyright (c) 2026  Natural History Museum of Denmark (NHMD)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Iterable, Optional
+
+
+class TaxonResolver:
+    """
+        Resolve the taxon names of the records of a run with a taxon checker, e.g. a
+        labelreader.taxonchecker.gbiftaxonchecker.GBIFTaxonChecker. A record is pending until it is filled if its
+        checked name column is None.
+    """
+
+    def __init__(self, checker, query: Callable[[dict], str], column: str = "GBIF checked scientific name",
+                 workers: int = 4):
+        """Start the resolver.
+
+            :param checker: Taxon checker with a check_full_name method
+            :param query: Function that returns the name to look up for a record
+            :type query: Callable[[dict], str]
+            :param column: Column of the records that receives the checked name
+            :type column: str
+            :param workers: Number of names looked up in parallel
+            :type workers: int
+        """
+        self.checker = checker
+        self.query = query
+        self.column = column
+
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="taxonresolver")
+        self._futures = dict()  # Name -> Future with the checked name
+        self._lock = threading.Lock()
+
+        # Statistics for the report
+        self.filled = 0  # Number of records filled
+        self.failures = 0  # Number of distinct names the checker failed to look up
+
+    def _check(self, name: str) -> Optional[str]:
+        try:
+            return self.checker.check_full_name(name)
+        except Exception as e:
+            logging.warning("Taxon name check of '" + name + "' failed: " + str(e))
+            with self._lock:
+                self.failures += 1
+            return None
+
+    def add(self, name: str) -> Future:
+        """Start looking up a name unless it has been added before.
+
+            :param name: Name to look up
+            :type name: str
+            :return: Future with the checked name, which is None if there is no match
+            :rtype: concurrent.futures.Future
+        """
+        with self._lock:
+            if name not in self._futures:
+                self._futures[name] = self._executor.submit(self._check, name)
+            return self._futures[name]
+
+    def add_record(self, record: dict):
+        """Start looking up the name of a pending record. Other records are ignored.
+
+            :param record: Parsed record
+            :type record: dict
+        """
+        if record is not None and record.get(self.column, "") is None:
+            self.add(self.query(record))
+
+    def add_records(self, records: Iterable[dict]):
+        """Start looking up the names of all pending records, e.g. records written by a previous run.
+
+            :param records: Parsed records
+            :type records: Iterable[dict]
+        """
+        for record in records:
+            self.add_record(record)
+
+    def resolve(self, name: str) -> Optional[str]:
+        """Return the checked name, waiting for the look up if needed.
+
+            :param name: Name to look up
+            :type name: str
+            :return: The checked name or None if there is no match
+            :rtype: Optional[str]
+        """
+        return self.add(name).result()
+
+    def fill(self, record: dict) -> dict:
+        """Fill the checked name into a pending record. Use as the transform of
+           labelreader.util.sink.RecordSink.to_excel.
+
+            :param record: Parsed record
+            :type record: dict
+            :return: The record
+            :rtype: dict
+        """
+        if record.get(self.column, "") is None:
+            record[self.column] = self.resolve(self.query(record))
+            self.filled += 1
+        return record
+
+    def close(self):
+        """Stop the worker threads after the remaining look ups."""
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def report(self) -> str:
+        """Return a summary of the look ups.
+
+            :return: Summary text
+            :rtype: str
+        """
+        text = ("Taxon names: " + str(len(self._futures)) + " distinct names looked up for "
+                + str(self.filled) + " records")
+        if self.failures > 0:
+            text += ", " + str(self.failures) + " look ups failed"
+        return text
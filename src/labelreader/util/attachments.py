@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+"""
+The attachments module contains a writer that compresses and writes the attachment images of the readers (label
+and page TIFF files) in a pool of background threads. The raw image bytes waiting to be written are bounded by
+a budget, such that the main loop only waits for the writer when it gets too far ahead.
+
+LICENSE
+
+Created on Mon Oct 19 22:40:00 2026
+
+@author: Kim Steenstrup Pedersen, NHMD
+
+Copyright (c) 2026  Natural History Museum of Denmark (NHMD)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import collections
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, Future
+from pathlib import Path
+from typing import Any, Callable, Optional, Union
+
+import numpy as np
+
+# TIFF codecs that can be selected and the corresponding Pillow compression names
+CODECS = {
+    "lzw": "tiff_lzw",
+    "deflate": "tiff_adobe_deflate",
+    "packbits": "packbits",
+    "jpeg": "jpeg",
+    "none": "raw"
+}
+
+
+def tiff_options(codec: str = "lzw", level: Optional[int] = None) -> dict:
+    """Create the Pillow save options for a TIFF codec.
+
+       :param codec: One of the keys of CODECS
+       :type codec: str
+       :param level: Quality (0-100) of the 'jpeg' codec. Pillow has no level setting for the lossless codecs.
+       :type level: Optional[int]
+       :return: Keyword arguments for saving with Pillow
+       :rtype: dict
+    """
+    if codec not in CODECS:
+        raise ValueError("Unknown codec '" + codec + "' - choose one of " + ", ".join(CODECS))
+    options = {"compression": CODECS[codec]}
+    if level is not None:
+        if codec != "jpeg":
+            raise ValueError("A level is only supported for the 'jpeg' codec")
+        options["quality"] = level
+    return options
+
+
+def save_tiff(filepath: Union[str, Path], img: np.ndarray, resolution: int, codec: str = "lzw",
+              level: Optional[int] = None):
+    """Save an image as a TIFF file with the resolution in DPI.
+
+       :param filepath: Path to the file
+       :type filepath: Union[str, pathlib.Path]
+       :param img: Image to save
+       :type img: numpy.ndarray
+       :param resolution: Resolution in DPI
+       :type resolution: int
+       :param codec: One of the keys of CODECS
+       :type codec: str
+       :param level: Quality of the 'jpeg' codec
+       :type level: Optional[int]
+    """
+    from skimage.io import imsave  # Deferred: slow to import
+    imsave(str(filepath), img, check_contrast=False, plugin='pil', resolution_unit=2, resolution=resolution,
+           **tiff_options(codec, level))
+
+
+class AttachmentWriter:
+    """
+        Compress and write attachment images in a pool of background threads. Submitting an image blocks while
+        the raw bytes of the images waiting to be written exceed the budget. The first exception raised while
+        writing is re-raised by the next call to submit, poll or close.
+    """
+
+    def __init__(self, workers: int = 2, max_bytes: int = 256 * 1024 * 1024, codec: str = "lzw",
+                 level: Optional[int] = None):
+        """Start the writer.
+
+            :param workers: Number of images compressed and written in parallel
+            :type workers: int
+            :param max_bytes: Budget for the raw bytes of the images submitted but not written yet. An image larger
+                              than the budget is accepted when nothing else is waiting.
+            :type max_bytes: int
+            :param codec: TIFF codec - one of the keys of CODECS
+            :type codec: str
+            :param level: Quality of the 'jpeg' codec
+            :type level: Optional[int]
+        """
+        tiff_options(codec, level)  # Check the options before anything is written
+        self.codec = codec
+        self.level = level
+        self.max_bytes = max_bytes
+
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="attachments")
+        self._budget = threading.Condition()
+        self._inflight = 0  # Raw bytes submitted but not written yet
+        self._pending = collections.deque()  # Futures of the images not known to be written
+        self._callbacks = collections.deque()  # (futures, func, args) run when the futures are done
+        self._error = None
+
+        # Statistics for the throughput report
+        self.count = 0  # Number of files written
+        self.raw_bytes = 0  # Raw image bytes written
+        self.file_bytes = 0  # Bytes of the written files
+        self.write_time = 0.0  # Seconds spent compressing and writing, summed over the workers
+        self.wait_time = 0.0  # Seconds submit waited for the budget
+
+    def _write(self, filepath: str, img: np.ndarray, resolution: int, nbytes: int):
+        try:
+            tic = time.perf_counter()
+            save_tiff(filepath, img, resolution, self.codec, self.level)
+            elapsed = time.perf_counter() - tic
+            with self._budget:
+                self.count += 1
+                self.raw_bytes += nbytes
+                self.file_bytes += os.path.getsize(filepath)
+                self.write_time += elapsed
+        except BaseException as e:
+            with self._budget:
+                if self._error is None:
+                    self._error = e
+            raise
+        finally:
+            with self._budget:
+                self._inflight -= nbytes
+                self._budget.notify_all()
+
+    def _raise_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def _run_callbacks(self, wait: bool = False):
+        """Run the callbacks whose images have been written in the order they were added."""
+        while len(self._callbacks) > 0:
+            futures, func, args = self._callbacks[0]
+            if not wait and not all(future.done() for future in futures):
+                break
+            self._callbacks.popleft()
+            # Skip callbacks of images that failed to be written - the error is raised by the caller
+            if all(future.exception() is None for future in futures):
+                func(*args)
+        while len(self._pending) > 0 and self._pending[0].done():
+            self._pending.popleft()
+
+    def submit(self, filepath: Union[str, Path], img: np.ndarray, resolution: int) -> Future:
+        """Queue an image to be written as a TIFF file. Blocks while the budget is exceeded.
+           The caller must not modify img afterwards.
+
+            :param filepath: Path to the file
+            :type filepath: Union[str, pathlib.Path]
+            :param img: Image to write
+            :type img: numpy.ndarray
+            :param resolution: Resolution in DPI
+            :type resolution: int
+            :return: Future that is done when the file is written
+            :rtype: concurrent.futures.Future
+        """
+        self._raise_error()
+        self._run_callbacks()
+
+        nbytes = img.nbytes
+        tic = time.perf_counter()
+        with self._budget:
+            while self._inflight > 0 and self._inflight + nbytes > self.max_bytes and self._error is None:
+                self._budget.wait()
+            self._inflight += nbytes
+        self.wait_time += time.perf_counter() - tic
+
+        future = self._executor.submit(self._write, str(filepath), img, resolution, nbytes)
+        self._pending.append(future)
+        return future
+
+    def after_written(self, func: Callable, *args: Any):
+        """Call func(*args) once all images submitted so far have been written, e.g. to record a completed unit
+           of work in a run manifest. Callbacks are run in the order they were added by the thread that calls
+           submit, poll or close.
+
+            :param func: Function to call
+            :type func: Callable
+        """
+        self._callbacks.append((list(self._pending), func, args))
+        self._run_callbacks()
+
+    def poll(self):
+        """Run the callbacks that are ready without waiting."""
+        self._raise_error()
+        self._run_callbacks()
+
+    def close(self):
+        """Wait for all images to be written, run the remaining callbacks and stop the worker threads."""
+        try:
+            self._run_callbacks(wait=True)
+        finally:
+            self._executor.shutdown(wait=True)
+        self._raise_error()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            try:
+                self.close()
+            except BaseException:
+                pass  # Do not hide the exception that is already propagating
+
+    def report(self) -> str:
+        """Return a summary of the written attachments and the throughput achieved.
+
+            :return: Summary text
+            :rtype: str
+        """
+        megabytes = 1024 * 1024
+        text = ("Attachments: wrote " + str(self.count) + " files (" + self.codec + ") - "
+                + "{:.1f}".format(self.raw_bytes / megabytes) + " MB raw to "
+                + "{:.1f}".format(self.file_bytes / megabytes) + " MB on disk")
+        if self.write_time > 0:
+            text += (", {:.1f}".format(self.raw_bytes / megabytes / self.write_time) + " MB/s per writer, "
+                     + "{:.1f}".format(self.write_time) + " s writing, "
+                     + "{:.1f}".format(self.wait_time) + " s waiting for the writers")
+        return text
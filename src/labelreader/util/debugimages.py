@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""
+The debugimages module writes the intermediate images of a reader (masks, label images and overlays) to a
+debug directory as they are produced. The images are downscaled and written right away, so nothing is kept in
+memory and no display is needed, which makes the debug mode usable for batch runs on headless servers.
+
+LICENSE
+
+Created on Mon Oct 19 23:50:00 2026
+
+@author: Kim Steenstrup Pedersen, NHMD
+
+Copyright (c) 2026  Natural History Museum of Denmark (NHMD)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import math
+import threading
+from pathlib import Path
+from typing import Union
+
+import numpy as np
+import PIL.Image
+from skimage.util import img_as_ubyte
+
+
+def downscale(img: np.ndarray, max_size: int) -> np.ndarray:
+    """Subsample an image such that its largest dimension is at most max_size pixels. Subsampling keeps the
+       values of masks and labelled images.
+
+       :param img: Image with the rows and columns as the first two axes
+       :type img: numpy.ndarray
+       :param max_size: Maximum number of rows and columns
+       :type max_size: int
+       :return: Subsampled image, which is a view of img
+       :rtype: numpy.ndarray
+    """
+    step = max(1, math.ceil(max(img.shape[0:2]) / max_size))
+    return img[::step, ::step]
+
+
+def to_ubyte(img: np.ndarray) -> np.ndarray:
+    """Convert an image to 8 bit for saving. Boolean masks and 8 bit masks with values 0 and 1 become black and
+       white, labelled images (integer images other than 8 bit) get a color per label and float images are clipped
+       to [0, 1].
+
+       :param img: Image to convert
+       :type img: numpy.ndarray
+       :return: 8 bit gray scale or RGB image
+       :rtype: numpy.ndarray
+    """
+    if img.dtype == bool:
+        return img.astype(np.uint8) * 255
+    if img.dtype == np.uint8:
+        if img.size > 0 and img.max() <= 1:
+            return img * np.uint8(255)
+        return img
+    if np.issubdtype(img.dtype, np.integer):
+        from skimage.color import label2rgb  # Deferred: slow to import
+        return img_as_ubyte(label2rgb(img, bg_label=0))
+    return img_as_ubyte(np.clip(img, 0.0, 1.0))
+
+
+class DebugImages:
+    """
+        Write downscaled debug images of every Nth input image to a directory. The files are named after the
+        input image followed by the name of the debug image, e.g. sheet_segMask.png.
+    """
+
+    def __init__(self, directory: Union[str, Path], every: int = 1, max_size: int = 1024):
+        """Create the debug directory.
+
+            :param directory: Directory to write the debug images to
+            :type directory: Union[str, pathlib.Path]
+            :param every: Only write debug images for every Nth input image, starting with the first
+            :type every: int
+            :param max_size: Maximum number of rows and columns of the written images
+            :type max_size: int
+        """
+        if every < 1:
+            raise ValueError("every must be at least 1")
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.every = every
+        self.max_size = max_size
+        self.count = 0  # Number of debug images written
+        self._seen = 0  # Number of input images passed to select
+        self._lock = threading.Lock()
+
+    def select(self) -> bool:
+        """Call once for each input image in processing order.
+
+            :return: True if debug images should be written for the input image
+            :rtype: bool
+        """
+        with self._lock:
+            selected = self._seen % self.every == 0
+            self._seen += 1
+        return selected
+
+    def save(self, stem: str, name: str, img: np.ndarray) -> Path:
+        """Downscale an image and write it as a PNG file.
+
+            :param stem: Name of the input image the debug image belongs to
+            :type stem: str
+            :param name: Name of the debug image
+            :type name: str
+            :param img: Image, mask or labelled image
+            :type img: numpy.ndarray
+            :return: Path to the written file
+            :rtype: pathlib.Path
+        """
+        filepath = self.directory.joinpath(stem + "_" + name + ".png")
+        PIL.Image.fromarray(to_ubyte(downscale(img, self.max_size))).save(filepath)
+        with self._lock:
+            self.count += 1
+        return filepath
+
+    def overlay(self, stem: str, name: str, img: np.ndarray, label_img: np.ndarray, alpha: float = 0.3) -> Path:
+        """Write an image with the labels of a labelled image, or a mask, drawn in color on top.
+
+            :param stem: Name of the input image the debug image belongs to
+            :type stem: str
+            :param name: Name of the debug image
+            :type name: str
+            :param img: Image
+            :type img: numpy.ndarray
+            :param label_img: Labelled image or mask with the same number of rows and columns as img
+            :type label_img: numpy.ndarray
+            :param alpha: Opacity of the labels
+            :type alpha: float
+            :return: Path to the written file
+            :rtype: pathlib.Path
+        """
+        from skimage.color import label2rgb  # Deferred: slow to import
+
+        labels = downscale(label_img, self.max_size).astype(int)
+        return self.save(stem, name, label2rgb(labels, image=downscale(img, self.max_size), bg_label=0,
+                                               alpha=alpha, image_alpha=1.0))
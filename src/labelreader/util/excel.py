@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+The excel module writes Excel spreadsheets by streaming rows from an iterator of records into a write-only
+openpyxl workbook. Unlike DataFrame.to_excel the whole table is never held in memory, and the cells are written the
+way DataFrame.to_excel(..., index=False) writes them. The header has a fixed style, the one pandas 2 uses.
+
+LICENSE
+
+Created on Mon Oct 19 19:35:00 2026
+
+@author: Kim Steenstrup Pedersen, NHMD
+
+Copyright (c) 2026  Natural History Museum of Denmark (NHMD)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import datetime
+import math
+from pathlib import Path
+from typing import Iterable, Union
+import numpy as np
+import openpyxl
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, Side
+
+
+def header_style() -> dict:
+    """Return the style of the header cells: bold, centered at the top and with thin borders, like
+       DataFrame.to_excel writes the header with pandas 2.
+
+       :return: Dictionary with openpyxl style attributes 'font', 'border' and 'alignment'
+       :rtype: dict
+    """
+    thin = Side(style="thin")
+    return {
+        "font": Font(bold=True),
+        "border": Border(left=thin, right=thin, top=thin, bottom=thin),
+        "alignment": Alignment(horizontal="center", vertical="top")
+    }
+
+
+def cellvalue(value):
+    """Convert a record value to a value openpyxl can write, following DataFrame.to_excel.
+       Missing values (None and NaN) become empty strings.
+
+       :param value: Value of a record field
+       :return: A string, number, boolean or date
+    """
+    if isinstance(value, np.generic):
+        value = value.item()
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return ""
+    if isinstance(value, (str, bool, int, float, datetime.date, datetime.time, datetime.timedelta)):
+        return value
+    return str(value)
+
+
+def write_excel(excelpath: Union[str, Path], records: Iterable[dict], columns: Iterable[str],
+                sheet_name: str = "Sheet1"):
+    """Write records to an Excel spreadsheet one row at a time. Only one record is held in memory at a time.
+
+       :param excelpath: Path to the Excel file
+       :type excelpath: Union[str, pathlib.Path]
+       :param records: Records as dictionaries, e.g. an iterator over a JSON lines file
+       :type records: Iterable[dict]
+       :param columns: Column names. Keys of the records not in columns are ignored and missing keys give
+                       empty cells.
+       :type columns: Iterable[str]
+       :param sheet_name: Name of the sheet
+       :type sheet_name: str
+    """
+    columns = list(columns)
+
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet(sheet_name)
+
+    style = header_style()
+    header = []
+    for column in columns:
+        cell = WriteOnlyCell(sheet, value=cellvalue(column))
+        for name, attribute in style.items():
+            setattr(cell, name, attribute)
+        header.append(cell)
+    sheet.append(header)
+
+    for record in records:
+        sheet.append([cellvalue(record.get(column)) for column in columns])
+
+    workbook.save(str(excelpath))
@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+"""
+The inputs module contains functions for finding the input files of the readers from file names,
+directories, glob patterns and file lists. The input files are enumerated lazily, such that a reader can start
+processing the first file before all files have been found, in a deterministic natural sort order, e.g. scan_2.jpg
+before scan_10.jpg.
+
+LICENSE
+
+Created on Mon Oct 19 16:02:00 2026
+
+@author: Kim Steenstrup Pedersen, NHMD
+
+Copyright (c) 2026  Natural History Museum of Denmark (NHMD)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import fnmatch
+import os
+import re
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, Optional, Tuple
+
+# File suffixes of the raster images the readers understand
+RASTER_SUFFIXES = (".jpg", ".jpeg", ".png", ".tif", ".tiff")
+
+# File suffixes of the images and documents the readers understand
+IMAGE_SUFFIXES = RASTER_SUFFIXES + (".pdf",)
+
+# Prefix of a command line argument naming a file list with one input per line
+FILELIST_PREFIX = "@"
+
+
+def hasglobpattern(text: str) -> bool:
+    """Return True if text contains glob pattern characters.
+
+       :param text: String to analyse
+       :type text: str
+       :return: True if text contains any of the characters '*', '?' or '['
+       :rtype: bool
+    """
+    return any(char in text for char in "*?[")
+
+
+def natsortkey(text: str) -> Tuple:
+    """Sort key for natural sort order, where numbers in the text are compared by value, e.g. 'scan_2.jpg' sorts
+       before 'scan_10.jpg'. Texts that only differ in leading zeros are ordered by the text itself.
+
+       :param text: String to create a sort key for
+       :type text: str
+       :return: Sort key
+       :rtype: tuple
+    """
+    # Splitting on groups of digits puts text at even and numbers at odd positions
+    parts = re.split(r"(\d+)", text)
+    return tuple(int(part) if i % 2 else part for i, part in enumerate(parts)), text
+
+
+def _scandir(dirpath: str, key: Callable[[str], Tuple]) -> list:
+    """List the entries of a directory sorted by key of their names."""
+    try:
+        with os.scandir(dirpath if dirpath else ".") as it:
+            entries = list(it)
+    except OSError:
+        return []
+    entries.sort(key=lambda entry: key(entry.name))
+    return entries
+
+
+def iterdirectory(dirpath: str, key: Callable[[str], Tuple] = natsortkey) -> Iterator[str]:
+    """Walk a directory tree depth first and yield the files. The entries of each directory are sorted by name
+       and only one directory is listed at a time.
+
+       :param dirpath: Directory to walk
+       :type dirpath: str
+       :param key: Sort key function for the names of the entries of a directory
+       :type key: Callable
+       :return: Iterator over file names
+       :rtype: Iterator[str]
+    """
+    for entry in _scandir(dirpath, key):
+        filepath = os.path.join(dirpath, entry.name)
+        if entry.is_dir():
+            yield from iterdirectory(filepath, key)
+        elif entry.is_file():
+            yield filepath
+
+
+def _globparts(dirpath: str, parts: Tuple[str, ...], key: Callable[[str], Tuple]) -> Iterator[str]:
+    """Match the remaining path components of a glob pattern below dirpath."""
+    if len(parts) == 0:
+        yield dirpath
+        return
+
+    part, rest = parts[0], parts[1:]
+    if part == "**":
+        # Zero or more directories - and all files if it is the last component
+        yield from _globparts(dirpath, rest, key)
+        for entry in _scandir(dirpath, key):
+            if entry.name.startswith("."):
+                continue
+            if entry.is_dir():
+                yield from _globparts(os.path.join(dirpath, entry.name), parts, key)
+            elif len(rest) == 0:
+                yield os.path.join(dirpath, entry.name)
+    elif hasglobpattern(part):
+        for entry in _scandir(dirpath, key):
+            # Like glob, wildcards do not match hidden files
+            if entry.name.startswith(".") and not part.startswith("."):
+                continue
+            if fnmatch.fnmatch(entry.name, part) and (len(rest) == 0 or entry.is_dir()):
+                yield from _globparts(os.path.join(dirpath, entry.name), rest, key)
+    else:
+        filepath = os.path.join(dirpath, part)
+        if os.path.lexists(filepath):
+            yield from _globparts(filepath, rest, key)
+
+
+def iterglob(pattern: str, key: Callable[[str], Tuple] = natsortkey) -> Iterator[str]:
+    """Yield the files matching a glob pattern, like glob.glob(pattern, recursive=True), but lazily and in sorted
+       order. The entries of each directory are sorted by name and only one directory is listed at a time.
+
+       :param pattern: Glob pattern, where '**' matches zero or more directories
+       :type pattern: str
+       :param key: Sort key function for the names of the entries of a directory
+       :type key: Callable
+       :return: Iterator over file names
+       :rtype: Iterator[str]
+    """
+    parts = Path(pattern).parts
+    # Start in the longest leading directory without pattern characters
+    first = 0
+    while first < len(parts) and not hasglobpattern(parts[first]):
+        first += 1
+    dirpath = os.path.join(*parts[:first]) if first > 0 else ""
+    for filepath in _globparts(dirpath, parts[first:], key):
+        if os.path.isfile(filepath):
+            yield filepath
+
+
+def iterfilelist(listpath: str) -> Iterator[str]:
+    """Read a file list with one file name, directory name or glob pattern per line. Empty lines and lines
+       starting with '#' are ignored. Relative paths are relative to the directory of the file list.
+
+       :param listpath: Path to the file list
+       :type listpath: str
+       :return: Iterator over the lines of the file list
+       :rtype: Iterator[str]
+    """
+    listdir = os.path.dirname(listpath)
+    with open(listpath, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line == "" or line.startswith("#"):
+                continue
+            yield os.path.join(listdir, line)
+
+
+def iterinputs(items: Iterable[str], suffixes: Iterable[str] = IMAGE_SUFFIXES,
+               key: Optional[Callable[[str], Tuple]] = None) -> Iterator[str]:
+    """Expand a list of file names, directories, glob patterns and file lists into file names.
+       Directories are searched recursively. Files found in directories and by glob patterns are
+       sorted in natural sort order and only files with one of the given suffixes are included.
+       An item starting with '@' names a file list with one file name, directory name or glob pattern per line
+       (see iterfilelist). Explicitly given file names are passed through unchanged and in the given order.
+       The files are found lazily, one directory at a time, so the first file is yielded right away.
+
+       :param items: File names, directory names, glob patterns or '@' followed by the path to a file list
+       :type items: Iterable[str]
+       :param suffixes: Lower case file suffixes (including the dot) of the files to include
+       :type suffixes: Iterable[str]
+       :param key: Sort key function for file and directory names. Default is natural sort order.
+       :type key: Optional[Callable]
+       :return: Iterator over file names
+       :rtype: Iterator[str]
+    """
+    suffixes = tuple(suffixes)
+    if key is None:
+        key = natsortkey
+    for item in items:
+        if item.startswith(FILELIST_PREFIX) and not os.path.exists(item):
+            yield from iterinputs(iterfilelist(item[len(FILELIST_PREFIX):]), suffixes, key)
+            continue
+
+        if os.path.isdir(item):
+            files = iterdirectory(item, key)
+        elif hasglobpattern(item) and not os.path.exists(item):
+            files = iterglob(item, key)
+        else:
+            yield item
+            continue
+
+        for filepath in files:
+            if Path(filepath).suffix.lower() in suffixes:
+                yield filepath
@@ -0,0 +1,415 @@
+# -*- coding: utf-8 -*-
+"""
+The jobqueue module contains a job queue that lets several workers, also on different hosts sharing a directory,
+work through one backlog of a reader. The work units (an image, a PDF file or a front and back image pair) are
+stored in an SQLite database in the queue directory. Workers lease units for a limited time, units with expired
+leases are leased again, and each worker appends its result rows to its own shard file. When all units are done
+the shards are merged into the final table in input order, independent of which worker processed which unit.
+
+SQLite relies on file locking, so the queue directory must be on a file system with working locks. Lease times
+are compared between hosts, so the clocks of the hosts should be synchronized.
+
+LICENSE
+
+Created on Mon Oct 19 23:20:00 2026
+
+@author: Kim Steenstrup Pedersen, NHMD
+
+Copyright (c) 2026  Natural History Museum of Denmark (NHMD)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
+
+from labelreader.util.manifest import filekey
+from labelreader.util.sink import read_records
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS units (
+    seq INTEGER PRIMARY KEY,
+    inputs TEXT NOT NULL UNIQUE,
+    status TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    lease_until REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    shard TEXT,
+    first_row INTEGER,
+    rows INTEGER,
+    error TEXT
+);
+CREATE TABLE IF NOT EXISTS merges (
+    worker TEXT NOT NULL,
+    time REAL NOT NULL
+);
+"""
+
+
+class JobQueue:
+    """
+        Queue of work units stored in an SQLite database. A unit is a list of input file names and its position
+        in the queue is its sequence number, which gives the order of the merged results. A unit is 'pending',
+        'leased' by a worker until its lease expires, 'done' or 'failed' after too many attempts.
+    """
+
+    def __init__(self, filepath: Union[str, Path], lease_seconds: float = 600, max_attempts: int = 3):
+        """Open the queue and create the database if it does not exist.
+
+            :param filepath: Path to the SQLite database
+            :type filepath: Union[str, pathlib.Path]
+            :param lease_seconds: Time a worker may hold a unit before it is given to another worker
+            :type lease_seconds: float
+            :param max_attempts: Number of leases of a unit before it is marked as failed
+            :type max_attempts: int
+        """
+        self.filepath = Path(filepath)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()  # The connection is used by the reader and pipeline threads
+        self._conn = sqlite3.connect(str(self.filepath), timeout=60, isolation_level=None,
+                                     check_same_thread=False)
+        with self._lock:
+            self._conn.executescript(_SCHEMA)
+
+    def _transaction(self, statements: List[Tuple[str, tuple]]) -> List[sqlite3.Cursor]:
+        """Execute statements in one write transaction."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                cursors = [self._conn.execute(sql, params) for sql, params in statements]
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return cursors
+
+    def add(self, units: Iterable[List[str]], batch: int = 100) -> int:
+        """Add units to the queue in order. Units already in the queue are ignored, so several workers can add
+           the same input. Units are committed in batches, such that workers can start on the first units while
+           the rest are found.
+
+            :param units: Lists of input file names
+            :type units: Iterable[list]
+            :param batch: Number of units added per transaction
+            :type batch: int
+            :return: Number of units added
+            :rtype: int
+        """
+        added = 0
+        statements = []
+        for seq, unit in enumerate(units):
+            statements.append(("INSERT OR IGNORE INTO units (seq, inputs) VALUES (?, ?)", (seq, json.dumps(unit))))
+            if len(statements) == batch:
+                added += sum(cursor.rowcount for cursor in self._transaction(statements))
+                statements = []
+        if len(statements) > 0:
+            added += sum(cursor.rowcount for cursor in self._transaction(statements))
+        return added
+
+    def lease(self, worker: str) -> Optional[dict]:
+        """Lease the first pending unit, or the first unit whose lease has expired.
+
+            :param worker: Name of the worker
+            :type worker: str
+            :return: Dictionary with the keys 'seq' and 'inputs', or None if no unit can be leased now
+            :rtype: Optional[dict]
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Units that have been leased too many times without being completed are given up
+                self._conn.execute("UPDATE units SET status = 'failed', worker = NULL, error = 'lease expired' "
+                                   "WHERE status = 'leased' AND lease_until < ? AND attempts >= ?",
+                                   (now, self.max_attempts))
+                row = self._conn.execute("SELECT seq, inputs FROM units WHERE status = 'pending' "
+                                         "OR (status = 'leased' AND lease_until < ?) ORDER BY seq LIMIT 1",
+                                         (now,)).fetchone()
+                if row is not None:
+                    self._conn.execute("UPDATE units SET status = 'leased', worker = ?, lease_until = ?, "
+                                       "attempts = attempts + 1 WHERE seq = ?",
+                                       (worker, now + self.lease_seconds, row[0]))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+        if row is None:
+            return None
+        return {"seq": row[0], "inputs": json.loads(row[1])}
+
+    def renew(self, seq: int, worker: str) -> bool:
+        """Extend the lease of a unit held by the worker.
+
+            :return: False if the worker no longer holds the unit
+            :rtype: bool
+        """
+        cursor, = self._transaction([("UPDATE units SET lease_until = ? WHERE seq = ? AND worker = ? "
+                                      "AND status = 'leased'", (time.time() + self.lease_seconds, seq, worker))])
+        return cursor.rowcount == 1
+
+    def complete(self, seq: int, worker: str, shard: str = None, first_row: int = 0, rows: int = 0) -> bool:
+        """Mark a unit held by the worker as done and record where its result rows are.
+
+            :param seq: Sequence number of the unit
+            :type seq: int
+            :param worker: Name of the worker
+            :type worker: str
+            :param shard: File name of the shard with the result rows relative to the queue directory
+            :type shard: str
+            :param first_row: Index of the first result row of the unit in the shard
+            :type first_row: int
+            :param rows: Number of result rows of the unit
+            :type rows: int
+            :return: False if the unit has been leased by another worker in the meantime
+            :rtype: bool
+        """
+        cursor, = self._transaction([("UPDATE units SET status = 'done', lease_until = NULL, shard = ?, "
+                                      "first_row = ?, rows = ? WHERE seq = ? AND worker = ? AND status = 'leased'",
+                                      (shard, first_row, rows, seq, worker))])
+        return cursor.rowcount == 1
+
+    def fail(self, seq: int, worker: str, error: str):
+        """Give a unit held by the worker back to the queue after an error. The unit is marked as failed
+           after max_attempts attempts."""
+        self._transaction([("UPDATE units SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                            "worker = NULL, lease_until = NULL, error = ? WHERE seq = ? AND worker = ? "
+                            "AND status = 'leased'", (self.max_attempts, error, seq, worker))])
+
+    def counts(self) -> dict:
+        """Return the number of units with each status."""
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM units GROUP BY status").fetchall()
+        counts = {"pending": 0, "leased": 0, "done": 0, "failed": 0}
+        counts.update(dict(rows))
+        return counts
+
+    def leased_by_others(self, worker: str) -> int:
+        """Return the number of units leased by other workers, including units with expired leases."""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM units WHERE status = 'leased' AND worker != ?",
+                                      (worker,)).fetchone()[0]
+
+    def finished(self) -> bool:
+        """Return True if no units are pending or leased."""
+        counts = self.counts()
+        return counts["pending"] == 0 and counts["leased"] == 0
+
+    def done_units(self) -> List[dict]:
+        """Return the done units in sequence order as dictionaries with the keys 'seq', 'inputs', 'shard',
+           'first_row' and 'rows'."""
+        with self._lock:
+            rows = self._conn.execute("SELECT seq, inputs, shard, first_row, rows FROM units WHERE status = 'done' "
+                                      "ORDER BY seq").fetchall()
+        return [{"seq": seq, "inputs": json.loads(inputs), "shard": shard, "first_row": first_row, "rows": count}
+                for seq, inputs, shard, first_row, count in rows]
+
+    def claim_merge(self, worker: str) -> bool:
+        """Claim the merge of the results once the queue is finished, such that only one worker merges.
+
+            :return: True if the worker should merge
+            :rtype: bool
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                pending = self._conn.execute("SELECT COUNT(*) FROM units WHERE status IN ('pending', 'leased')"
+                                             ).fetchone()[0]
+                merged = self._conn.execute("SELECT COUNT(*) FROM merges").fetchone()[0]
+                claim = pending == 0 and merged == 0
+                if claim:
+                    self._conn.execute("INSERT INTO merges (worker, time) VALUES (?, ?)", (worker, time.time()))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return claim
+
+    def close(self):
+        """Close the database connection."""
+        with self._lock:
+            self._conn.close()
+
+
+class QueueWorker:
+    """
+        A worker that leases units from a job queue and appends its result rows to its own shard file. It has the
+        interface of labelreader.util.manifest.RunManifest, so a reader records completed units the same way
+        with and without a queue.
+    """
+
+    def __init__(self, queue: JobQueue, name: Optional[str] = None, poll_seconds: float = 10):
+        """Create a worker.
+
+            :param queue: The job queue
+            :type queue: JobQueue
+            :param name: Unique name of the worker. Default is the host name, process ID and start time.
+            :type name: Optional[str]
+            :param poll_seconds: Time to wait before trying again when units are leased by other workers
+            :type poll_seconds: float
+        """
+        self.queue = queue
+        if name is None:
+            name = socket.gethostname() + "-" + str(os.getpid()) + "-" + str(int(time.time()))
+        self.name = name
+        self.poll_seconds = poll_seconds
+        self.shard = Path("shards", name + ".jsonl")  # Relative to the queue directory
+        self.shardpath = queue.filepath.parent.joinpath(self.shard)
+        self.shardpath.parent.mkdir(parents=True, exist_ok=True)
+
+        self._leased = dict()  # Input file keys of a unit -> sequence number
+        self._lock = threading.Lock()
+        self._next_row = 0  # Index in the shard of the first row of the next completed unit
+
+        # Same attributes as RunManifest
+        self.rows = 0
+        self.units = 0
+        self.skipped = 0
+        self.failed = 0  # Units given back to the queue after an error
+
+    def leases(self) -> Iterator[dict]:
+        """Lease units until no units are left. If units are leased by other workers, wait for them to be
+           completed or for their leases to expire. Units leased by this worker are completed by the caller
+           after the iterator is exhausted.
+
+            :return: Iterator over the leased units as dictionaries with the keys 'seq' and 'inputs'
+            :rtype: Iterator[dict]
+        """
+        while True:
+            unit = self.queue.lease(self.name)
+            if unit is None:
+                if self.queue.leased_by_others(self.name) == 0:
+                    return
+                time.sleep(self.poll_seconds)
+                continue
+            with self._lock:
+                self._leased[tuple(sorted(filekey(filepath) for filepath in unit["inputs"]))] = unit["seq"]
+            yield unit
+
+    def _find(self, inputs: List[Tuple[str, str]], pop: bool) -> Optional[int]:
+        key = tuple(sorted(filekey(filepath) for filepath, hashvalue in inputs))
+        with self._lock:
+            return self._leased.pop(key, None) if pop else self._leased.get(key)
+
+    def iscompleted(self, filepath: Union[str, Path], hashvalue: Optional[str] = None) -> bool:
+        """Leased units are never completed already."""
+        return False
+
+    def leftover_attachments(self) -> set:
+        """Attachments of units given up by other workers are not reused, since the workers might still
+           write them."""
+        return set()
+
+    def record(self, inputs: List[Tuple[str, str]], rows: int, attachments: Iterable[str] = (),
+               status: str = "done"):
+        """Record a unit as completed in the queue, or renew its lease if status is 'partial'. The rows of the
+           units must have been appended to the shard in the order the units are recorded.
+
+            :param inputs: List of (file path, content hash) pairs of the input files of the unit
+            :type inputs: list
+            :param rows: Number of result rows the unit appended to the shard
+            :type rows: int
+            :param attachments: File names of the attachments the unit wrote
+            :type attachments: Iterable[str]
+            :param status: Status of the unit - 'done' or 'partial'
+            :type status: str
+        """
+        if status == "partial":
+            seq = self._find(inputs, pop=False)
+            if seq is not None:
+                self.queue.renew(seq, self.name)
+            return
+
+        first_row = self._next_row
+        self._next_row += rows  # The rows are in the shard whether or not the unit is accepted
+        seq = self._find(inputs, pop=True)
+        if seq is None:
+            logging.warning("Completed inputs " + ", ".join(filepath for filepath, hashvalue in inputs)
+                            + " do not form a leased unit - their rows are not merged")
+        elif self.queue.complete(seq, self.name, self.shard.as_posix(), first_row, rows):
+            self.rows += rows
+            self.units += 1
+        else:
+            logging.warning("The lease of unit " + str(seq) + " expired before it was completed - "
+                            "its rows are not merged")
+
+    def fail(self, inputs: List[Tuple[str, str]], rows: int, error: str, remove: Iterable[Union[str, Path]] = ()):
+        """Give a unit back to the queue after an error, see JobQueue.fail, such that the worker can continue
+           with the next unit. Like record, this must be called in the order the rows of the units were appended
+           to the shard.
+
+            :param inputs: List of (file path, content hash) pairs of the input files of the unit
+            :type inputs: list
+            :param rows: Number of result rows the unit appended to the shard before the error. They are not merged.
+            :type rows: int
+            :param error: Description of the error
+            :type error: str
+            :param remove: Files to remove, e.g. the attachments the unit wrote, since they are written again when
+                           the unit is processed again
+            :type remove: Iterable[Union[str, pathlib.Path]]
+        """
+        self._next_row += rows
+        for filepath in remove:
+            Path(filepath).unlink(missing_ok=True)
+        seq = self._find(inputs, pop=True)
+        if seq is None:
+            logging.warning("Failed inputs " + ", ".join(filepath for filepath, hashvalue in inputs)
+                            + " do not form a leased unit")
+        else:
+            self.queue.fail(seq, self.name, error)
+            self.failed += 1
+
+    def close(self):
+        """Nothing to close - the queue is closed by its owner."""
+        pass
+
+
+def shard_units(queue: JobQueue) -> Iterator[Tuple[dict, List[dict]]]:
+    """Yield the done units in sequence order together with their result rows. The rows of a unit are read from
+       the shard of the worker that completed it, so the result does not depend on which worker processed which
+       unit, and rows of units that were processed again after an expired lease are only included once.
+
+        :param queue: The job queue
+        :type queue: JobQueue
+        :return: Iterator over the done units, as returned by JobQueue.done_units, and their rows
+        :rtype: Iterator[Tuple[dict, List[dict]]]
+    """
+    queuedir = queue.filepath.parent
+    shards = dict()  # Shard file name -> list of rows
+    for unit in queue.done_units():
+        if unit["rows"] == 0:
+            yield unit, []
+            continue
+        if unit["shard"] not in shards:
+            shards[unit["shard"]] = list(read_records(queuedir.joinpath(unit["shard"])))
+        yield unit, shards[unit["shard"]][unit["first_row"]:unit["first_row"] + unit["rows"]]
+
+
+def merge_shards(queue: JobQueue) -> Iterator[dict]:
+    """Yield the result rows of the done units in sequence order, see shard_units.
+
+        :param queue: The job queue
+        :type queue: JobQueue
+        :return: Iterator over the result rows
+        :rtype: Iterator[dict]
+    """
+    for unit, rows in shard_units(queue):
+        yield from rows
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""
+The manifest module keeps a checkpoint manifest of a batch run. For each completed unit of work (an input file,
+or a front and back image pair) the manifest records the content hash of the input files, the status, the number
+of rows the unit added to the results and the attachments it wrote. A resumed run skips the input files of
+completed units and continues appending to the results.
+
+LICENSE
+
+Created on Mon Oct 19 21:50:00 2026
+
+@author: Kim Steenstrup Pedersen, NHMD
+
+Copyright (c) 2026  Natural History Museum of Denmark (NHMD)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import hashlib
+import time
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
+
+from labelreader.util.sink import RecordSink, read_records
+
+
+def filehash(filepath: Union[str, Path], chunksize: int = 1 << 20) -> str:
+    """Compute the SHA-256 hash of the content of a file.
+
+       :param filepath: Path to the file
+       :type filepath: Union[str, pathlib.Path]
+       :param chunksize: Number of bytes read at a time
+       :type chunksize: int
+       :return: Hexadecimal digest
+       :rtype: str
+    """
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for chunk in iter(lambda: f.read(chunksize), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def filekey(filepath: Union[str, Path]) -> str:
+    """Return the key used for an input file in the manifest, which is its absolute path."""
+    return str(Path(filepath).resolve())
+
+
+class RunManifest:
+    """
+        Append-only checkpoint manifest of a batch run stored as a JSON lines file with one entry per
+        completed unit of work and 'partial' entries for the attachments of units in progress.
+    """
+
+    def __init__(self, filepath: Union[str, Path], resume: bool = False):
+        """Open the manifest.
+
+            :param filepath: Path to the manifest file
+            :type filepath: Union[str, pathlib.Path]
+            :param resume: If True the entries of an existing manifest are read and new entries are appended,
+                           otherwise the manifest is truncated
+            :type resume: bool
+        """
+        self.completed = dict()  # Input file key -> content hash of the input files completed in a previous run
+        self.rows = 0  # Number of result rows written by the completed units
+        self.units = 0  # Number of completed units
+        self.skipped = 0  # Number of input files skipped because they are completed
+        self.attachments = set()  # Attachments of completed units
+        self.partial_attachments = set()  # Attachments written by units that were not completed
+
+        filepath = Path(filepath)
+        if resume and filepath.exists():
+            for entry in read_records(filepath):
+                if entry["status"] == "partial":
+                    self.partial_attachments.update(entry["attachments"])
+                if entry["status"] != "done":
+                    continue
+                for inputfile in entry["inputs"]:
+                    self.completed[inputfile["file"]] = inputfile["hash"]
+                self.attachments.update(entry["attachments"])
+                self.rows += entry["rows"]
+                self.units += 1
+
+        self._sink = RecordSink(filepath, append=resume)
+
+    def iscompleted(self, filepath: Union[str, Path], hashvalue: Optional[str] = None) -> bool:
+        """Return True if the input file belongs to a unit completed in a previous run and its content has not
+           changed. Units recorded in this run do not count, such that an input file given twice is processed twice
+           like in a run without a manifest.
+
+            :param filepath: Path to the input file
+            :type filepath: Union[str, pathlib.Path]
+            :param hashvalue: Content hash of the file. Computed if not given.
+            :type hashvalue: Optional[str]
+            :return: True if the file can be skipped
+            :rtype: bool
+        """
+        key = filekey(filepath)
+        if key not in self.completed:
+            return False
+        if hashvalue is None:
+            hashvalue = filehash(filepath)
+        return self.completed[key] == hashvalue
+
+    def pending(self, filepaths: Iterable[str]) -> Iterator[str]:
+        """Skip the input files of units completed in a previous run.
+
+            :param filepaths: Input files in processing order
+            :type filepaths: Iterable[str]
+            :return: Iterator over the input files that still need to be processed
+            :rtype: Iterator[str]
+        """
+        for filepath in filepaths:
+            if self.iscompleted(filepath):
+                self.skipped += 1
+            else:
+                yield filepath
+
+    def leftover_attachments(self) -> set:
+        """Return the attachments written by units that were not completed in a previous run. These are
+           written again when the units are processed, so they can be overwritten.
+
+            :return: Set of attachment names
+            :rtype: set
+        """
+        return self.partial_attachments - self.attachments
+
+    def record(self, inputs: List[Tuple[str, str]], rows: int, attachments: Iterable[str] = (),
+               status: str = "done"):
+        """Record a completed unit of work. Call this after the rows of the unit have been appended to the
+           results and its attachments have been written. Use status 'partial' to record the attachments
+           written so far by a unit that is not completed yet.
+
+            :param inputs: List of (file path, content hash) pairs of the input files of the unit
+            :type inputs: list
+            :param rows: Number of result rows the unit added
+            :type rows: int
+            :param attachments: File names, relative to the output directory, of the attachments the unit wrote
+            :type attachments: Iterable[str]
+            :param status: Status of the unit - 'done' or 'partial'
+            :type status: str
+        """
+        entry = dict()
+        entry["inputs"] = [{"file": filekey(filepath), "hash": hashvalue} for filepath, hashvalue in inputs]
+        entry["status"] = status
+        entry["rows"] = rows
+        entry["attachments"] = list(attachments)
+        entry["time"] = time.strftime("%Y-%m-%d %H:%M:%S")
+        self._sink.append(entry)
+
+        if status == "done":
+            self.attachments.update(entry["attachments"])
+            self.rows += rows
+            self.units += 1
+
+    def close(self):
+        """Close the manifest file."""
+        self._sink.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+The pdfpages module renders the pages of a PDF file one page at a time with ImageMagick (through wand). Opening a
+PDF file with wand.image.Image rasterises all pages of the document up front, which for a few hundred pages at
+600 DPI needs many GB of memory. Here only the page being processed is rasterised, and its pixels are exported
+directly into a NumPy array that can be reused for the next page, so the memory used is bounded by a few pages.
+
+LICENSE
+
+Created on Tue Oct 20 09:40:00 2026
+
+@author: Kim Steenstrup Pedersen, NHMD
+
+Copyright (c) 2026  Natural History Museum of Denmark (NHMD)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import ctypes
+from typing import Iterator, Optional, Tuple
+
+import numpy as np
+
+# Storage type of 8 bit pixel values in MagickExportImagePixels
+CHAR_PIXEL = 1
+
+
+def channelmap(colorspace: str, alpha: bool) -> str:
+    """Return the channels exported for an image, the same as numpy.array(img) gives for a wand image.
+
+       :param colorspace: Colorspace of the image, e.g. 'srgb', 'gray' or 'cmyk'
+       :type colorspace: str
+       :param alpha: True if the image has an alpha channel
+       :type alpha: bool
+       :return: Channel map, e.g. 'RGB'
+       :rtype: str
+    """
+    if colorspace == "gray":
+        channels = "R"
+    elif colorspace == "cmyk":
+        channels = "CMYK"
+    else:
+        channels = "RGB"
+    if alpha:
+        channels += "A"
+    return channels
+
+
+def pagecount(filename: str) -> int:
+    """Return the number of pages in a PDF file. Only the header of the pages is read, not the pixels.
+
+       :param filename: Path to the PDF file
+       :type filename: str
+       :return: Number of pages
+       :rtype: int
+    """
+    from wand.image import Image  # Deferred: needs ImageMagick
+    with Image.ping(filename=filename) as img:
+        return len(img.sequence)
+
+
+def renderpage(filename: str, index: int, resolution: int, out: Optional[np.ndarray] = None) -> np.ndarray:
+    """Rasterise one page of a PDF file.
+
+       :param filename: Path to the PDF file
+       :type filename: str
+       :param index: Page index starting from 0
+       :type index: int
+       :param resolution: Resolution in DPI
+       :type resolution: int
+       :param out: Array to export the pixels into. A new array is allocated if out is None or does not have the
+                   shape of the page.
+       :type out: Optional[numpy.ndarray]
+       :return: Image of the page with shape (height, width, channels) and dtype uint8
+       :rtype: numpy.ndarray
+    """
+    from wand.api import library  # Deferred: needs ImageMagick
+    from wand.image import Image
+
+    # ImageMagick only rasterises the page selected in brackets
+    with Image(filename=filename + "[" + str(index) + "]", resolution=resolution) as page:
+        channels = channelmap(page.colorspace, page.alpha_channel)
+        shape = (page.height, page.width, len(channels))
+        if out is None or out.shape != shape or out.dtype != np.uint8 or not out.flags.c_contiguous:
+            out = np.empty(shape, dtype=np.uint8)
+        if not library.MagickExportImagePixels(page.wand, 0, 0, page.width, page.height, channels.encode("ascii"),
+                                               CHAR_PIXEL, out.ctypes.data_as(ctypes.c_void_p)):
+            page.raise_exception()
+    return out
+
+
+def iterpages(filename: str, resolution: int, first: int = 1, last: Optional[int] = None,
+              reuse: bool = True) -> Iterator[Tuple[int, np.ndarray]]:
+    """Rasterise the pages of a PDF file one at a time. The next page is only rasterised when it is requested.
+
+       :param filename: Path to the PDF file
+       :type filename: str
+       :param resolution: Resolution in DPI
+       :type resolution: int
+       :param first: Number of the first page, starting from 1
+       :type first: int
+       :param last: Number of the last page. Default is the last page of the file.
+       :type last: Optional[int]
+       :param reuse: If True the pages are rendered into the same array, which is overwritten by the next page. Use
+                     False if the images of earlier pages are kept, e.g. while they are written in the background.
+       :type reuse: bool
+       :return: Iterator over the page numbers and images of the pages
+       :rtype: Iterator[Tuple[int, numpy.ndarray]]
+    """
+    if last is None:
+        last = pagecount(filename)
+    buffer = None
+    for no_page in range(first, last + 1):
+        img = renderpage(filename, no_page - 1, resolution, out=buffer if reuse else None)
+        if reuse:
+            buffer = img
+        yield no_page, img
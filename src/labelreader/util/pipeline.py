@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""
+The pipeline module contains helpers for running the stages of a reader concurrently using threads
+and bounded queues, such that reading, processing and writing of images can overlap.
+
+LICENSE
+
+Created on Mon Oct 19 17:30:00 2026
+
+@author: Kim Steenstrup Pedersen, NHMD
+
+Copyright (c) 2026  Natural History Museum of Denmark (NHMD)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import collections
+import queue
+import threading
+from concurrent.futures import Executor, wait
+from typing import Any, Callable, Iterable, Iterator, Tuple
+
+_DONE = object()  # Marks the end of a queue
+
+
+def prefetch(iterable: Iterable, func: Callable, maxsize: int = 2) -> Iterator:
+    """Apply func to each item of iterable in a background thread and yield the results in input order.
+       At most maxsize results are computed ahead of the consumer, which bounds the memory use.
+       Exceptions raised by func are re-raised in the consumer.
+
+       :param iterable: Items to process
+       :type iterable: Iterable
+       :param func: Function applied to each item
+       :type func: Callable
+       :param maxsize: Maximum number of results waiting to be consumed
+       :type maxsize: int
+       :return: Iterator over the results of func
+       :rtype: Iterator
+    """
+    results = queue.Queue(maxsize=maxsize)
+    stop = threading.Event()
+
+    def put(item):
+        # Retry such that the producer notices when the consumer stops early
+        while not stop.is_set():
+            try:
+                results.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put((True, func(item))):
+                    return
+        except BaseException as e:
+            put((False, e))
+            return
+        put((True, _DONE))
+
+    thread = threading.Thread(target=produce, name="prefetch", daemon=True)
+    thread.start()
+    try:
+        while True:
+            ok, result = results.get()
+            if not ok:
+                raise result
+            if result is _DONE:
+                break
+            yield result
+    finally:
+        stop.set()
+        thread.join()
+
+
+def ordered_map(executor: Executor, func: Callable, iterable: Iterable, maxsize: int) -> Iterator[Tuple[Any, Any]]:
+    """Apply func to each item of iterable in an executor and yield (item, result) pairs in input order.
+       Unlike Executor.map, the items are submitted lazily and at most maxsize items are in flight, such that
+       the first results are available before the iterable is exhausted. When the iterator is closed early, e.g.
+       after an error, the items not started are cancelled and the running items are waited for.
+
+       :param executor: Executor, e.g. a ProcessPoolExecutor, that runs func
+       :type executor: concurrent.futures.Executor
+       :param func: Function applied to each item
+       :type func: Callable
+       :param iterable: Items to process
+       :type iterable: Iterable
+       :param maxsize: Maximum number of items submitted but not yet yielded
+       :type maxsize: int
+       :return: Iterator over (item, result) pairs
+       :rtype: Iterator[tuple]
+    """
+    pending = collections.deque()
+    try:
+        for item in iterable:
+            pending.append((item, executor.submit(func, item)))
+            if len(pending) >= maxsize:
+                item, future = pending.popleft()
+                yield item, future.result()
+        while len(pending) > 0:
+            item, future = pending.popleft()
+            yield item, future.result()
+    finally:
+        for item, future in pending:
+            future.cancel()
+        wait([future for item, future in pending])
+
+
+class BackgroundWorker:
+    """
+        Run jobs (function calls) in order in a background thread. Jobs are fed through a bounded queue,
+        such that submit blocks when the worker falls too far behind. The first exception raised by
+        a job is re-raised by the next call to submit or close.
+    """
+
+    def __init__(self, maxsize: int = 16, name: str = "background"):
+        """Start the background thread.
+
+            :param maxsize: Maximum number of jobs waiting in the queue
+            :type maxsize: int
+            :param name: Name of the thread
+            :type name: str
+        """
+        self._jobs = queue.Queue(maxsize=maxsize)
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            job = self._jobs.get()
+            if job is _DONE:
+                break
+            func, args, kwargs = job
+            if self._error is None:  # Skip remaining jobs after an error
+                try:
+                    func(*args, **kwargs)
+                except BaseException as e:
+                    self._error = e
+
+    def _raise_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def submit(self, func: Callable, *args: Any, **kwargs: Any):
+        """Queue the call func(*args, **kwargs). Blocks if the queue is full.
+
+            :param func: Function to call in the background thread
+            :type func: Callable
+        """
+        self._raise_error()
+        self._jobs.put((func, args, kwargs))
+
+    def close(self):
+        """Wait for all queued jobs to finish and stop the background thread."""
+        if self._thread.is_alive():
+            self._jobs.put(_DONE)
+            self._thread.join()
+        self._raise_error()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            try:
+                self.close()
+            except BaseException:
+                pass  # Do not hide the exception that is already propagating
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+The records module contains a lightweight collector of transcribed records. The parsers of the readers create one
+record (a dictionary with column names as keys) per card, label or table line, and the collector accumulates them
+in a list and creates a Pandas data frame once, instead of growing a data frame with pd.concat for every record.
+
+LICENSE
+
+Created on Mon Oct 19 20:10:00 2026
+
+@author: Kim Steenstrup Pedersen, NHMD
+
+Copyright (c) 2026  Natural History Museum of Denmark (NHMD)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+from typing import TYPE_CHECKING, Iterable, Iterator, Optional
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+class RecordCollector:
+    """
+        Accumulate records (one dictionary per row) and create a data frame with all of them at once.
+    """
+
+    def __init__(self, columns: Iterable[str] = ()):
+        """Create an empty collector.
+
+            :param columns: Columns of the data frame. Keys of the records not in columns are added as
+                            extra columns in the order they are first seen.
+            :type columns: Iterable[str]
+        """
+        self.columns = list(columns)
+        self.records = []
+
+    def append(self, record: Optional[dict]):
+        """Add a record. None is ignored, such that parsers can return None for no record.
+
+            :param record: Dictionary with column names as keys
+            :type record: Optional[dict]
+        """
+        if record is not None:
+            self.records.append(record)
+
+    def extend(self, records: Iterable[dict]):
+        """Add several records.
+
+            :param records: Dictionaries with column names as keys
+            :type records: Iterable[dict]
+        """
+        for record in records:
+            self.append(record)
+
+    def clear(self):
+        """Remove all records."""
+        self.records = []
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __iter__(self) -> Iterator[dict]:
+        return iter(self.records)
+
+    def to_dataframe(self) -> "pd.DataFrame":
+        """Create a data frame with one row per record. Missing keys give NaN values and the column dtypes
+           are inferred from the values.
+
+            :return: Data frame with the records
+            :rtype: pandas.DataFrame
+        """
+        import pandas as pd  # Deferred: slow to import
+
+        columns = list(self.columns)
+        seen = set(columns)
+        for record in self.records:
+            for column in record:
+                if column not in seen:
+                    seen.add(column)
+                    columns.append(column)
+        return pd.DataFrame.from_records(self.records, columns=columns)
@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+"""
+The sink module contains an append-only record writer used by the readers to store each finished record on disk
+as soon as it is produced. Records are written as JSON lines, so the cost of writing a record does not depend on
+the number of records already written and a crashed run only loses the record being written. The final
+spreadsheet is produced once from the JSON lines file at the end of a run or on demand.
+
+LICENSE
+
+Created on Mon Oct 19 18:40:00 2026
+
+@author: Kim Steenstrup Pedersen, NHMD
+
+Copyright (c) 2026  Natural History Museum of Denmark (NHMD)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import json
+import logging
+import os
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Iterable, Iterator, Optional, Union
+import numpy as np
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+
+def _tojson(value):
+    """Convert values json does not know, e.g. numpy scalars, to Python values."""
+    if isinstance(value, np.generic):
+        return value.item()
+    return str(value)
+
+
+def _truncate_incomplete(filepath: Path):
+    """Remove an incomplete last line (one without a line break) from a file."""
+    with open(filepath, "rb+") as f:
+        size = f.seek(0, os.SEEK_END)
+        end = size
+        while end > 0:
+            # Search backwards for the last line break
+            start = max(0, end - 4096)
+            f.seek(start)
+            pos = f.read(end - start).rfind(b"\n")
+            if pos >= 0:
+                end = start + pos + 1
+                break
+            end = start
+        if end < size:
+            logging.warning("Removing incomplete record at the end of " + str(filepath))
+            f.truncate(end)
+
+
+def _truncate_records(filepath: Path, count: int):
+    """Keep only the first count records (non-empty lines) of a file."""
+    with open(filepath, "rb+") as f:
+        kept = 0
+        end = 0
+        for line in f:
+            if kept == count:
+                break
+            end += len(line)
+            if line.strip() != b"":
+                kept += 1
+        if end < f.seek(0, os.SEEK_END):
+            logging.warning("Removing records after record " + str(count) + " of " + str(filepath))
+            f.truncate(end)
+
+
+def read_records(filepath: Union[str, Path]) -> Iterator[dict]:
+    """Read the records of a JSON lines file written by RecordSink one at a time.
+       An incomplete last line, e.g. left by a crash, is skipped with a warning.
+
+       :param filepath: Path to the JSON lines file
+       :type filepath: Union[str, pathlib.Path]
+       :return: Iterator over the records as dictionaries
+       :rtype: Iterator[dict]
+    """
+    with open(filepath, "r", encoding="utf-8") as f:
+        for lineno, line in enumerate(f, start=1):
+            if line.strip() == "":
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                logging.warning("Skipping incomplete record in line " + str(lineno) + " of " + str(filepath))
+
+
+def records_to_dataframe(records: Iterable[dict], columns: Iterable[str] = ()) -> "pd.DataFrame":
+    """Create a data frame from records. The columns are the given columns followed by any other keys of
+       the records in the order they are first seen, which is the column order pd.concat gives.
+
+       :param records: Records as dictionaries
+       :type records: Iterable[dict]
+       :param columns: Columns that are always included, e.g. the columns of the reader's empty_dataframe()
+       :type columns: Iterable[str]
+       :return: Data frame with one row per record
+       :rtype: pandas.DataFrame
+    """
+    import pandas as pd  # Deferred: slow to import
+
+    columns = list(columns)
+    df = pd.DataFrame(list(records))
+    columns += [column for column in df.columns if column not in columns]
+    return df.reindex(columns=columns)
+
+
+class RecordSink:
+    """
+        Append-only writer of records (one dictionary per row) to a JSON lines file. Each record is
+        flushed to disk when it is appended.
+    """
+
+    def __init__(self, filepath: Union[str, Path], columns: Iterable[str] = (), append: bool = False,
+                 sync: bool = False, keep: Optional[int] = None):
+        """Open the JSON lines file.
+
+            :param filepath: Path to the JSON lines file
+            :type filepath: Union[str, pathlib.Path]
+            :param columns: Columns that are always included in the spreadsheet, e.g. the columns of the
+                            reader's empty_dataframe()
+            :type columns: Iterable[str]
+            :param append: If True records are appended to an existing file, otherwise the file is truncated.
+                           An incomplete last record, e.g. left by a crash, is removed before appending.
+            :type append: bool
+            :param sync: If True each record is also synced to the storage device with os.fsync
+            :type sync: bool
+            :param keep: When appending, only the first keep records of the existing file are kept, e.g. the
+                         records of the completed units of a resumed run. None keeps all records.
+            :type keep: Optional[int]
+        """
+        self.filepath = Path(filepath)
+        self.columns = list(columns)
+        self.sync = sync
+        self.count = 0  # Number of records appended by this sink
+        if append and self.filepath.exists():
+            _truncate_incomplete(self.filepath)
+            if keep is not None:
+                _truncate_records(self.filepath, keep)
+        self._file = open(self.filepath, "a" if append else "w", encoding="utf-8")
+
+    def append(self, record: dict):
+        """Append a single record and flush it to disk.
+
+            :param record: Dictionary with column names as keys
+            :type record: dict
+        """
+        self._file.write(json.dumps(record, ensure_ascii=False, default=_tojson) + "\n")
+        self._file.flush()
+        if self.sync:
+            os.fsync(self._file.fileno())
+        self.count += 1
+
+    def append_dataframe(self, df: "pd.DataFrame"):
+        """Append each row of a data frame as a record.
+
+            :param df: Data frame with the records to append
+            :type df: pandas.DataFrame
+        """
+        for record in df.to_dict(orient="records"):
+            self.append(record)
+
+    def close(self):
+        """Close the JSON lines file."""
+        if not self._file.closed:
+            self._file.close()
+
+    def to_dataframe(self) -> "pd.DataFrame":
+        """Read all records written to the file into a data frame.
+
+            :return: Data frame with one row per record
+            :rtype: pandas.DataFrame
+        """
+        if not self._file.closed:
+            self._file.flush()
+        return records_to_dataframe(read_records(self.filepath), self.columns)
+
+    def record_columns(self) -> list:
+        """Return the columns of the records written to the file. These are the columns given to the sink
+           followed by any other keys of the records in the order they are first seen.
+
+            :return: List of column names
+            :rtype: list
+        """
+        if not self._file.closed:
+            self._file.flush()
+        columns = list(self.columns)
+        seen = set(columns)
+        for record in read_records(self.filepath):
+            for column in record:
+                if column not in seen:
+                    seen.add(column)
+                    columns.append(column)
+        return columns
+
+    def to_excel(self, excelpath: Union[str, Path], transform: Optional[Callable[[dict], dict]] = None):
+        """Write all records written to the file to an Excel spreadsheet. The records are streamed from
+           the file, so memory use does not depend on the number of records.
+
+            :param excelpath: Path to the Excel file
+            :type excelpath: Union[str, pathlib.Path]
+            :param transform: Function applied to each record before it is written, e.g. to fill in columns
+                              that are resolved at the end of a run. The file itself is not changed.
+            :type transform: Optional[Callable[[dict], dict]]
+        """
+        from labelreader.util.excel import write_excel  # Deferred: slow to import
+
+        columns = self.record_columns()
+        records = read_records(self.filepath)
+        if transform is not None:
+            records = map(transform, records)
+        write_excel(excelpath, records, columns)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""
+The timelimit module limits the wall time of a block of code, e.g. parsing one card, with a timer signal. A block
+that exceeds its budget is interrupted by a TimeLimitExceeded exception, so the caller can fall back to a cheaper
+method instead of waiting.
+
+Timer signals are only available on Unix and can only be handled in the main thread. Elsewhere the block runs
+without a limit.
+
+LICENSE
+
+Created on Tue Oct 20 02:10:00 2026
+
+@author: Kim Steenstrup Pedersen, NHMD
+
+Copyright (c) 2026  Natural History Museum of Denmark (NHMD)
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import signal
+import threading
+from contextlib import contextmanager
+from typing import Optional
+
+
+class TimeLimitExceeded(Exception):
+    """Raised in a block of code run with time_limit when its budget is exceeded."""
+    pass
+
+
+def supported() -> bool:
+    """Return True if time limits can be enforced in the calling thread.
+
+       :return: True on Unix in the main thread
+       :rtype: bool
+    """
+    return hasattr(signal, "setitimer") and threading.current_thread() is threading.main_thread()
+
+
+@contextmanager
+def time_limit(seconds: Optional[float]):
+    """Run a block of code with a limit on its wall time. The block is interrupted with TimeLimitExceeded when the
+       limit is exceeded. Time limits can not be nested.
+
+       :param seconds: Budget of the block in seconds. None, 0 or a negative number means no limit.
+       :type seconds: Optional[float]
+    """
+    if seconds is None or seconds <= 0 or not supported():
+        yield
+        return
+
+    def expired(signum, frame):
+        raise TimeLimitExceeded("Time limit of " + str(seconds) + " seconds exceeded")
+
+    previous = signal.signal(signal.SIGALRM, expired)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
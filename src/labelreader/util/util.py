@@ -24,31 +24,134 @@ limitations under the License.
 """
 
 from pathlib import Path
+import os
 import re
 import logging
-from typing import Optional
+import threading
+from typing import Iterable, Optional
 
 
-def checkfilepath(filepath: Path) -> Path:
+def checkfilepath(filepath: Path, reserved: Optional[set] = None, overwrite: Optional[set] = None) -> Path:
     """Check if filepath exists and if so create a new path with '.x' added before file suffix,
     where x is an integer
 
     :param filepath: A pathlib.Path object pointing to the file path to be checked
     :type filepath: pathlib.Path
+    :param reserved: Optional set of file paths that are taken even if they do not exist on disk yet, e.g.
+                     because they are still being written. The returned file path is added to the set.
+    :type reserved: Optional[set]
+    :param overwrite: Optional set of file paths that may be overwritten even if they exist, e.g. files left over
+                      by an interrupted run that are written again. The returned file path is removed from the
+                      set, such that it is overwritten only once.
+    :type overwrite: Optional[set]
     :return: A pathlib.Path object pointing to the file path, possibly with an extra suffix
     :rtype: pathlib.Path
     """
     extension = 2
-    while filepath.exists():
+    while (filepath.exists() and not (overwrite is not None and filepath in overwrite)) \
+            or (reserved is not None and filepath in reserved):
         if extension == 2:
             filepath = filepath.parent.joinpath(filepath.stem + "." + str(extension) + filepath.suffix)
         else:
             filepath = filepath.parent.joinpath(Path(filepath.stem).stem + "." + str(extension) + filepath.suffix)
         extension += 1  # Update in case we need it next round
 
+    if reserved is not None:
+        reserved.add(filepath)
+    if overwrite is not None:
+        overwrite.discard(filepath)
+
     return filepath
 
 
+def numberedname(filepath: Path, extension: int) -> Path:
+    """Create the file path with '.x' added before the file suffix, where x is the integer extension, as used
+    by checkfilepath. Extension 1 gives the file path itself.
+
+    :param filepath: A pathlib.Path object pointing to the file path
+    :type filepath: pathlib.Path
+    :param extension: Integer added to the file name
+    :type extension: int
+    :return: A pathlib.Path object pointing to the numbered file path
+    :rtype: pathlib.Path
+    """
+    if extension == 1:
+        return filepath
+    return filepath.parent.joinpath(filepath.stem + "." + str(extension) + filepath.suffix)
+
+
+class FilenameAllocator:
+    """
+    Allocate unique output file paths with the same naming as checkfilepath - name.tif, name.2.tif, name.3.tif
+    and so on. The names in an output directory are read once, when the first file path in it is allocated,
+    and allocated names are reserved in memory, so no file system probing is needed per file. The allocator can
+    be shared by threads. With exclusive=True each allocated file is also created empty with an exclusive
+    create, such that processes writing to the same output directory never get the same name.
+    """
+
+    def __init__(self, exclusive: bool = False, overwrite: Optional[Iterable[Path]] = None):
+        """Create an allocator.
+
+        :param exclusive: If True the allocated files are created atomically, which is safe for processes
+                          sharing an output directory
+        :type exclusive: bool
+        :param overwrite: Optional file paths that may be allocated although they exist, e.g. files left over
+                          by an interrupted run that are written again
+        :type overwrite: Optional[Iterable[Path]]
+        """
+        self.exclusive = exclusive
+        self._overwrite = set(Path(filepath) for filepath in overwrite) if overwrite is not None else set()
+        self._taken = dict()  # Directory -> set of names that are taken
+        self._next = dict()  # File path -> next extension to try
+        self._lock = threading.Lock()
+
+    def _names(self, directory: Path) -> set:
+        """Return the names taken in a directory, reading the directory the first time."""
+        names = self._taken.get(directory)
+        if names is None:
+            names = set()
+            if directory.is_dir():
+                with os.scandir(directory) as it:
+                    names = set(entry.name for entry in it)
+            names -= set(filepath.name for filepath in self._overwrite if filepath.parent == directory)
+            self._taken[directory] = names
+        return names
+
+    def _create(self, filepath: Path) -> bool:
+        """Create an empty file atomically. Returns False if the file exists already."""
+        try:
+            os.close(os.open(filepath, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        except FileExistsError:
+            return False
+        return True
+
+    def allocate(self, filepath: Path) -> Path:
+        """Return filepath if it is not taken, otherwise a new path with '.x' added before the file suffix,
+        where x is the smallest integer from 2 that gives a free name. The returned path is taken afterwards.
+
+        :param filepath: A pathlib.Path object pointing to the file path wanted
+        :type filepath: pathlib.Path
+        :return: A pathlib.Path object pointing to the file path, possibly with an extra suffix
+        :rtype: pathlib.Path
+        """
+        filepath = Path(filepath)
+        with self._lock:
+            names = self._names(filepath.parent)
+            # Names are never released, so the extensions tried before for this file path are still taken
+            extension = self._next.get(filepath, 1)
+            while True:
+                candidate = numberedname(filepath, extension)
+                extension += 1
+                if candidate.name in names:
+                    continue
+                names.add(candidate.name)
+                if self.exclusive and candidate not in self._overwrite and not self._create(candidate):
+                    continue  # Created by another process since the directory was read
+                break
+            self._next[filepath] = extension
+        return candidate
+
+
 def roman2int(roman: str) -> Optional[int]:
     """Convert a roman numeral string into integer.
        Also interprets 1 to I.
@@ -12,84 +12,171 @@ You may obtain a copy of the License at
 
 http://www.apache.org/licenses/LICENSE-2.0
 
-Unless required by applicable law or agreed to in writing, software 
-distributed under the License is distributed on an "AS IS" BASIS, 
-WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. 
-See the License for the specific language governing permissions and 
-limitations under the License. 
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
 """
 
 import argparse
+import csv
+import json
+import os
+import sys
+import time
+import multiprocessing
 import cv2
-import pytesseract
 import zxingcpp
-import pprint
-#from pyzbar import pyzbar
-#from pyzbar.pyzbar import ZBarSymbol
-#import pylibdmtx.pylibdmtx as dmtx
-
-# construct the argument parser and parse the arguments
-ap = argparse.ArgumentParser()
-ap.add_argument("-t", "--tesseract", required=True,
-                help="path to tesseract executable")
-ap.add_argument("-i", "--image", required=True,
-                help="file name for and path to input image")
-ap.add_argument("-l", "--language", required=False, default="eng",
-                help="language that tesseract uses - depends on installed tesseract language packages")
-ap.add_argument("-c", "--codeformat", required=False, default='none', choices=['dmtx', 'qr', 'none'],
-                help="choose between searching for QR code (qr) or Data Matrix code (dmtx). Default=none - no search.")
-args = vars(ap.parse_args())
-
-print("Using language = " + args["language"] + "\n")
-
-
-# Create OCR Tesseract object
-pytesseract.tesseract_cmd = args["tesseract"]
-
-
-# Read an image
-img = cv2.imread(args["image"])
-img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-img_gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-
-if args["codeformat"] == 'qr':
-    # Find the QR codes in the image and decode each of the barcodes
-    # Inspired by https://www.pyimagesearch.com/2018/05/21/an-opencv-barcode-and-qr-code-scanner-with-zbar/
-    # pyzbar is developed by NHM London, https://github.com/NaturalHistoryMuseum/pyzbar
-
-    height, width = img_gray.shape[:2]
-    #qrcodes = pyzbar.decode((img_gray.tobytes(), width, height), symbols=[ZBarSymbol.QRCODE])
-    qrcodes = zxingcpp.read_barcodes(img_gray, formats=zxingcpp.QRCode)
-
-    print("QR codes:\n")
-    print(qrcodes)
-
-elif args["codeformat"] == 'dmtx':
-    # Find Data Matrix codes in the image and decode
-    # https://github.com/NaturalHistoryMuseum/pylibdmtx/ as maintained by NHM London
-    # REALLY SLOW - must detect code area and do a cropping of the image before calling decode
-    #dmcodes = dmtx.decode(img_rgb)
-
-    # Much faster
-    dmcodes = zxingcpp.read_barcodes(img, formats=zxingcpp.DataMatrix)
-    #dmcodes = zxingcpp.read_barcode(img)
-
-    print("Data Matrix codes:\n")
-    for dmcode in dmcodes:
-        print(
-            "Found barcode:"
-            f'\n Text:    "{dmcode.text}"'
-            f"\n Format:   {dmcode.format}"
-            f"\n Content:  {dmcode.content_type}"
-            f"\n Position: {dmcode.position}"
-            f"\n Orientation: {dmcode.orientation}"
-        )
-
-
-# Run it through the OCR engine
-# See https://github.com/madmaze/pytesseract
-print("\n OCR read text:\n")
-print(pytesseract.image_to_string(img_rgb, lang=args["language"]))
-
-# ocr_result = pytesseract.image_to_data(img_rgb, lang=args["language"])
-# ocr_boxes = pytesseract.image_to_boxes(img_rgb, lang=args["language"])
+from pathlib import Path
+
+from labelreader.barcode import barcode
+from labelreader.util.inputs import iterinputs, RASTER_SUFFIXES
+
+
+CODE_FORMATS = {
+    "dmtx": zxingcpp.DataMatrix,
+    "qr": zxingcpp.QRCode,
+    "all": barcode.DEFAULT_FORMATS,
+    "none": None
+}
+
+CSV_FIELDS = ["image", "status", "code_count", "codes", "formats", "ocr_text", "seconds", "error"]
+
+# Per process state of the worker processes - set by init_worker
+worker_state = dict()
+
+
+def init_worker(args):
+    """Initialize the state of a worker process."""
+    worker_state["args"] = args
+    if args["ocr"]:
+        import pytesseract  # Deferred: slow to import
+
+        pytesseract.pytesseract.tesseract_cmd = args["tesseract"]
+
+
+def scan_image(imgfilename):
+    """Decode the codes in and optionally OCR one image.
+
+        imgfilename: Path to the image
+        Return: Dictionary with the result for the image
+    """
+    args = worker_state["args"]
+    start = time.perf_counter()
+
+    result = dict()
+    result["image"] = imgfilename
+    result["status"] = "ok"
+    result["codes"] = []
+    result["ocr_text"] = ""
+    result["error"] = ""
+
+    try:
+        img = cv2.imread(imgfilename)
+        if img is None:
+            raise IOError("could not read image")
+        img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+
+        formats = CODE_FORMATS[args["codeformat"]]
+        if formats is not None:
+            result["codes"] = barcode.read_barcodes(img_rgb, formats=formats, fallback=True)
+            if len(result["codes"]) == 0:
+                result["status"] = "no code"
+
+        if args["ocr"]:
+            import pytesseract  # Deferred: slow to import
+
+            # See https://github.com/madmaze/pytesseract
+            result["ocr_text"] = pytesseract.image_to_string(img_rgb, lang=args["language"])
+    except Exception as e:
+        result["status"] = "error"
+        result["error"] = str(e)
+
+    result["seconds"] = round(time.perf_counter() - start, 3)
+    return result
+
+
+class ResultWriter:
+    """Write scan results one at a time as CSV or JSON lines."""
+
+    def __init__(self, stream, fmt):
+        """Initialize the writer.
+
+            stream: Text stream to write to
+            fmt: Output format - either 'csv' or 'jsonl'
+        """
+        self.stream = stream
+        self.fmt = fmt
+        if fmt == "csv":
+            self.writer = csv.DictWriter(stream, fieldnames=CSV_FIELDS)
+            self.writer.writeheader()
+
+    def write(self, result):
+        """Write a single result and flush it to disk."""
+        if self.fmt == "csv":
+            row = dict(result)
+            row["code_count"] = len(result["codes"])
+            row["codes"] = "|".join(code["text"] for code in result["codes"])
+            row["formats"] = "|".join(code["format"] for code in result["codes"])
+            self.writer.writerow(row)
+        else:
+            self.stream.write(json.dumps(result, ensure_ascii=False) + "\n")
+        self.stream.flush()
+
+
+def main():
+    """The main function of this script."""
+    # construct the argument parser and parse the arguments
+    ap = argparse.ArgumentParser(description="Decode Data Matrix / QR codes and optionally OCR a batch of images. "
+                                             "The exit status is 1 if codes could not be read in some images.")
+    ap.add_argument("-i", "--image", required=True, action="extend", nargs="+", type=str,
+                    help="image files, directories, glob patterns (quote these) or @ followed by a file with one "
+                         "input per line to scan")
+    ap.add_argument("-o", "--output", required=False, default="-",
+                    help="file to stream results to (.csv or .jsonl). Default is standard output")
+    ap.add_argument("-f", "--format", required=False, default=None, choices=["csv", "jsonl"],
+                    help="output format. Default is given by the output file suffix, otherwise jsonl")
+    ap.add_argument("-c", "--codeformat", required=False, default="all", choices=["dmtx", "qr", "all", "none"],
+                    help="choose between searching for QR code (qr), Data Matrix code (dmtx), both (all) "
+                         "or no search (none). Default=all")
+    ap.add_argument("--ocr", required=False, action='store_true', default=False,
+                    help="If set the whole image is also OCR'ed with tesseract")
+    ap.add_argument("-t", "--tesseract", required=False, default="tesseract",
+                    help="path to tesseract executable - only used with --ocr")
+    ap.add_argument("-l", "--language", required=False, default="eng",
+                    help="language that tesseract uses - depends on installed tesseract language packages")
+    ap.add_argument("-j", "--jobs", required=False, default=os.cpu_count(), type=int,
+                    help="number of images processed in parallel")
+    args = vars(ap.parse_args())
+
+    fmt = args["format"]
+    if fmt is None:
+        fmt = "csv" if Path(args["output"]).suffix.lower() == ".csv" else "jsonl"
+
+    if args["output"] == "-":
+        stream = sys.stdout
+    else:
+        stream = open(args["output"], "w", newline="", encoding="utf-8")
+
+    writer = ResultWriter(stream, fmt)
+    counts = {"ok": 0, "no code": 0, "error": 0}
+    with multiprocessing.Pool(args["jobs"], initializer=init_worker, initargs=(args,)) as pool:
+        # Results are written as soon as they are ready, so the order is not the input order
+        images = iterinputs(args["image"], suffixes=RASTER_SUFFIXES)
+        for result in pool.imap_unordered(scan_image, images):
+            writer.write(result)
+            counts[result["status"]] += 1
+
+    if stream is not sys.stdout:
+        stream.close()
+
+    print("Scanned " + str(sum(counts.values())) + " images: " + str(counts["ok"]) + " ok, "
+          + str(counts["no code"]) + " without readable code, " + str(counts["error"]) + " errors", file=sys.stderr)
+
+    if counts["no code"] > 0 or counts["error"] > 0:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
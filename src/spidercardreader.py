@@ -22,18 +22,13 @@ limitations under the License.
 # import sys
 import argparse
 import logging
-import copy
-from skimage.io import imread, imsave
+import functools
+from collections import Counter
+import PIL.Image
 from skimage.util import img_as_ubyte
-from skimage.color import rgb2hsv
-import matplotlib.pyplot as plt
-import pandas as pd
 import re
 from pathlib import Path
 import numpy as np
-from scipy.stats import linregress
-import skimage.measure  # Needed for label function and regionprop
-from skimage.transform import EuclideanTransform, warp
 
 # Adding path to ocr package - this can probably be done smarter
 # from pathlib import Path
@@ -41,15 +36,36 @@ from skimage.transform import EuclideanTransform, warp
 # sys.path.append(str(Path(__file__).parent.parent))
 
 from labelreader.ocr import tesseract
+from labelreader.ocr.triage import BlankTriage
 from labelreader.labeldetect import labeldetect
-from labelreader.util.util import checkfilepath
+from labelreader.labeldetect import pairing
+from labelreader.util.util import FilenameAllocator
+from labelreader.util.pipeline import prefetch
+from labelreader.util.attachments import AttachmentWriter, CODECS
+from labelreader.util.debugimages import DebugImages
+from labelreader.util.inputs import iterinputs, RASTER_SUFFIXES
+from labelreader.util.sink import RecordSink, read_records
+from labelreader.util.records import RecordCollector
+from labelreader.util.manifest import RunManifest, filehash
+from labelreader.util.jobqueue import JobQueue, QueueWorker, merge_shards
 from labelreader.taxonchecker import gbiftaxonchecker
+from labelreader.taxonchecker.resolver import TaxonResolver
 from labelreader.util.util import isromandate, parseromandate
 
+# Background hue ranges used for label detection. The alternative ranges are only tried if the
+# expected number of labels is not found using the primary range.
+RED_HUERANGE = (0.0, 0.05)
+RED_ALT_HUERANGES = [(0.0, 0.08), (0.95, 1.0)]
+BLUE_HUERANGE = (0.5, 0.7)
+BLUE_ALT_HUERANGES = [(0.45, 0.75)]
+EXPECTED_LABEL_COUNT = 9  # Number of cards on each scanned sheet
+
 
 def empty_dataframe():
     """Create and return an empty data frame for frontside data.
     """
+    import pandas as pd  # Deferred: slow to import
+
     record = pd.DataFrame({
         "Catalogue Number": [],
         "Alt Cat Number": [],
@@ -73,7 +89,8 @@ def empty_dataframe():
         "Collector First Name": [],
         "Collector Last Name": [],
         "Attachment": [],
-        "Original front image": []
+        "Original front image": [],
+        "Blank label": []
     })
     return record
 
@@ -82,6 +99,8 @@ def empty_back_columns(rows):
     """Create and return a data frame for backside data field with empty strings
        and no Alt Cat Number column.
     """
+    import pandas as pd  # Deferred: slow to import
+
     record = pd.DataFrame({
         "Notes_back": ["" for x in range(rows)],
         "Attachment_back": ["" for x in range(rows)],
@@ -92,11 +111,14 @@ def empty_back_columns(rows):
 def empty_back_dataframe():
     """Create and return an empty data frame for backside data.
     """
+    import pandas as pd  # Deferred: slow to import
+
     record = pd.DataFrame({
         "Alt Cat Number": [],
         "Notes_back": [],
         "Attachment_back": [],
-        "Original back image": []
+        "Original back image": [],
+        "Blank label_back": []
     })
     return record
 
@@ -155,14 +177,12 @@ def parsefronttext(ocrtext):
     """Parses the transcribed text from the front of a paper card into appropriate data fields.
 
        ocrtext: A list of lists of strings - one for each line on the paper card.
-       Return record: Returns a Pandas data frame with the parsed transcribed data.
+       Return record: Returns a dictionary with the parsed transcribed data or None if there is no text.
     """
 
-    taxonchecker = gbiftaxonchecker.GBIFTaxonChecker()
-
     if len(ocrtext) == 0:
         # If ocrtext is empty then stop here!
-        return empty_dataframe()
+        return None
 
     # Skip any beginning blank lines
     line_idx = 0
@@ -235,58 +255,82 @@ def parsefronttext(ocrtext):
     # Convert date format
     datetext = parseromandate(ocrdatetext)
 
-    # Check the taxon name
-    # This gives less hits
-    #checked_taxonname = taxonchecker.check_full_name(genus + " " + species + " " + author_name)
-    # This gives more hits
+    # The taxon name is checked by a TaxonResolver at the end of the run - see taxonquery
     taxonname = genus + " " + species + " " + author_name
-    checked_gbif_taxonname = taxonchecker.check_full_name(genus + " " + species)
 
-    record = pd.DataFrame({
-        "Catalogue Number": [""],
-        "Alt Cat Number": [alt_cat_number],
-        "Publish": [1],
-        "Count": [""],
-        "Other Remarks": [other],
-        "Order": ["Araneae"],
-        "Family": [""],
-        "Genus1": [genus],
-        "Species1": [species],
-        "Author name": [author_name],
-        "Scientific name": [taxonname],
-        "GBIF checked scientific name": [checked_gbif_taxonname],
-        "Determiner First Name": ["Ole"],
-        "Determiner Last Name": ["Bøggild"],
-        "Determination Date": [ocrdetdatetext],
-        "Country": [country],
-        "Locality": [locality],
-        "OCR Start Date": [ocrdatetext],
-        "Start Date": [datetext],
-        "Collector First Name": ["Ole"],
-        "Collector Last Name": ["Bøggild"],
-        "Attachment": [""],
-        "Original front image": [""]
-    })
+    record = {
+        "Catalogue Number": "",
+        "Alt Cat Number": alt_cat_number,
+        "Publish": 1,
+        "Count": "",
+        "Other Remarks": other,
+        "Order": "Araneae",
+        "Family": "",
+        "Genus1": genus,
+        "Species1": species,
+        "Author name": author_name,
+        "Scientific name": taxonname,
+        "GBIF checked scientific name": None,  # Filled in when the results are written
+        "Determiner First Name": "Ole",
+        "Determiner Last Name": "Bøggild",
+        "Determination Date": ocrdetdatetext,
+        "Country": country,
+        "Locality": locality,
+        "OCR Start Date": ocrdatetext,
+        "Start Date": datetext,
+        "Collector First Name": "Ole",
+        "Collector Last Name": "Bøggild",
+        "Attachment": "",
+        "Original front image": "",
+        "Blank label": 0
+    }
 
     return record
 
 
+def blankfrontrecord():
+    """Create the record of a blank front side label. The parsed fields are left empty, such that the row and
+       the label image are still written for the card.
+
+       Return record: Returns a dictionary with the data fields of parsefronttext.
+    """
+    record = {column: "" for column in empty_dataframe().columns}
+    record["Publish"] = 1
+    record["Order"] = "Araneae"
+    record["Blank label"] = 1
+    return record
+
+
+def taxonquery(record):
+    """Return the name that is checked against the GBIF taxon backbone for a record made by parsefronttext"""
+    # Checking the name with the author name gives less hits
+    return record["Genus1"] + " " + record["Species1"]
+
+
+def write_results(sink, excelpath, resolver):
+    """Write the records of the sink to an Excel sheet with the checked taxon names filled in"""
+    # Also start looking up the names of records from a previous run, such that all names are looked up in parallel
+    resolver.add_records(read_records(sink.filepath))
+    sink.to_excel(excelpath, transform=resolver.fill)
+
+
 def parsebacktext(ocrtext):
     """Parses the transcribed text from the back of a paper card into a notes data field.
 
        ocrtext: A list of lists of strings - one for each line on the paper card.
-       Return record: Returns a Pandas data frame with the parsed transcribed data.
+       Return record: Returns a dictionary with the parsed transcribed data.
     """
     text = ""
     for line in ocrtext:
         text += ' '.join(line) + "\n"
 
-    record = pd.DataFrame({
-        "Alt Cat Number": [""],
-        "Notes_back": [text],
-        "Attachment_back": [""],
-        "Original back image": [""]
-    })
+    record = {
+        "Alt Cat Number": "",
+        "Notes_back": text,
+        "Attachment_back": "",
+        "Original back image": "",
+        "Blank label_back": 0
+    }
     return record
 
 def find_red_line_orientation(labelID, label_img, segMask):
@@ -303,6 +347,7 @@ def find_red_line_orientation(labelID, label_img, segMask):
 
     if line_idx.shape[0] > 0:
         # fit a line by linear least squares regression
+        from scipy.stats import linregress  # Deferred: slow to import
         line_fit = linregress(line_idx[:,0], line_idx[:,1])
 
         # Compute orientation of the line
@@ -327,6 +372,9 @@ def resample_label_from_line(img, label_img, segMask):
          a list of numpy arrays with same number of channels as img which contain the resampled labels.
     """
 
+    import skimage.measure  # Deferred: slow to import
+    from skimage.transform import EuclideanTransform, warp  # Deferred: slow to import
+
     lst_resampled_labels = []
 
     props = skimage.measure.regionprops(label_img)
@@ -394,25 +442,258 @@ def estimateBackgroundColor(img, width=200, height=200):
         Return: A 3-vector as a numpy array with shape (3,) containing the average Hue-Saturation-Value in the
                 rectangle
     """
+    from skimage.color import rgb2hsv  # Deferred: slow to import
+
     mean_rgb = np.mean(img[0:height, 0:width,:], axis=(0,1))
     return rgb2hsv(mean_rgb)
 
-def findClosestLabel(label_data, previous_lst_labels):
-    """Find the label closest to label_data in the provided list
+def isBackSide(imgfilename):
+    """Estimate if an image is a back side scan (blue background) from a reduced size decoding of the image.
+       Used to group the images into front and back side pairs before they are processed.
+
+        imgfilename: File name for and path to the image
+        Return: True if the background is blue
+    """
+    with PIL.Image.open(imgfilename) as pil_img:
+        width = pil_img.width
+        pil_img.draft("RGB", (pil_img.width // 8, pil_img.height // 8))  # JPEG images are decoded at 1/8 size
+        scale = width / pil_img.width
+        img = np.asarray(pil_img.convert("RGB"))
+    size = max(1, int(round(200 / scale)))  # Same rectangle as in load_and_detect
+    return estimateBackgroundColor(img, width=size, height=size)[0] > 0.5
+
+
+def queue_units(images):
+    """Group images into the work units of a job queue - a front side image and the back side image following
+       it, or a single image - like the images are paired in main().
+
+        images: Iterable over image file names in processing order
+        Return: Iterator over lists of one or two image file names
+    """
+    front = None
+    for imgfilename in images:
+        if not isBackSide(imgfilename):
+            if front is not None:
+                yield [front]
+            front = imgfilename
+        elif front is not None:
+            yield [front, imgfilename]
+            front = None
+        else:
+            yield [imgfilename]
+    if front is not None:
+        yield [front]
+
+
+def queue_images(units):
+    """Yield the image file names of leased units, each with the input file names of its unit and a flag telling
+       if it is the last image of its unit.
 
-        label_data: Label dictionary to find a match for
-        previous_lst_labels: List of label dictionaries to compare to
-        Return: The Alt Cat Number from the matching label dictionary. Returns empty string if no match.
+        units: Iterable over leased units as returned by QueueWorker.leases
+        Return: Iterator over (file name, unit inputs, unit end) tuples
     """
-    shortest_cat_number = ""
-    shortest_dist = 10**64
-    for previous_label_data in previous_lst_labels:
-        dist = np.linalg.norm(np.array(label_data["centroid"]) - np.array(previous_label_data["centroid"]))
-        if dist < shortest_dist:
-            shortest_dist = dist
-            shortest_cat_number = previous_label_data["Alt Cat Number"]
+    for unit in units:
+        for idx, imgfilename in enumerate(unit["inputs"]):
+            yield imgfilename, unit["inputs"], idx == len(unit["inputs"]) - 1
 
-    return shortest_cat_number
+
+def load_and_detect_unit(item, debug=None):
+    """load_and_detect for an item from queue_images - the sheet gets the 'unit' inputs and 'unit_end' flag of
+       the item. An error is returned as the 'error' of the sheet, such that the worker can give the unit back to
+       the job queue and continue with the next unit.
+    """
+    imgfilename, inputs, unit_end = item
+    try:
+        sheet = load_and_detect(imgfilename, debug=debug)
+    except Exception as e:
+        sheet = {'filename': imgfilename, 'error': e}
+    sheet['unit'] = inputs
+    sheet['unit_end'] = unit_end
+    return sheet
+
+
+def merge_queue(queue, output, resolver):
+    """Merge the result rows of all workers of a job queue into the results in the output directory"""
+    sink = RecordSink(Path(output, "spidercards.jsonl"), columns=empty_dataframe().columns)
+    for record in merge_shards(queue):
+        sink.append(record)
+    sink.close()
+    write_results(sink, Path(output, "spidercards.xlsx"), resolver)
+    print("Merged " + str(sink.count) + " rows from the job queue")
+
+
+def pairing_entry(label_data):
+    """Create the compact entry kept for pairing the back side labels with the labels of the previous image.
+
+        label_data: Label dictionary as returned by resample_label_from_line
+        Return: Dictionary with only the label ID, centroid and Alt Cat Number of the label
+    """
+    entry = dict()
+    entry['label_id'] = label_data['label_id']
+    entry['centroid'] = tuple(label_data['centroid'])
+    entry['Alt Cat Number'] = label_data.get("Alt Cat Number", "")
+    return entry
+
+
+def report_pairing(assignment, lst_back_labels, lst_front_entries, imgname):
+    """Log back side labels that could not be paired and ambiguous pairs.
+
+        assignment: Dictionary as returned by pairing.assign_labels
+        lst_back_labels: List of back side label dictionaries
+        lst_front_entries: List of front side pairing entries as returned by pairing_entry
+        imgname: Name of the back side image
+    """
+    for idx in assignment['unmatched']:
+        logging.warning("No front side label for back side label ID " + str(lst_back_labels[idx]['label_id'])
+                        + " in " + imgname)
+    for idx in assignment['unmatched_reference']:
+        logging.warning("No back side label for front side label with Alt Cat Number '"
+                        + str(lst_front_entries[idx]['Alt Cat Number']) + "' in " + imgname)
+    for idx in assignment['ambiguous']:
+        front_entry = lst_front_entries[assignment['match'][idx]]
+        logging.warning("Ambiguous pairing of back side label ID " + str(lst_back_labels[idx]['label_id'])
+                        + " with Alt Cat Number '" + str(front_entry['Alt Cat Number']) + "' in " + imgname
+                        + " (distance " + str(round(assignment['distance'][idx])) + " pixels)")
+
+
+def transcribe_label(img_label, name, back, ocrreader, triage, verbose=False):
+    """OCR and parse the image of one label. Blank labels are not OCR'ed, but still give a record marked in the
+       Blank label column, such that the row and the label image are written.
+
+        img_label: Image of the label
+        name: Name of the label used for logging
+        back: True for a back side label
+        ocrreader: The OCR reader
+        triage: BlankTriage that detects blank labels
+        verbose: If True the OCR text and the record are printed
+        Return: Dictionary with the parsed data or None if a front side label has no text
+    """
+    blank = triage.isblank(img_label, name)
+    if blank:
+        ocrtext = []  # Skip OCR of blank labels
+    else:
+        ocrreader.read_image(img_label)
+        ocrtext = ocrreader.get_text()
+
+    if verbose:
+        for i in range(len(ocrtext)):
+            print(ocrtext[i])
+
+    if back:
+        record = parsebacktext(ocrtext)
+        record["Blank label_back"] = int(blank)
+    else:
+        record = blankfrontrecord() if blank else parsefronttext(ocrtext)
+        if verbose:
+            print("record = " + str(record))
+    return record
+
+
+def attach_label(record, img_label, imgfilename, imghash, label_id, back, args, allocator, manifest, writer):
+    """Allocate a unique file name for the image of a label, queue the image to be written and add the file name
+       and the original image to the record.
+
+        record: Dictionary returned by transcribe_label
+        img_label: Image of the label
+        imgfilename: Path to the scanned image with the label
+        imghash: Hash of the scanned image used in the manifest
+        label_id: ID of the label in the scanned image
+        back: True for a back side label
+        Return: The file name of the label image
+    """
+    suffix = "_back" if back else ""
+
+    #  In case of no Alt Cat Number just pick a unique file name
+    if record["Alt Cat Number"] == "":
+        outfilename = Path(imgfilename).stem + "_labelID" + str(label_id) + suffix + ".tif"
+    else:
+        outfilename = record["Alt Cat Number"] + suffix + ".tif"
+
+    # Check that filename is unique otherwise create an extension of it to make unique
+    outpath = Path(args["output"], outfilename)
+    outpath = allocator.allocate(outpath)
+    outfilename = outpath.name
+
+    # Save image in the background. The name is recorded in the manifest first, such that a resumed
+    # run can reuse it if the run is interrupted before the image is completed.
+    manifest.record([(imgfilename, imghash)], 0, [outfilename], status="partial")
+    writer.submit(outpath, img_label, resolution=400)
+    # Add to Attachment and Original image columns to handle front and back label images
+    if back:
+        record["Attachment_back"] = outfilename # Add filename to data record
+
+        # Add original image file name to data record
+        record["Original back image"] = Path(imgfilename).name
+    else:
+        record["Attachment"] = outfilename  # Add filename to data record
+
+        # Add original image file name to data record
+        record["Original front image"] = Path(imgfilename).name
+    return outfilename
+
+
+def load_and_detect(imgfilename, debug=None):
+    """Read an image, find the labels and crop and rotate them. This is the first stage of the pipeline in main().
+
+        imgfilename: File name for and path to the image
+        debug: DebugImages object that writes the image and the intermediate masks if the image is selected
+        Return: Dictionary with the file name, the background color, the label detection result and the list of
+                resampled labels as returned by resample_label_from_line
+    """
+    from skimage.io import imread  # Deferred: slow to import
+
+    img = imread(imgfilename)
+
+    # Estimate background color and perform different processing depending on this
+    mean_hsv = estimateBackgroundColor(img)
+    backgroundIsBlue = mean_hsv[0] > 0.5
+    if backgroundIsBlue: # Blue background
+        huerange, alt_hueranges = BLUE_HUERANGE, BLUE_ALT_HUERANGES  # Light blue background
+    else: # Red background
+        huerange, alt_hueranges = RED_HUERANGE, RED_ALT_HUERANGES  # Red background
+
+    # Find labels by color segmentation - cheap coarse pass first and only escalate if needed
+    detection = labeldetect.detect_labels_tiered(img, huerange=huerange, alt_hueranges=alt_hueranges,
+                                                 expected_count=EXPECTED_LABEL_COUNT)
+    segMask = detection.pop('mask')
+    label_img = detection.pop('label_img')
+    edges = detection.pop('edges')
+
+    # Improve orientation estimation by finding the red line
+    if backgroundIsBlue:
+        lineMask = labeldetect.color_segment_in_labels(img, label_img) # Segment red lines on labels
+    elif detection['factor'] == 1:
+        # For red background, reuse the initial segMask
+        lineMask = segMask
+    else:
+        # The subsampled segMask is too coarse for the line, so segment the red line at full resolution
+        # inside the labels
+        lineMask = labeldetect.color_segment_in_labels(img, label_img, huerange=detection['huerange'])
+    # Ignore label pixels close to the boundary of labels found in a subsampled image
+    lineMask[edges] = 1
+
+    sheet = dict()
+    sheet['filename'] = imgfilename
+    sheet['hash'] = filehash(imgfilename)  # Content hash for the run manifest
+    sheet['shape'] = img.shape[0:2]
+    sheet['backgroundIsBlue'] = backgroundIsBlue
+    sheet['detection'] = detection
+
+    # Segment individual labels and rotate appropriately
+    sheet['labels'] = resample_label_from_line(img, label_img, lineMask)
+
+    # Write the debug images right away such that the masks are not kept
+    sheet['debug'] = debug is not None and debug.select()
+    if sheet['debug']:
+        stem = Path(imgfilename).stem
+        debug.save(stem, "image", img)
+        debug.save(stem, "segMask", segMask)
+        if backgroundIsBlue:
+            debug.save(stem, "lineMask", lineMask)
+        debug.save(stem, "label_img", label_img)
+        debug.overlay(stem, "overlay", img, label_img)
+
+    return sheet
 
 
 def main():
@@ -421,8 +702,11 @@ def main():
     ap = argparse.ArgumentParser(description="Transcribe Bøggild catalogue cards from images.")
     ap.add_argument("-t", "--tesseract", required=True,
                     help="path to tesseract executable")
-    ap.add_argument("-i", "--image", required=True, action="extend", nargs="+", type=str,
-                    help="file name for and path to input image")
+    ap.add_argument("-i", "--image", required=False, action="extend", nargs="+", type=str,
+                    help="input image files, directories, glob patterns (quote these) or @ followed by a file with "
+                         "one input per line. Files in directories are taken in natural sort order, so each back "
+                         "side scan must come right after its front side scan in that order. With --queue the "
+                         "images are added to the queue if it is empty")
     ap.add_argument("-o", "--output", required=False, default="../output",
                     help="path to write results in the form of Excel spreadsheet and individual label images.")
     ap.add_argument("-l", "--language", required=False, default="dan+eng",
@@ -430,9 +714,40 @@ def main():
     ap.add_argument("-r", "--resolution", required=False, default=400, type=int,
                     help="Set resolution in DPI of scanned images - used for rendering pdf pages so only relevant for PDF files")
     ap.add_argument("-v", "--verbose", required=False, action='store_true', default=False,
-                    help="If set the program is verbose and will print out debug information")
+                    help="If set the program is verbose and will print out debug information and write debug images")
+    ap.add_argument("--debug-dir", required=False, default=None,
+                    help="directory to write downscaled masks, label images and overlays to. Implied by --verbose "
+                         "with the default debug directory in the output directory")
+    ap.add_argument("--debug-every", required=False, default=1, type=int,
+                    help="only write debug images for every Nth image. Default=1")
+    ap.add_argument("--no-triage", required=False, action='store_true', default=False,
+                    help="If set all labels are OCR'ed, also labels detected as blank")
+    ap.add_argument("--mirror-back", required=False, action='store_true', default=False,
+                    help="If set the label positions on back side images are mirrored left to right before pairing "
+                         "with the front side labels, i.e. the sheet was turned over around its vertical axis")
+    ap.add_argument("--resume", required=False, action='store_true', default=False,
+                    help="If set an interrupted run is resumed. Images (and front and back image pairs) completed "
+                         "according to the run manifest in the output directory are skipped")
+    ap.add_argument("--queue", required=False, default=None,
+                    help="directory of a job queue shared by several workers, also on other hosts. Each worker "
+                         "leases front and back image pairs from the queue and the last worker to finish merges "
+                         "the results into the output directory")
+    ap.add_argument("--lease", required=False, default=600, type=float,
+                    help="seconds a worker may work on a unit of the job queue before it is given to another worker")
+    ap.add_argument("--merge", required=False, action='store_true', default=False,
+                    help="only merge the results of the job queue given by --queue into the output directory")
+    ap.add_argument("--codec", required=False, default="lzw", choices=list(CODECS),
+                    help="TIFF compression of the label images. Default=lzw")
+    ap.add_argument("--level", required=False, default=None, type=int,
+                    help="quality (0-100) of the label images - only used with --codec jpeg")
+    ap.add_argument("--writers", required=False, default=2, type=int,
+                    help="number of label images compressed and written in parallel in the background")
+    ap.add_argument("--write-buffer", required=False, default=256, type=int,
+                    help="maximum megabytes of label images waiting to be written")
 
     args = vars(ap.parse_args())
+    if args["image"] is None and args["queue"] is None:
+        ap.error("the following arguments are required: -i/--image (or --queue)")
 
     if args["verbose"]:
         #logging.basicConfig(encoding='utf-8', level=logging.DEBUG)
@@ -448,202 +763,283 @@ def main():
     # ocrreader = tesseract.OCR(args["tesseract"], args["language"], config='--oem 2')
     # ocrreader = tesseract.OCR(args["tesseract"], args["language"], config='--oem 1 --psm 6')
 
+    # Initialize the blank label detection used to skip OCR of empty labels
+    triage = BlankTriage(enabled=not args["no_triage"])
+
+    # Taxon names are collected while the cards are read and each distinct name is checked once in the background
+    resolver = TaxonResolver(gbiftaxonchecker.GBIFTaxonChecker(), query=taxonquery)
+
     # Initialize variables
-    master_table = empty_dataframe()
-    lst_resampled_labels = []
-    previous_lst_resampled_labels = []
+    lst_label_entries = []  # Compact pairing entries of the labels in the previous image
+    previous_lst_label_entries = []
     previous_image_was_front = False
     front_table = None
     image_table = empty_dataframe()
 
+    front_inputs = []  # (file name, hash) of the front side image in image_table
+    front_attachments = []  # Attachments written for the front side image in image_table
+
+    queue = None
+    if args["queue"] is not None:
+        # Units - a front side image and the back side image following it, or a single image - are leased from
+        # a job queue and the worker records its rows in its own shard. The worker is used like the run manifest.
+        Path(args["queue"]).mkdir(parents=True, exist_ok=True)
+        queue = JobQueue(Path(args["queue"], "jobs.sqlite"), lease_seconds=args["lease"])
+        if args["merge"]:
+            merge_queue(queue, args["output"], resolver)
+            resolver.close()
+            queue.close()
+            return
+        if args["image"] is not None and sum(queue.counts().values()) == 0:
+            added = queue.add(queue_units(iterinputs(args["image"], suffixes=RASTER_SUFFIXES)))
+            print("Added " + str(added) + " units to the job queue")
+        manifest = QueueWorker(queue)
+        sink = RecordSink(manifest.shardpath, columns=empty_dataframe().columns)
+        print("Job queue worker " + manifest.name)
+    else:
+        # The run manifest records each completed unit - a front side image and the back side image following
+        # it, or a single image - such that an interrupted run can be resumed
+        manifest = RunManifest(Path(args["output"], "spidercards.manifest.jsonl"), resume=args["resume"])
+
+        # Finished records are appended to a JSON lines file as they are produced and the spreadsheet is written
+        # once at the end. When resuming only the records of completed units are kept.
+        sink = RecordSink(Path(args["output"], "spidercards.jsonl"), columns=empty_dataframe().columns,
+                          append=args["resume"], keep=manifest.rows)
+
     image_count = 0
+    tier_counts = Counter()  # Count how often each label detection tier is used
+    pairing_counts = Counter()  # Count unmatched and ambiguous back side labels
+
+    # Pipeline: The next image is read and its labels detected in a background thread, while the labels of
+    # the current image are OCR'ed in the main thread and label images are written by a pool of background
+    # threads. Images are still processed in input order, which the front/back pairing relies on.
+    writer = AttachmentWriter(workers=args["writers"], max_bytes=args["write_buffer"] * 1024 * 1024,
+                              codec=args["codec"], level=args["level"])
+    # Unique label image names are allocated in memory, also for images queued but not written yet. Label
+    # images left over by an interrupted run are written again, so their names can be reused.
+    # Workers of a job queue share the output directory, so their names are also reserved on disk.
+    allocator = FilenameAllocator(exclusive=queue is not None,
+                                  overwrite=[Path(args["output"], name) for name in manifest.leftover_attachments()])
+    # Debug images are written to disk as they are produced instead of being kept for display
+    debug = None
+    if args["verbose"] or args["debug_dir"] is not None:
+        debugdir = args["debug_dir"] if args["debug_dir"] is not None else Path(args["output"], "debug")
+        debug = DebugImages(debugdir, every=args["debug_every"])
+    if queue is not None:
+        sheets = prefetch(queue_images(manifest.leases()),
+                          functools.partial(load_and_detect_unit, debug=debug), maxsize=1)
+    else:
+        images = iterinputs(args["image"], suffixes=RASTER_SUFFIXES)  # Found lazily while processing
+        sheets = prefetch(manifest.pending(images), functools.partial(load_and_detect, debug=debug),
+                          maxsize=1)
 
+    failed_unit = None  # Input file names of the job queue unit that failed
     # Loop over a directory of images
-    for imgfilename in args["image"]:
-        # Read image with filename
-        print("Transcribing " + Path(imgfilename).name)
-        img = imread(imgfilename)
-
-        # Estimate background color and perform different processing depending on this
-        mean_hsv = estimateBackgroundColor(img)
-        backgroundIsBlue = mean_hsv[0] > 0.5
-        if backgroundIsBlue: # Blue background
-            print("Blue background")
-            segMask = labeldetect.color_segment_labels(img, huerange=(0.5, 0.7))  # Light blue background
-        else: # Red background
-            print("Red background")
-            segMask = labeldetect.color_segment_labels(img) # Red background
-
-        # Find labels by color segmentation
-        segMaskImproved = labeldetect.improve_binary_mask(segMask)
-        label_img, num_labels = labeldetect.find_labels(segMaskImproved)
-
-        # Improve orientation estimation by finding the red line
-        if backgroundIsBlue:
-            lineMask = labeldetect.color_segment_labels(img) # Segment red lines on labels
-            previous_lst_resampled_labels = copy.deepcopy(lst_resampled_labels) # Keep for later label location look-up
-        else:
-            # For red background, reuse the initial segMask
-            lineMask = segMask
+    for sheet in sheets:
+        imgfilename = sheet['filename']
+        if queue is not None and sheet['unit'] == failed_unit:
+            # Skip the rest of a unit that failed
+            failed_unit = None if sheet['unit_end'] else failed_unit
+            continue
+
+        image_attachments = []  # Label images written for this image
+        try:
+            print("Transcribing " + Path(imgfilename).name)
+            if 'error' in sheet:
+                raise sheet['error']
+
+            backgroundIsBlue = sheet['backgroundIsBlue']
+            if backgroundIsBlue: # Blue background
+                print("Blue background")
+                # Keep the front side labels for later label location look-up
+                previous_lst_label_entries = lst_label_entries if previous_image_was_front else []
+            else: # Red background
+                print("Red background")
+
+            detection = sheet['detection']
+            tier_name = "tier " + str(detection['tier']) + " (factor " + str(detection['factor']) \
+                        + ", hue range " + str(detection['huerange']) + ")"
+            if not detection['accepted']:
+                tier_name = "fallback " + tier_name
+            tier_counts[tier_name] += 1
+            logging.info("Label detection in " + Path(imgfilename).name + " used " + tier_name)
+
+            lst_resampled_labels = sheet['labels']
 
-        # Segment individual labels and rotate appropriately
-        lst_resampled_labels = resample_label_from_line(img, label_img, lineMask)
+            if args["verbose"]:
+                # logging.info("number of labels detected: " + str(len(lst_resampled_labels)))
+                print("number of labels detected: " + str(len(lst_resampled_labels)))
 
-        if args["verbose"]:
-            plt.figure()
-            plt.imshow(img)
-            plt.title(Path(imgfilename).name)
+            if not len(lst_resampled_labels) == EXPECTED_LABEL_COUNT:
+                logging.warning("Warning: Wrong number of detected labels = " + str(len(lst_resampled_labels)))
+                # print("Warning: Wrong number of detected labels = " + str(len(lst_resampled_labels)))
+                # return  # TODO: Maybe use exit with a non-zero exit code (for later use in shell scripts)
 
-            plt.figure()
-            plt.imshow(segMask)
-            plt.title("segMask")
 
             if backgroundIsBlue:
-                plt.figure()
-                plt.imshow(lineMask)
-                plt.title("lineMask")
-
-            plt.figure()
-            plt.imshow(label_img)
-            plt.title("label_img")
-
-            # logging.info("number of labels detected: " + str(len(lst_resampled_labels)))
-            print("number of labels detected: " + str(len(lst_resampled_labels)))
-
-        if not len(lst_resampled_labels) == 9:
-            logging.warning("Warning: Wrong number of detected labels = " + str(len(lst_resampled_labels)))
-            # print("Warning: Wrong number of detected labels = " + str(len(lst_resampled_labels)))
-            # return  # TODO: Maybe use exit with a non-zero exit code (for later use in shell scripts)
-
+                if previous_image_was_front:
+                    front_table = image_table
+                else:
+                    front_table = empty_dataframe()
+                    front_inputs = []
+                    front_attachments = []
 
-        if backgroundIsBlue:
-            if previous_image_was_front:
-                front_table = image_table.copy()
+                image_records = RecordCollector(empty_back_dataframe().columns)
             else:
-                front_table = empty_dataframe()
-
-            image_table = empty_back_dataframe()
-        else:
-            if previous_image_was_front:
-                # Add empty backside columns to table
-                #image_table = pd.concat([image_table, empty_back_columns(len(lst_resampled_labels))], axis=1)
-
-                # Add to master table
-                #master_table = pd.concat([master_table, image_table], axis=0, ignore_index=True)
-                master_table = pd.concat([master_table, image_table], axis=0)
-
-            image_table = empty_dataframe()
+                if previous_image_was_front:
+                    # Add empty backside columns to table
+                    #image_table = pd.concat([image_table, empty_back_columns(len(lst_resampled_labels))], axis=1)
 
-        for label_data in lst_resampled_labels:
-            if args["verbose"]:
-                print("")
-                print("ID " + str(label_data["label_id"]) + " orientation " + str(label_data['orientation'])
-                      + " coord " + str(label_data['centroid']))
-
-            img_label = img_as_ubyte(label_data['image'])
-            ocrreader.read_image(img_label)
+                    # Add to master table
+                    #master_table = pd.concat([master_table, image_table], axis=0, ignore_index=True)
+                    sink.append_dataframe(image_table)
+                    # Mark the front side image as completed once its label images are written
+                    writer.after_written(manifest.record, front_inputs, len(image_table), front_attachments)
 
-            ocrtext = ocrreader.get_text()
-
-            if args["verbose"]:
-                for i in range(len(ocrtext)):
-                    print(ocrtext[i])
+                image_records = RecordCollector(empty_dataframe().columns)
 
-            suffix = ""
             if backgroundIsBlue:
-                df = parsebacktext(ocrtext)
-                # Figure out which Alt Cat Number to update with background info
-                # Add Alt Cat Number to data record
-                foundAltCatNumber = findClosestLabel(label_data, previous_lst_resampled_labels)
-                if args["verbose"]:
-                    print("Closest Alt Cat Number is " + foundAltCatNumber)
-
-                df.at[0,"Alt Cat Number"] = foundAltCatNumber
-                suffix = "_back"
-            else:
-                df = parsefronttext(ocrtext)
-
+                # Pair all back side labels with the front side labels of the previous image at once
+                back_centroids = pairing.centroid_array(lst_resampled_labels)
+                if args["mirror_back"]:
+                    back_centroids = pairing.mirror_centroids(back_centroids, sheet['shape'][1])
+                assignment = pairing.assign_labels(back_centroids, pairing.centroid_array(previous_lst_label_entries))
+                report_pairing(assignment, lst_resampled_labels, previous_lst_label_entries, Path(imgfilename).name)
+                pairing_counts['labels'] += len(lst_resampled_labels)
+                pairing_counts['unmatched'] += len(assignment['unmatched'])
+                pairing_counts['ambiguous'] += len(assignment['ambiguous'])
+
+            for label_idx, label_data in enumerate(lst_resampled_labels):
                 if args["verbose"]:
-                    print("df.shape = " + str(df.shape))
-
-                # Save the alternative catalogue number for back processing
-                # Assumes that a Python list contains references
-                if not df.empty:
-                    label_data["Alt Cat Number"] = df["Alt Cat Number"][0]
-                    #suffix = ""
-
-            if not df.empty:
-
-                #  In case of no Alt Cat Number just pick a unique file name
-                if df["Alt Cat Number"][0] == "":
-                    outfilename = Path(imgfilename).stem + "_labelID" + str(label_data["label_id"]) + suffix + ".tif"
-                else:
-                    outfilename = df["Alt Cat Number"][0] + suffix + ".tif"
-
-                # Check that filename is unique otherwise create an extension of it to make unique
-                outpath = Path(args["output"], outfilename)
-                outpath = checkfilepath(outpath)
-                outfilename = outpath.name
-
-                # Save image
-                imsave(str(outpath), img_label, check_contrast=False, plugin='pil', compression="tiff_lzw",
-                   resolution_unit=2, resolution=400)
-                # Add to Attachment and Original image columns to handle front and back label images
+                    print("")
+                    print("ID " + str(label_data["label_id"]) + " orientation " + str(label_data['orientation'])
+                          + " coord " + str(label_data['centroid']))
+
+                # Release the float crop as soon as it is converted - only the 8 bit image is OCR'ed and saved
+                img_label = img_as_ubyte(label_data.pop('image'))
+                record = transcribe_label(img_label,
+                                          Path(imgfilename).name + " label ID " + str(label_data["label_id"]),
+                                          backgroundIsBlue, ocrreader, triage, args["verbose"])
                 if backgroundIsBlue:
-                    df.at[0, "Attachment_back"] = outfilename # Add filename to data record
+                    # Figure out which Alt Cat Number to update with background info
+                    # Add Alt Cat Number to data record
+                    front_idx = assignment['match'][label_idx]
+                    foundAltCatNumber = ""
+                    if front_idx >= 0:
+                        foundAltCatNumber = previous_lst_label_entries[front_idx]["Alt Cat Number"]
+                    if args["verbose"]:
+                        print("Closest Alt Cat Number is " + foundAltCatNumber)
+
+                    record["Alt Cat Number"] = foundAltCatNumber
+                elif record is not None:
+                    # Save the alternative catalogue number for back processing
+                    # Assumes that a Python list contains references
+                    label_data["Alt Cat Number"] = record["Alt Cat Number"]
+                    if queue is None:
+                        resolver.add_record(record)  # Job queue workers leave the names to the merge
+
+                if record is not None:
+                    image_attachments.append(attach_label(record, img_label, imgfilename, sheet['hash'],
+                                                          label_data["label_id"], backgroundIsBlue, args, allocator,
+                                                          manifest, writer))
+
+                    # Add to image table
+                    image_records.append(record)
+
+                # ocrreader.visualize_boxes()
+
+                if sheet['debug']:
+                    debug.save(Path(imgfilename).stem, "labelID" + str(label_data["label_id"]), img_label)
+
+            # Keep only what is needed for pairing with the next image - the label crops have been released
+            lst_label_entries = [pairing_entry(label_data) for label_data in lst_resampled_labels]
+
+            # Create the image table once from the records of all labels
+            image_table = image_records.to_dataframe()
 
-                    # Add original image file name to data record
-                    df.at[0, "Original back image"] = Path(imgfilename).name
-                else:
-                    df.at[0, "Attachment"] = outfilename  # Add filename to data record
-
-                    # Add original image file name to data record
-                    df.at[0, "Original front image"] = Path(imgfilename).name
-
-
-
-                # Add to image table
-                image_table = pd.concat([image_table, df], axis=0, ignore_index=True)
-
-            # ocrreader.visualize_boxes()
-
-            if args["verbose"]:
-                plt.figure()
-                plt.imshow(label_data['image'])
-                plt.title("ID " + str(label_data["label_id"]))
-
-
-        if backgroundIsBlue:
-            # Merge to previous image table
-            image_table = front_table.join(image_table.set_index("Alt Cat Number"), on="Alt Cat Number", how='left')
+            if backgroundIsBlue:
+                # Merge to previous image table
+                image_table = front_table.join(image_table.set_index("Alt Cat Number"), on="Alt Cat Number", how='left')
 
-            # Add to master table
-            master_table = pd.concat([master_table, image_table], axis=0, ignore_index=True)
+                # Add to master table
+                sink.append_dataframe(image_table)
+                # Mark the front and back side images as completed once their label images are written
+                writer.after_written(manifest.record, front_inputs + [(imgfilename, sheet['hash'])], len(image_table),
+                                     front_attachments + image_attachments)
 
+                previous_image_was_front = False
+            else:
+                #if previous_image_was_front:
+                #    # Add empty backside columns to table
+                #    image_table = pd.concat([image_table, empty_back_columns(len(lst_resampled_labels))], axis=1)
+
+                front_inputs = [(imgfilename, sheet['hash'])]
+                front_attachments = image_attachments
+                previous_image_was_front = True
+
+                if sheet.get('unit_end', False):
+                    # A job queue unit with only a front side image is completed right away
+                    sink.append_dataframe(image_table)
+                    writer.after_written(manifest.record, front_inputs, len(image_table), front_attachments)
+                    previous_image_was_front = False
+
+            image_count+=1
+            print("Processed " + str(image_count) + " images")
+        except Exception as e:
+            if queue is None:
+                raise
+            # Give the unit back to the job queue and continue with the next unit. The label images written for
+            # the unit are removed once they are written.
+            print("Failed to transcribe " + ", ".join(Path(name).name for name in sheet['unit']) + ": " + repr(e))
+            if previous_image_was_front:
+                image_attachments = front_attachments + image_attachments
+            writer.after_written(manifest.fail, [(name, "") for name in sheet['unit']], 0, repr(e),
+                                 [Path(args["output"], name) for name in image_attachments])
+            failed_unit = None if sheet['unit_end'] else sheet['unit']
             previous_image_was_front = False
-        else:
-            #if previous_image_was_front:
-            #    # Add empty backside columns to table
-            #    image_table = pd.concat([image_table, empty_back_columns(len(lst_resampled_labels))], axis=1)
-
-            previous_image_was_front = True
-
-        # Write a snapshot as Excel sheet to disk
-        master_table.to_excel(str(Path(args["output"], "spidercards.xlsx")), index=False)
-
-        image_count+=1
-        print("Processed " + str(image_count) + " images")
 
 
-    if args["verbose"]:
-        plt.show()
-
     if previous_image_was_front:
         # Add to master table
-        master_table = pd.concat([master_table, image_table], axis=0, ignore_index=True)
+        sink.append_dataframe(image_table)
+        writer.after_written(manifest.record, front_inputs, len(image_table), front_attachments)
+
+    # Wait for all label images to be written
+    writer.close()
+    manifest.close()
+    sink.close()
+
+    if manifest.skipped > 0:
+        print("Resumed run: skipped " + str(manifest.skipped) + " images completed in a previous run")
+    if queue is not None and manifest.failed > 0:
+        print("Gave " + str(manifest.failed) + " failed units back to the job queue")
+
+    print(triage.report())
+    print(writer.report())
+    if debug is not None:
+        print("Wrote " + str(debug.count) + " debug images to " + str(debug.directory))
+
+    if pairing_counts['labels'] > 0:
+        print("Pairing: " + str(pairing_counts['unmatched']) + " of " + str(pairing_counts['labels'])
+              + " back side labels unmatched, " + str(pairing_counts['ambiguous']) + " ambiguous")
+
+    # Report how often the expensive label detection tiers were needed
+    for tier_name, count in sorted(tier_counts.items()):
+        print("Label detection " + tier_name + " used for " + str(count) + " images")
+
+    if queue is not None:
+        counts = queue.counts()
+        print("Job queue: " + ", ".join(str(counts[status]) + " " + status for status in sorted(counts)))
+        # The last worker to finish merges the shards of all workers into the final table
+        if queue.claim_merge(manifest.name):
+            merge_queue(queue, args["output"], resolver)
+        queue.close()
+    else:
+        # Write final table to disk as Excel sheet
+        write_results(sink, Path(args["output"], "spidercards.xlsx"), resolver)
 
-    # Write final table to disk as Excel sheet
-    master_table.to_excel(str(Path(args["output"], "spidercards.xlsx")), index=False)
+    resolver.close()
+    print(resolver.report())
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,85 @@
+#  Copyright (c) 2026  Natural History Museum of Denmark (NHMD)
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import argparse
+import sys
+import time
+from pathlib import Path
+import lark
+sys.path.append(str(Path(__file__).parent.parent.joinpath('src')))
+
+import csadcardreader
+
+TESTDATAPATH = Path(__file__).parent
+
+
+def parsecards(parser, texts):
+    """Parse the cards and return the fields collected by CSADVisitor for each card and the time used"""
+    results = []
+    start = time.perf_counter()
+    for text in texts:
+        try:
+            result = parser.parse(text)
+            if not isinstance(result, dict):
+                # Parse tree, otherwise the fields were collected by CSADTransformer while parsing
+                visitor = csadcardreader.CSADVisitor()
+                visitor.visit(result)
+                result = visitor.data
+            results.append(result)
+        except lark.UnexpectedInput as e:
+            results.append({"error": type(e).__name__})
+    return results, time.perf_counter() - start
+
+
+# construct the argument parser and parse the arguments
+ap = argparse.ArgumentParser(description="Compare the Earley and LALR parsers of the C-SAD cards on the test cards.")
+ap.add_argument("-i", "--input", required=False, action="extend", nargs="+", type=str,
+                help="text files with cards. Default is tests/CSAD_card*.txt")
+ap.add_argument("-n", "--cards", required=False, default=None, type=int,
+                help="only use the first n cards - the Earley parser takes several seconds per card")
+args = vars(ap.parse_args())
+if args["input"] is None:
+    args["input"] = sorted(str(path) for path in TESTDATAPATH.glob("CSAD_card*.txt"))
+if args["cards"] is not None:
+    args["input"] = args["input"][0:args["cards"]]
+
+texts = [Path(filename).read_text(encoding="utf-8") for filename in args["input"]]
+
+# The LALR parser is run with CSADVisitor on the parse tree and with CSADTransformer while parsing
+results = dict()
+for name, kind, transformer in [("earley", "earley", None), ("lalr", "lalr", None),
+                                ("inline", "lalr", csadcardreader.CSADTransformer())]:
+    start = time.perf_counter()
+    parser = csadcardreader.create_parser(kind, transformer=transformer)
+    load_time = time.perf_counter() - start
+    results[name], parse_time = parsecards(parser, texts)
+    print("%-6s: parser loaded in %6.2f s, %5d cards in %8.2f s, %10.2f cards/s"
+          % (name, load_time, len(texts), parse_time, len(texts) / parse_time))
+
+# The fields are collected in the same order, so the joined values are also the same
+inline_same = sum(lalr == inline and list(lalr) == list(inline)
+                  for lalr, inline in zip(results["lalr"], results["inline"]))
+print("Same fields with CSADTransformer as with CSADVisitor on %d of %d cards" % (inline_same, len(texts)))
+
+same = 0
+for filename, earley, lalr in zip(args["input"], results["earley"], results["lalr"]):
+    if earley == lalr:
+        same += 1
+        continue
+    print(Path(filename).name + ":")
+    for field in sorted(set(earley) | set(lalr)):
+        if earley.get(field) != lalr.get(field):
+            print("  %-12s earley: %-40r lalr: %r" % (field, earley.get(field), lalr.get(field)))
+print("Same fields on %d of %d cards" % (same, len(texts)))
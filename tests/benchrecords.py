@@ -0,0 +1,65 @@
+import argparse
+import sys
+import time
+import pandas as pd
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent.joinpath('src')))
+
+from labelreader.util.records import RecordCollector
+
+# Columns of the front side records of spidercardreader
+COLUMNS = ["Catalogue Number", "Alt Cat Number", "Publish", "Count", "Other Remarks", "Order", "Family", "Genus1",
+           "Species1", "Author name", "Scientific name", "GBIF checked scientific name", "Determiner First Name",
+           "Determiner Last Name", "Determination Date", "Country", "Locality", "OCR Start Date", "Start Date",
+           "Collector First Name", "Collector Last Name", "Attachment", "Original front image"]
+
+
+def makerecord(idx):
+    """Create a record with the same kind of values as a parsed spider card"""
+    record = {column: "" for column in COLUMNS}
+    record["Alt Cat Number"] = str(100000 + idx)
+    record["Publish"] = 1
+    record["Order"] = "Araneae"
+    record["Genus1"] = "Araneus"
+    record["Species1"] = "diadematus"
+    record["Attachment"] = str(100000 + idx) + ".tif"
+    return record
+
+
+def concat_records(n):
+    """The old way: A one-row data frame per record and pd.concat per record"""
+    table = pd.DataFrame({column: [] for column in COLUMNS})
+    for idx in range(n):
+        df = pd.DataFrame({key: [value] for key, value in makerecord(idx).items()})
+        table = pd.concat([table, df], axis=0, ignore_index=True)
+    return table
+
+
+def collect_records(n):
+    """The new way: Dictionaries in a RecordCollector and one data frame at the end"""
+    collector = RecordCollector(COLUMNS)
+    for idx in range(n):
+        collector.append(makerecord(idx))
+    return collector.to_dataframe()
+
+
+# construct the argument parser and parse the arguments
+ap = argparse.ArgumentParser(description="Compare the per-record cost of pd.concat with RecordCollector.")
+ap.add_argument("-n", "--records", required=False, action="extend", nargs="+", type=int,
+                help="numbers of records to benchmark")
+args = vars(ap.parse_args())
+if args["records"] is None:
+    args["records"] = [100, 1000, 5000]
+
+for n in args["records"]:
+    start = time.perf_counter()
+    old_table = concat_records(n)
+    concat_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    new_table = collect_records(n)
+    collect_time = time.perf_counter() - start
+
+    same = list(old_table["Alt Cat Number"]) == list(new_table["Alt Cat Number"])
+    print("%6d records: pd.concat %8.1f us/record, RecordCollector %6.1f us/record, speedup %6.1fx, same rows: %s"
+          % (n, 1e6 * concat_time / n, 1e6 * collect_time / n, concat_time / collect_time, str(same)))
@@ -0,0 +1,123 @@
+#  Copyright (c) 2026  Natural History Museum of Denmark (NHMD)
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import argparse
+import numpy as np
+import pytest
+import sys
+
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent.joinpath('src')))
+
+import csadcardreader
+from labelreader.ocr.triage import BlankTriage
+from labelreader.util.jobqueue import JobQueue, QueueWorker
+from labelreader.util.sink import RecordSink, read_records
+
+TESTDATAPATH = Path(__file__).parent
+
+
+class NoResolver:
+    """Taxon resolver that leaves the records unchanged"""
+
+    def add_record(self, record):
+        pass
+
+    def fill(self, record):
+        return record
+
+
+def test_queue_units(monkeypatch):
+    monkeypatch.setattr(csadcardreader, "pagecount", lambda filename: {"a.pdf": 5, "c.pdf": 2}[filename])
+    units = list(csadcardreader.queue_units(["a.pdf", "b.tif", "c.pdf"], 2))
+    assert units == [["a.pdf[1-2]"], ["a.pdf[3-4]"], ["a.pdf[5-5]"], ["b.tif"], ["c.pdf[1-2]"]]
+
+
+def test_splitpages():
+    assert csadcardreader.splitpages("dir/a.pdf[3-4]") == ("dir/a.pdf", 3, 4)
+    assert csadcardreader.splitpages("dir/a.pdf") == ("dir/a.pdf", 1, None)
+    assert csadcardreader.splitpages("dir/b.tif") == ("dir/b.tif", 1, None)
+
+
+def test_merge_queue(tmp_path, monkeypatch):
+    monkeypatch.setattr(csadcardreader, "pagecount", lambda filename: 5)
+    queue = JobQueue(tmp_path.joinpath("jobs.sqlite"))
+    queue.add(csadcardreader.queue_units(["a.pdf", "b.tif", "c.pdf"], 2))
+
+    # Two workers take turns, so the shards hold the page ranges out of order
+    workers = [QueueWorker(queue, name="w" + str(i), poll_seconds=0.01) for i in range(2)]
+    sinks = [RecordSink(worker.shardpath) for worker in workers]
+    leases = [worker.leases() for worker in workers]
+    for i in [1, 0, 0, 1, 1, 0, 1]:
+        unit = next(leases[i])
+        imgfilename, first, last = csadcardreader.splitpages(unit["inputs"][0])
+        pages = range(first, 2 if last is None else last + 1)
+        for no_pages in pages:
+            sinks[i].append({"Family": Path(imgfilename).stem, "Attachment": str(no_pages)})
+        workers[i].record([(unit["inputs"][0], "")], len(pages))
+    for i in range(2):
+        assert list(leases[i]) == []
+        sinks[i].close()
+
+    output = tmp_path.joinpath("output")
+    csadcardreader.merge_queue(queue, output, NoResolver())
+    for name in ["a", "c"]:
+        rows = list(read_records(output.joinpath(name, name + ".jsonl")))
+        assert [row["Attachment"] for row in rows] == ["1", "2", "3", "4", "5"]
+        assert all(row["Family"] == name for row in rows)
+        assert output.joinpath(name, name + ".xlsx").exists()
+    rows = list(read_records(output.joinpath("output.jsonl")))
+    assert [row["Family"] for row in rows] == ["b"]
+    queue.close()
+
+
+def test_positive_int():
+    assert csadcardreader.positive_int("3") == 3
+    for text in ["0", "-1"]:
+        with pytest.raises(argparse.ArgumentTypeError):
+            csadcardreader.positive_int(text)
+
+
+def test_process_pages_error(tmp_path, monkeypatch):
+    # The page images of a range that fails partway are removed
+    def fail_on_page(img, imgfilename, no_pages, *args):
+        if no_pages == 3:
+            raise RuntimeError("OCR failed")
+        return {"Attachment": ""}
+
+    monkeypatch.setattr(csadcardreader, "iterpages", lambda filename, resolution, first, last: (
+        (no_pages, np.zeros((8, 8, 3), dtype=np.uint8)) for no_pages in range(first, last + 1)))
+    monkeypatch.setattr(csadcardreader, "transcribe_page", fail_on_page)
+    monkeypatch.setattr(csadcardreader, "worker_state", {
+        "args": {"output": str(tmp_path), "resolution": 600, "codec": "lzw", "level": None},
+        "ocrreader": None, "parser": None, "triage": BlankTriage()})
+    tmp_path.joinpath("cards").mkdir()
+
+    results, checked, blank = csadcardreader.process_pages(("cards.pdf", 1, 1, 2))
+    assert [Path(tmpfilename).name for _, _, tmpfilename in results] == [".cards_image1_page1.tif",
+                                                                        ".cards_image1_page2.tif"]
+    with pytest.raises(RuntimeError):
+        csadcardreader.process_pages(("cards.pdf", 2, 1, 4))
+    assert sorted(p.name for p in tmp_path.joinpath("cards").iterdir()) == [".cards_image1_page1.tif",
+                                                                          ".cards_image1_page2.tif"]
+
+
+def test_remove_tmpfiles(tmp_path):
+    names = [".cards_image1_page1.tif", ".cards_image2_page5.tif", ".cards2_image1_page1.tif", "cards_image1_page1.tif"]
+    for name in names:
+        tmp_path.joinpath(name).touch()
+    assert csadcardreader.remove_tmpfiles(tmp_path, "in/cards.pdf", no_img=2) == 1
+    assert csadcardreader.remove_tmpfiles(tmp_path, "in/cards.pdf") == 1
+    assert sorted(p.name for p in tmp_path.iterdir()) == [".cards2_image1_page1.tif", "cards_image1_page1.tif"]
@@ -0,0 +1,116 @@
+#  Copyright (c) 2026  Natural History Museum of Denmark (NHMD)
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import argparse
+import pytest
+import sys
+import numpy as np
+import warnings
+import zxingcpp
+from skimage.io import imsave
+
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent.joinpath('src')))
+
+import herbariumcardreader
+
+TESTDATAPATH = Path(__file__).parent
+
+
+class FakeOCR:
+    """OCR reader that counts the images it is given and returns a fixed text"""
+
+    def __init__(self):
+        self.shapes = []
+
+    def read_image(self, img):
+        self.shapes.append(img.shape)
+
+    def get_text(self):
+        return [["Flora", "Danica"], ["1901"]]
+
+
+def makesheet(tmp_path, text=None):
+    """Write a 600x400 pixel RGB sheet with a Data Matrix code with the given text, or no code if text is None,
+       and return the file name"""
+    img = np.full((600, 400, 3), 230, dtype=np.uint8)
+    if text is not None:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", DeprecationWarning)
+            code = np.array(zxingcpp.write_barcode(zxingcpp.BarcodeFormat.DataMatrix, text, width=0, height=0))
+        code = np.kron(code, np.ones((8, 8), dtype=np.uint8))
+        img[50:50 + code.shape[0], 250:250 + code.shape[1]] = code[:, :, np.newaxis]
+    imgfilename = tmp_path.joinpath("sheet.png" if text is not None else "blank.png")
+    imsave(str(imgfilename), img, check_contrast=False)
+    return str(imgfilename)
+
+
+def setworker(monkeypatch, ocr):
+    """Set the worker state as init_worker does, but with a fake OCR reader"""
+    ocrreader = FakeOCR()
+    args = {"ocr": ocr, "label_region": (0.5, 0.5, 1.0, 1.0)}
+    monkeypatch.setattr(herbariumcardreader, "worker_state", {"args": args, "ocrreader": ocrreader})
+    return ocrreader
+
+
+def test_catalogue_number_from_barcode():
+    assert herbariumcardreader.catalogue_number_from_barcode("NHMD-681096") == "681096"
+    assert herbariumcardreader.catalogue_number_from_barcode("C10 000123") == "000123"
+    assert herbariumcardreader.catalogue_number_from_barcode("NHMD") == ""
+
+
+def test_parse_region():
+    assert herbariumcardreader.parse_region("0.7,0.5,1.0,1") == (0.7, 0.5, 1.0, 1.0)
+    for text in ["0.7,0.5,1.0", "0.5,0.5,0.5,1.0", "0.7,0.5,1.2,1.0", "-0.1,0.5,1.0,1.0"]:
+        with pytest.raises(argparse.ArgumentTypeError):
+            herbariumcardreader.parse_region(text)
+
+
+def test_crop_region():
+    img = np.arange(100 * 50).reshape((100, 50))
+    crop = herbariumcardreader.crop_region(img, (0.7, 0.5, 1.0, 1.0))
+    assert crop.shape == (30, 25)
+    assert crop[0, 0] == img[70, 25]
+
+
+@pytest.mark.parametrize("ocr, ocr_sheet, ocr_blank", [("always", True, True), ("fallback", False, True),
+                                                       ("never", False, False)])
+def test_process_sheet_ocr(tmp_path, monkeypatch, ocr, ocr_sheet, ocr_blank):
+    ocrreader = setworker(monkeypatch, ocr)
+    record = herbariumcardreader.process_sheet(makesheet(tmp_path, "NHMD-681096"))
+    assert record["Catalogue Number"] == "681096"
+    assert record["Barcode"] == "NHMD-681096"
+    assert record["Status"] == "ok"
+    assert record["OCR"] == ocr_sheet
+    assert record["Label text"] == ("Flora Danica\n1901" if ocr_sheet else "")
+    assert list(record) == list(herbariumcardreader.empty_dataframe().columns)
+
+    record = herbariumcardreader.process_sheet(makesheet(tmp_path))
+    assert record["Catalogue Number"] == ""
+    assert record["Status"] == "no code"
+    assert record["OCR"] == ocr_blank
+    # Only the label region is OCR'ed
+    assert ocrreader.shapes == [(300, 200, 3)] * (int(ocr_sheet) + int(ocr_blank))
+
+
+def test_process_sheet_error(tmp_path, monkeypatch):
+    setworker(monkeypatch, "fallback")
+    imgfilename = tmp_path.joinpath("corrupt.tif")
+    imgfilename.write_bytes(b"not a tiff")
+    record = herbariumcardreader.process_sheet(str(imgfilename))
+    assert record["Status"] == "error"
+    assert record["Error"] != ""
+    assert record["Original image"] == "corrupt.tif"
+    assert list(record) == list(herbariumcardreader.empty_dataframe().columns)
@@ -0,0 +1,95 @@
+#  Copyright (c) 2026  Natural History Museum of Denmark (NHMD)
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import pytest
+import sys
+import numpy as np
+import warnings
+import zxingcpp
+
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent.joinpath('src')))
+
+from labelreader.barcode import barcode
+
+TESTDATAPATH = Path(__file__).parent
+
+
+def makedatamatrix(text, module_size=10):
+    """Construct an 8-bit grayscale image of a Data Matrix code with the given module size in pixels"""
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", DeprecationWarning)
+        code = np.array(zxingcpp.write_barcode(zxingcpp.BarcodeFormat.DataMatrix, text, width=0, height=0))
+    return np.kron(code, np.ones((module_size, module_size), dtype=np.uint8))
+
+
+def maketestsheet():
+    """Construct a 3000x2000 pixel RGB sheet with lines of 'text' and a Data Matrix code at row 300, column 1500"""
+    rng = np.random.default_rng(1)
+    img = np.full((3000, 2000, 3), 230, dtype=np.uint8)
+    for row in range(2000, 2800, 50):
+        for col in range(200, 1800, 20):
+            if rng.random() < 0.8:
+                img[row:row + 25, col:col + rng.integers(3, 15)] = 30
+    code = makedatamatrix("NHMD-681096")
+    img[300:300 + code.shape[0], 1500:1500 + code.shape[1]] = code[:, :, np.newaxis]
+    return img
+
+
+def test_to_gray():
+    img = maketestsheet()
+    gray = barcode.to_gray(img)
+    assert gray.shape == img.shape[0:2]
+    assert gray.dtype == np.uint8
+
+    gray = barcode.to_gray(img.astype(float) / 255.0)
+    assert gray.dtype == np.uint8
+    assert gray.max() > 200
+
+
+def test_find_code_regions():
+    img = maketestsheet()
+    regions = barcode.find_code_regions(img)
+
+    assert len(regions) >= 1
+    min_row, min_col, max_row, max_col = regions[0]
+    # The region must contain the code
+    assert min_row <= 300 and min_col <= 1500
+    assert max_row >= 300 + 160 and max_col >= 1500 + 160
+
+
+def test_read_barcodes():
+    img = maketestsheet()
+    codes = barcode.read_barcodes(img)
+
+    assert len(codes) == 1
+    assert codes[0]['text'] == "NHMD-681096"
+    assert "Matrix" in codes[0]['format']
+    # Position is in full image coordinates
+    min_row, min_col, max_row, max_col = codes[0]['bbox']
+    assert abs(min_row - 300) < 20 and abs(min_col - 1500) < 20
+    assert len(codes[0]['position']) == 4
+
+    # No codes on a blank sheet
+    assert barcode.read_barcodes(np.full((1000, 800), 255, dtype=np.uint8), fallback=True) == []
+
+
+def test_compare_decoding():
+    comparison = barcode.compare_decoding(maketestsheet())
+
+    assert comparison['same']
+    assert comparison['roi_time'] > 0.0
+    assert comparison['full_time'] > 0.0
+    assert [code['text'] for code in comparison['full_codes']] == ["NHMD-681096"]
@@ -0,0 +1,241 @@
+#  Copyright (c) 2026  Natural History Museum of Denmark (NHMD)
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import json
+import pytest
+import sys
+import re
+import lark
+
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent.joinpath('src')))
+
+from labelreader.grammars import grammars
+
+TESTDATAPATH = Path(__file__).parent
+
+GRAMMAR = r"""
+start: WORD+
+WORD: /[a-z]+/i
+%import common.WS
+%ignore WS
+"""
+
+
+def test_read_grammar():
+    grammar = grammars.read_grammar("csad.lark")
+    assert "card" in grammar
+
+
+@pytest.mark.parametrize("name", ["csad.lark", "csad_lalr.lark"])
+def test_grammar_regexps(name):
+    # All regular expressions of the packaged grammars must compile, e.g. no inline flags in the middle
+    grammar = grammars.read_grammar(name)
+    patterns = re.findall(r"^\w[\w.-]*:\s*/((?:[^/\\\n]|\\.)+)/[imslux]*", grammar, flags=re.MULTILINE)
+    assert len(patterns) > 10
+    for pattern in patterns:
+        re.compile(pattern)
+
+
+def test_csad_month_regexp():
+    grammar = grammars.read_grammar("csad.lark")
+
+    # The month names are case insensitive through the i flag of the terminal
+    month = re.search(r"^DKMONTH[\w.]*:\s*/((?:[^/\\\n]|\\.)+)/i$", grammar, flags=re.MULTILINE)
+    month = re.compile(month.group(1), re.IGNORECASE)
+    assert month.fullmatch("JAN.")
+    assert month.fullmatch("Marts,")
+
+
+def test_grammar_key():
+    assert grammars.grammar_key(GRAMMAR, start="start") == grammars.grammar_key(GRAMMAR, start="start")
+    assert grammars.grammar_key(GRAMMAR, start="start") != grammars.grammar_key(GRAMMAR + "\n", start="start")
+    assert grammars.grammar_key(GRAMMAR, start="start") != grammars.grammar_key(GRAMMAR, start="other")
+
+
+def test_create_parser_cache(tmp_path, monkeypatch):
+    parser = grammars.create_parser(GRAMMAR, name="words", cache_dir=tmp_path, start="start")
+    cachefiles = list(tmp_path.glob("words-*.pickle"))
+    assert len(cachefiles) == 1
+    tree = parser.parse("Some words")
+
+    # The second parser is loaded from the cache without creating a lark.Lark
+    def fail(*args, **kwargs):
+        raise AssertionError("The parser was not loaded from the cache")
+    monkeypatch.setattr(grammars.lark, "Lark", fail)
+    cached = grammars.create_parser(GRAMMAR, name="words", cache_dir=tmp_path, start="start")
+    assert cached.parse("Some words") == tree
+    monkeypatch.undo()
+
+    # A broken cache file is replaced
+    cachefiles[0].write_bytes(b"broken")
+    parser = grammars.create_parser(GRAMMAR, name="words", cache_dir=tmp_path, start="start")
+    assert parser.parse("Some words") == tree
+    assert cachefiles[0].read_bytes() != b"broken"
+    assert list(tmp_path.glob("*.tmp")) == []
+
+
+def test_create_parser_lalr_cache(tmp_path):
+    # LALR parsers are cached in the format of Lark
+    parser = grammars.create_parser(GRAMMAR, name="words", cache_dir=tmp_path, start="start", parser="lalr")
+    cached = grammars.create_parser(GRAMMAR, name="words", cache_dir=tmp_path, start="start", parser="lalr")
+    assert cached is not parser
+    assert cached.parse("Some words") == parser.parse("Some words")
+
+    grammar = grammars.read_grammar("csad_lalr.lark")
+    parser = grammars.create_parser(grammar, name="csad_lalr", cache_dir=tmp_path, start="card", parser="lalr",
+                                    lexer="contextual")
+    cached = grammars.create_parser(grammar, name="csad_lalr", cache_dir=tmp_path, start="card", parser="lalr",
+                                    lexer="contextual")
+    text = TESTDATAPATH.joinpath("CSAD_card1.txt").read_text(encoding="utf-8")
+    assert cached.parse(text) == parser.parse(text)
+
+
+def test_create_parser_no_cache(tmp_path):
+    parser = grammars.create_parser(GRAMMAR, name="words", cache_dir=tmp_path, use_cache=False, start="start")
+    assert isinstance(parser, lark.Lark)
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_default_cache_dir(monkeypatch, tmp_path):
+    monkeypatch.setenv(grammars.CACHE_ENVIRONMENT_VARIABLE, str(tmp_path))
+    assert grammars.default_cache_dir() == tmp_path
+    monkeypatch.delenv(grammars.CACHE_ENVIRONMENT_VARIABLE)
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    assert grammars.default_cache_dir() == tmp_path.joinpath("labelreader")
+
+
+# Fields found by the Earley parser of csad.lark in test cards
+CSAD_CARDS = {
+    "CSAD_card1.txt": {"date": "28.06.94", "parsed_date": "28-06-0094", "family": "ACANTHACEAE", "catnumber": "15442",
+                       "genus": "Anisosepalum", "species": "alboviolaceum", "author": "(Benoist) Hossain",
+                       "nodot": "No. 620", "locality": "Uganda", "leg": "Axel D. Poulsen", "det": "Axel D. Poulsen"},
+    "CSAD_card7.txt": {"date": "7/7 1963", "parsed_date": "07-07-1963", "locality": "Thailand", "leg": "Kai Larsen",
+                       "family": "ACANTHACEAE", "catnumber": "6942", "nodot": "No, 10579"},
+    "CSAD_card18.txt": {"date": "1964", "parsed_date": "00-00-1964", "species": "obovatum", "author": "Juclay",
+                        "locality": "Thailand", "leg": "Bertel Hansen", "det": "Brem", "catnumber": "5949",
+                        "genus": "ERANTHERUM"},
+    "CSAD_card36.txt": {"date": "18/1 1888", "parsed_date": "18-01-1888", "species": "gloriosa", "author": "L,",
+                        "locality": "Haiti;Eggers", "catnumber": "20.798", "genus": "YUCCA"}
+}
+
+
+@pytest.mark.parametrize("card", sorted(CSAD_CARDS))
+def test_csad_lalr(card):
+    import csadcardreader
+
+    # The LALR grammar has no conflicts and gives the same fields as the Earley grammar
+    parser = grammars.create_parser(grammars.read_grammar("csad_lalr.lark"), use_cache=False, start="card",
+                                    parser="lalr", lexer="contextual")
+    visitor = csadcardreader.CSADVisitor()
+    visitor.visit(parser.parse(TESTDATAPATH.joinpath(card).read_text(encoding="utf-8")))
+    assert visitor.data == CSAD_CARDS[card]
+
+
+# Fields found by the Earley parser of csad.lark in all test cards, as listed by tests/benchcsadparser.py. The Earley
+# parser takes minutes for the test cards, so its fields are stored.
+CSAD_EARLEY = json.loads(TESTDATAPATH.joinpath("CSAD_cards_earley.json").read_text(encoding="utf-8"))
+
+# Cards where the LALR parser finds other fields than the Earley parser: The fields found by the LALR parser that
+# differ (None for a field it does not find) and the reason. The Earley parser resolves the ambiguous lines of noisy
+# cards by picking one of all possible parses, while the LALR grammar decides with lookaheads in the terminals.
+CSAD_LALR_DIFFERENCES = {
+    "CSAD_card10.txt": ({"genus": None, "species": "Mr", "author": None,
+                         "other": "Lenidagathis trinenis Nees.;var, aspeninma C,Bs Clarke,;Dwarka. 19-20/1-23,;"
+                                  "OT, Ho. 128,"},
+                        "The OCR noise '— Mr' above the genus line is read as a species without a genus, so the "
+                        "genus line is other. Earley joins the noise into the genus 'Lenidagathis Mr', so "
+                        "neither is right."),
+    "CSAD_card12.txt": ({"daterange": None, "locality": "m", "other": "3428;T 75/188"},
+                        "Earley splits 'T 75/188' into the locality 'T', the date range '75/18' and '8'. The "
+                        "LALR locality lookahead needs a whole date after the word, so the line is other."),
+    "CSAD_card24.txt": ({"author": None, "other": "Meninia. turgida fix,;057 B.;H.B.H. April 1893."},
+                        "Earley reads the whole garbled taxon line 'Meninia. turgida fix,' as an author. An author "
+                        "follows a genus or species in the LALR grammar, so the line is other."),
+    "CSAD_card25.txt": ({"locality": "R", "other": "Monedima debilis;H.D.H, 31-8-96.;EH. Warming.;o72D"},
+                        "Earley reads the taxon 'Monedima debilis' as two localities. The LALR locality "
+                        "lookahead rejects words followed by ';', so the line is other."),
+    "CSAD_card29.txt": ({"author": None, "other": "St. Croix.;F. Børresen."},
+                        "Earley reads the locality line 'St. Croix.' as a taxon line with only an author. An author "
+                        "follows a genus or species in the LALR grammar, so the line is other."),
+    "CSAD_card35.txt": ({"author": None, "family": None, "other": "Dracaena. Draco,;H.D.H.;19/I1-08,"},
+                        "Earley splits 'Dracaena' into the family 'Dracae' and the author 'na. Draco,'. The LALR "
+                        "family terminal must end the word."),
+    "CSAD_card37.txt": ({"error": None, "catnumber": "52", "leg": "C.H.", "locality": "Ostenfeld",
+                         "other": "Sardinia, Pira;s Bay, in demis.;5/5. Thor;s oceanographiske Expedition;"
+                                  "Pancratium maritinum,;\" Co. be :;til Middelhavet. 1910. Bot. Nr.212."},
+                        "The Earley parser fails on the '_' in the OCR noise of the top line, which the LALR "
+                        "grammar skips."),
+}
+
+
+@pytest.fixture(scope="module")
+def csadparsers():
+    import csadcardreader
+    return (csadcardreader.create_parser("lalr", use_cache=False),
+            csadcardreader.create_parser("lalr", transformer=csadcardreader.CSADTransformer()))
+
+
+@pytest.mark.parametrize("card", sorted(path.name for path in TESTDATAPATH.glob("CSAD_card*.txt")))
+def test_csad_transformer(card, csadparsers):
+    import csadcardreader
+
+    # The fields collected while parsing are the same as the fields found by the visitor, also in the same order
+    text = TESTDATAPATH.joinpath(card).read_text(encoding="utf-8")
+    visitor = csadcardreader.CSADVisitor()
+    visitor.visit(csadparsers[0].parse(text))
+    data = csadparsers[1].parse(text)
+    assert data == visitor.data
+    assert list(data.items()) == list(visitor.data.items())
+
+
+@pytest.mark.parametrize("card", sorted(CSAD_EARLEY))
+def test_csad_lalr_differences(card, csadparsers):
+    import csadcardreader
+
+    # The LALR parser finds the same fields as the Earley parser, except for the listed differences
+    expected = dict(CSAD_EARLEY[card])
+    differences, reason = CSAD_LALR_DIFFERENCES.get(card, ({}, ""))
+    for field, value in differences.items():
+        if value is None:
+            del expected[field]
+        else:
+            expected[field] = value
+    visitor = csadcardreader.CSADVisitor()
+    visitor.visit(csadparsers[0].parse(TESTDATAPATH.joinpath(card).read_text(encoding="utf-8")))
+    assert visitor.data == expected
+
+
+def test_csad_lineclassifier(csadparsers):
+    import csadcardreader
+
+    classifier = csadcardreader.LineClassifier(csadparsers[0])
+    data = classifier.classify(TESTDATAPATH.joinpath("CSAD_card1.txt").read_text(encoding="utf-8"))
+    assert data["family"] == "ACANTHACEAE"
+    assert data["catnumber"] == "15442"
+    assert data["nodot"] == "No. 620"
+    assert data["leg"] == "Axel D. Poulsen"
+    assert data["det"] == "Axel D. Poulsen"
+    assert data["date"] == "28.06.94"
+    assert "Uganda" in data["other"]
+    assert classifier.classify("\n \n") == {}
+
+
+def test_csad_pageranges(monkeypatch):
+    import csadcardreader
+
+    monkeypatch.setattr(csadcardreader, "pagecount", lambda filename: 10)
+    assert list(csadcardreader.pageranges("cards.pdf", 3, 4)) == [("cards.pdf", 3, 1, 4), ("cards.pdf", 3, 5, 8),
+                                                                  ("cards.pdf", 3, 9, 10)]
@@ -123,3 +123,64 @@ def test_resample_label_blue():
     lst_resampled_labels = labeldetect.resample_label(img, label_img)
 
     assert len(lst_resampled_labels) == 9
+
+def test_upsample_nearest():
+    img = np.array([[1, 2], [3, 4]], dtype=np.int64)
+    upsampled = labeldetect.upsample_nearest(img, 2, (3, 4))
+
+    assert upsampled.shape == (3, 4)
+    assert upsampled.dtype == img.dtype
+    assert np.array_equal(upsampled, np.array([[1, 1, 2, 2], [1, 1, 2, 2], [3, 3, 4, 4]]))
+
+def test_color_segment_in_labels():
+    img = makeredtestlabelimg()
+    img[120:130, 110:190] = np.array([1.0, 0.0, 0.0], dtype=float)  # Red line on the first label
+    label_img, num_labels = labeldetect.find_labels(labeldetect.color_segment_labels(img))
+    lineMask = labeldetect.color_segment_in_labels(img, label_img)
+
+    assert lineMask.shape == img.shape[0:2]
+    assert lineMask.dtype == np.uint8
+    # Inside the labels the result is the same as segmenting the whole image
+    inside = label_img > 0
+    assert np.array_equal(lineMask[inside], labeldetect.color_segment_labels(img)[inside])
+    assert np.count_nonzero(lineMask[100:200, 100:200] == 0) == 800
+    # The red background outside the labels is not segmented
+    assert np.all(lineMask[0:100, :] == 1)
+
+def test_check_label_geometry():
+    label_img, num_labels = labeldetect.find_labels(maketestmask())
+    assert labeldetect.check_label_geometry(label_img, 4, 1000, max_aspect=1.1) == (True, 4)
+    assert labeldetect.check_label_geometry(label_img, 9, 1000, max_aspect=1.1) == (False, 4)
+    # Squares are not label shaped with the default aspect ratio test
+    assert labeldetect.check_label_geometry(label_img, 4, 1000) == (False, 0)
+
+def test_detect_labels_tiered_red():
+    img = imread(str(TESTDATAPATH.joinpath('redlabels.jpg')))
+    detection = labeldetect.detect_labels_tiered(img, huerange=(0.0, 0.05))
+
+    assert detection['accepted']
+    assert detection['tier'] == 0  # The cheap coarse pass is enough
+    assert detection['label_img'].shape == img.shape[0:2]
+    assert detection['mask'].shape == img.shape[0:2]
+    assert detection['edges'].shape == img.shape[0:2]
+
+    lst_resampled_labels = labeldetect.resample_label(img, detection['label_img'])
+    assert len(lst_resampled_labels) == 9
+
+def test_detect_labels_tiered_escalation():
+    # The blue image has no labels on a red background, so all tiers are tried and we fall back to full resolution
+    img = imread(str(TESTDATAPATH.joinpath('bluelabels.jpg')))
+    detection = labeldetect.detect_labels_tiered(img[0:500, 0:500], huerange=(0.0, 0.05), factors=(4, 1))
+
+    assert not detection['accepted']
+    assert detection['factor'] == 1
+    assert detection['tier'] == 1
+    assert not np.any(detection['edges'])
+
+def test_detect_labels_tiered_alt_huerange():
+    img = imread(str(TESTDATAPATH.joinpath('bluelabels.jpg')))
+    detection = labeldetect.detect_labels_tiered(img, huerange=(0.0, 0.05), alt_hueranges=[(0.5, 0.7)])
+
+    assert detection['accepted']
+    assert detection['tier'] == 1
+    assert detection['huerange'] == (0.5, 0.7)
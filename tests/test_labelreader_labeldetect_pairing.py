@@ -0,0 +1,91 @@
+import pytest
+import sys
+import numpy as np
+
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent.joinpath('src')))
+
+from labelreader.labeldetect import pairing
+
+TESTDATAPATH = Path(__file__).parent
+
+
+def makegrid(rows=3, cols=3, spacing=1000.0):
+    """Construct the (row, col) centroids of a grid of labels"""
+    return np.array([(spacing * (r + 0.5), spacing * (c + 0.5)) for r in range(rows) for c in range(cols)])
+
+
+def test_centroid_array():
+    labels = [{'label_id': 1, 'centroid': (10.0, 20.0)}, {'label_id': 2, 'centroid': (30.0, 40.0)}]
+    assert np.array_equal(pairing.centroid_array(labels), np.array([[10.0, 20.0], [30.0, 40.0]]))
+    assert pairing.centroid_array([]).shape == (0, 2)
+
+
+def test_mirror_centroids():
+    mirrored = pairing.mirror_centroids(np.array([[10.0, 0.0], [20.0, 99.0]]), width=100)
+    assert np.array_equal(mirrored, np.array([[10.0, 99.0], [20.0, 0.0]]))
+
+
+def test_assign_labels():
+    front = makegrid()
+    rng = np.random.default_rng(0)
+    order = rng.permutation(len(front))
+    back = front[order] + rng.normal(scale=30.0, size=front.shape)
+
+    assignment = pairing.assign_labels(back, front)
+    assert np.array_equal(assignment['match'], order)
+    assert assignment['unmatched'] == []
+    assert assignment['unmatched_reference'] == []
+    assert assignment['ambiguous'] == []
+
+
+def test_assign_labels_one_to_one():
+    # Both labels are closest to reference 0, but only one of them gets it
+    assignment = pairing.assign_labels(np.array([[0.0, 0.0], [0.0, 10.0]]), np.array([[0.0, 4.0], [0.0, 100.0]]))
+    assert np.array_equal(assignment['match'], [0, 1])
+
+
+def test_assign_labels_unmatched():
+    front = makegrid()
+    back = front[0:7]
+    assignment = pairing.assign_labels(back, front)
+    assert np.array_equal(assignment['match'], np.arange(7))
+    assert assignment['unmatched_reference'] == [7, 8]
+
+    # More labels than reference labels
+    assignment = pairing.assign_labels(front, back)
+    assert assignment['unmatched'] == [7, 8]
+
+    # Pairs that are too far apart are rejected
+    assignment = pairing.assign_labels(front + 600.0, front, max_distance=500.0)
+    assert assignment['unmatched'] == list(range(9))
+
+    # No reference labels at all
+    assignment = pairing.assign_labels(front, np.zeros((0, 2)))
+    assert assignment['unmatched'] == list(range(9))
+
+
+def test_assign_labels_ambiguous():
+    # The label is halfway between two reference labels
+    assignment = pairing.assign_labels(np.array([[0.0, 50.0]]), np.array([[0.0, 0.0], [0.0, 101.0]]))
+    assert assignment['ambiguous'] == [0]
+
+
+def test_assign_labels_mirrored():
+    # A turned over sheet has the columns in reverse order
+    front = makegrid()
+    width = 3000
+    back = front.copy()
+    back[:, 1] = (width - 1) - back[:, 1]
+
+    assignment = pairing.assign_labels(pairing.mirror_centroids(back, width), front)
+    assert np.array_equal(assignment['match'], np.arange(9))
+
+
+def test_assign_labels_batch():
+    # Pairing all labels of a batch of sheets at once
+    front = makegrid(rows=30, cols=30, spacing=100.0)
+    rng = np.random.default_rng(1)
+    order = rng.permutation(len(front))
+    assignment = pairing.assign_labels(front[order] + rng.normal(scale=5.0, size=front.shape), front)
+    assert np.array_equal(assignment['match'], order)
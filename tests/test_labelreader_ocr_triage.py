@@ -0,0 +1,85 @@
+#  Copyright (c) 2026  Natural History Museum of Denmark (NHMD)
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import pytest
+import sys
+import numpy as np
+
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent.joinpath('src')))
+
+from labelreader.ocr import triage
+
+TESTDATAPATH = Path(__file__).parent
+
+
+def makeblankimg():
+    """Construct a 400x600 pixel off-white RGB image with a bit of noise"""
+    rng = np.random.default_rng(0)
+    img = np.full((400, 600, 3), 235, dtype=np.uint8)
+    img += rng.integers(0, 10, size=img.shape, dtype=np.uint8)
+    return img
+
+
+def maketextimg():
+    """Construct a blank image with three lines of thin dark 'text' strokes"""
+    img = makeblankimg()
+    for row in (100, 150, 200):
+        for col in range(100, 400, 12):
+            img[row:row + 15, col:col + 2] = 20
+    return img
+
+
+def test_downscale_min():
+    img = maketextimg()
+    small = triage.downscale_min(img, max_side=64, margin=0.0)
+
+    assert max(small.shape) <= 64
+    assert small.ndim == 2
+    assert small.min() >= 0.0 and small.max() <= 1.0
+    # Thin strokes must survive the downscaling
+    assert small.min() < 0.1
+
+    small = triage.downscale_min(img[:, :, 0].astype(float) / 255.0, max_side=64, margin=0.0)
+    assert small.min() < 0.1
+
+
+def test_ink_coverage():
+    assert triage.ink_coverage(makeblankimg()) == 0.0
+    assert triage.ink_coverage(maketextimg()) > 0.01
+
+
+def test_isblank():
+    assert triage.isblank(makeblankimg())
+    assert triage.isblank(np.zeros((100, 100), dtype=float))
+    assert not triage.isblank(maketextimg())
+
+    # Dark border outside the margin is ignored
+    img = makeblankimg()
+    img[0:20, :] = 0
+    assert triage.isblank(img)
+
+
+def test_blanktriage():
+    blanktriage = triage.BlankTriage()
+    assert blanktriage.isblank(makeblankimg())
+    assert not blanktriage.isblank(maketextimg())
+    assert blanktriage.checked == 2
+    assert blanktriage.blank == 1
+    assert "saved 1 OCR calls" in blanktriage.report()
+
+    blanktriage = triage.BlankTriage(enabled=False)
+    assert not blanktriage.isblank(makeblankimg())
+    assert blanktriage.blank == 0
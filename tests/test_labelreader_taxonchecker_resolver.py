@@ -0,0 +1,74 @@
+#  Copyright (c) 2026  Natural History Museum of Denmark (NHMD)
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import pytest
+import sys
+import threading
+
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent.joinpath('src')))
+
+from labelreader.taxonchecker import resolver
+
+TESTDATAPATH = Path(__file__).parent
+
+
+class CountingChecker:
+    """Taxon checker that counts its look ups instead of asking GBIF"""
+
+    def __init__(self):
+        self.queries = []
+        self.lock = threading.Lock()
+
+    def check_full_name(self, querystring):
+        with self.lock:
+            self.queries.append(querystring)
+        if querystring.startswith("Unknown"):
+            return None
+        if querystring.startswith("Broken"):
+            raise ConnectionError("no network")
+        return querystring + " L."
+
+
+def query(record):
+    return record["Genus"] + " " + record["Species"]
+
+
+def test_taxonresolver_deduplicates():
+    checker = CountingChecker()
+    records = [{"Genus": "Araneus", "Species": "diadematus", "GBIF checked scientific name": None}
+               for i in range(500)]
+    records.append({"Genus": "Unknown", "Species": "sp", "GBIF checked scientific name": None})
+    records.append({"Genus": "Araneus", "Species": "x", "GBIF checked scientific name": ""})  # Not pending
+
+    with resolver.TaxonResolver(checker, query=query) as taxonresolver:
+        taxonresolver.add_records(records)
+        filled = [taxonresolver.fill(dict(record)) for record in records]
+
+    assert sorted(checker.queries) == ["Araneus diadematus", "Unknown sp"]
+    assert filled[0]["GBIF checked scientific name"] == "Araneus diadematus L."
+    assert filled[500]["GBIF checked scientific name"] is None
+    assert filled[501]["GBIF checked scientific name"] == ""
+    assert taxonresolver.filled == 501
+    assert taxonresolver.report() == "Taxon names: 2 distinct names looked up for 501 records"
+
+
+def test_taxonresolver_failure():
+    checker = CountingChecker()
+    with resolver.TaxonResolver(checker, query=query) as taxonresolver:
+        assert taxonresolver.resolve("Broken name") is None
+        assert taxonresolver.resolve("Broken name") is None
+    assert checker.queries == ["Broken name"]
+    assert taxonresolver.failures == 1
@@ -0,0 +1,97 @@
+#  Copyright (c) 2026  Natural History Museum of Denmark (NHMD)
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import pytest
+import sys
+import numpy as np
+from skimage.io import imread, imsave
+
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent.joinpath('src')))
+
+from labelreader.util import attachments
+
+TESTDATAPATH = Path(__file__).parent
+
+
+def makeimage(seed=0, shape=(200, 300, 3)):
+    """Create a random RGB image"""
+    return np.random.default_rng(seed).integers(0, 256, size=shape, dtype=np.uint8)
+
+
+def test_tiff_options():
+    assert attachments.tiff_options() == {"compression": "tiff_lzw"}
+    assert attachments.tiff_options("jpeg", 80) == {"compression": "jpeg", "quality": 80}
+    with pytest.raises(ValueError):
+        attachments.tiff_options("gif")
+    with pytest.raises(ValueError):
+        attachments.tiff_options("lzw", 5)
+
+
+def test_attachmentwriter(tmp_path):
+    images = [makeimage(i) for i in range(6)]
+    with attachments.AttachmentWriter(workers=3) as writer:
+        for i, img in enumerate(images):
+            writer.submit(tmp_path.joinpath(str(i) + ".tif"), img, resolution=400)
+
+    assert writer.count == 6
+    assert writer.raw_bytes == sum(img.nbytes for img in images)
+    assert "wrote 6 files" in writer.report()
+
+    # Same files as writing them directly
+    imsave(str(tmp_path.joinpath("direct.tif")), images[0], check_contrast=False, plugin='pil',
+           compression="tiff_lzw", resolution_unit=2, resolution=400)
+    assert tmp_path.joinpath("0.tif").read_bytes() == tmp_path.joinpath("direct.tif").read_bytes()
+    for i, img in enumerate(images):
+        assert np.array_equal(imread(str(tmp_path.joinpath(str(i) + ".tif")), plugin='pil'), img)
+
+
+def test_attachmentwriter_budget(tmp_path):
+    img = makeimage()
+    writer = attachments.AttachmentWriter(workers=2, max_bytes=img.nbytes)
+    inflight = []
+    for i in range(5):
+        writer.submit(tmp_path.joinpath(str(i) + ".tif"), img, resolution=400)
+        inflight.append(writer._inflight)
+    writer.close()
+    assert max(inflight) <= img.nbytes
+    assert writer._inflight == 0
+
+
+def test_attachmentwriter_after_written(tmp_path):
+    written = []
+
+    def check(name):
+        assert tmp_path.joinpath(name).exists()
+        written.append(name)
+
+    with attachments.AttachmentWriter(workers=2) as writer:
+        for i in range(4):
+            writer.submit(tmp_path.joinpath(str(i) + ".tif"), makeimage(i), resolution=400)
+            writer.after_written(check, str(i) + ".tif")
+
+    # Callbacks run in order once their images are written
+    assert written == ["0.tif", "1.tif", "2.tif", "3.tif"]
+
+
+def test_attachmentwriter_exception(tmp_path):
+    called = []
+    writer = attachments.AttachmentWriter(workers=1)
+    with pytest.raises(FileNotFoundError):
+        writer.submit(tmp_path.joinpath("missing", "0.tif"), makeimage(), resolution=400)
+        writer.after_written(called.append, "unit")
+        writer.close()
+    writer.close()
+    assert called == []
@@ -0,0 +1,70 @@
+#  Copyright (c) 2026  Natural History Museum of Denmark (NHMD)
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import pytest
+import sys
+import numpy as np
+import PIL.Image
+
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent.joinpath('src')))
+
+from labelreader.util import debugimages
+
+TESTDATAPATH = Path(__file__).parent
+
+
+def test_downscale():
+    img = np.zeros((3000, 1500), dtype=bool)
+    assert debugimages.downscale(img, 1024).shape == (1000, 500)
+    assert debugimages.downscale(img, 4000).shape == (3000, 1500)
+
+
+def test_to_ubyte():
+    mask = np.array([[True, False]])
+    assert np.array_equal(debugimages.to_ubyte(mask), [[255, 0]])
+    labels = np.array([[0, 1], [2, 2]])
+    rgb = debugimages.to_ubyte(labels)
+    assert rgb.shape == (2, 2, 3) and rgb.dtype == np.uint8
+    assert np.array_equal(rgb[0, 0], [0, 0, 0])
+    assert np.array_equal(rgb[1, 0], rgb[1, 1])
+    assert not np.array_equal(rgb[0, 1], rgb[1, 0])
+    assert np.array_equal(debugimages.to_ubyte(np.array([[-1.0, 0.5, 2.0]])), [[0, 128, 255]])
+    # 8 bit masks, e.g. segMask and lineMask of spidercardreader, also become black and white
+    mask = np.array([[1, 0]], dtype=np.uint8)
+    assert np.array_equal(debugimages.to_ubyte(mask), [[255, 0]])
+    img = np.array([[0, 128, 255]], dtype=np.uint8)
+    assert np.array_equal(debugimages.to_ubyte(img), img)
+
+
+def test_debugimages(tmp_path):
+    debug = debugimages.DebugImages(tmp_path.joinpath("debug"), every=2, max_size=100)
+    assert [debug.select() for i in range(5)] == [True, False, True, False, True]
+
+    img = np.random.default_rng(0).integers(0, 256, size=(400, 200, 3), dtype=np.uint8)
+    label_img = np.zeros((400, 200), dtype=int)
+    label_img[100:200, 50:150] = 1
+    filepath = debug.save("sheet", "image", img)
+    assert filepath == tmp_path.joinpath("debug", "sheet_image.png")
+    with PIL.Image.open(filepath) as written:
+        assert written.size == (50, 100)
+    debug.overlay("sheet", "overlay", img, label_img)
+    with PIL.Image.open(tmp_path.joinpath("debug", "sheet_overlay.png")) as written:
+        assert written.size == (50, 100)
+        assert written.mode == "RGB"
+    assert debug.count == 2
+
+    with pytest.raises(ValueError):
+        debugimages.DebugImages(tmp_path, every=0)
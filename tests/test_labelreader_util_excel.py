@@ -0,0 +1,87 @@
+#  Copyright (c) 2026  Natural History Museum of Denmark (NHMD)
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import pytest
+import sys
+import numpy as np
+import openpyxl
+import pandas as pd
+
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent.joinpath('src')))
+
+from labelreader.util import excel
+
+TESTDATAPATH = Path(__file__).parent
+
+
+def readcells(excelpath):
+    """Read the values of all cells in the first sheet of an Excel file"""
+    sheet = openpyxl.load_workbook(excelpath).active
+    cells = []
+    for row in sheet.iter_rows():
+        for cell in row:
+            cells.append((cell.coordinate, cell.value))
+    return sheet.title, cells
+
+
+def readstyle(cell):
+    """Read the style of a cell"""
+    return (cell.font.b, cell.border.left.style, cell.border.right.style, cell.border.top.style,
+            cell.border.bottom.style, cell.alignment.horizontal, cell.alignment.vertical)
+
+
+def test_write_excel_like_pandas(tmp_path):
+    df = pd.DataFrame({
+        "Alt Cat Number": ["100001", "", "100003"],
+        "Publish": [1.0, np.nan, 1.0],
+        "Count": [np.int64(2), np.int64(0), np.int64(7)],
+        "OCR": [True, False, True],
+        "Locality": ["D, Hillerød", np.nan, "Ø, Tåsinge\nnext line"]
+    })
+    df.to_excel(str(tmp_path.joinpath("pandas.xlsx")), index=False)
+
+    excel.write_excel(tmp_path.joinpath("stream.xlsx"), df.to_dict(orient="records"), df.columns)
+
+    assert readcells(tmp_path.joinpath("stream.xlsx")) == readcells(tmp_path.joinpath("pandas.xlsx"))
+
+
+def test_write_excel_columns(tmp_path):
+    # Only the given columns are written and missing keys give empty cells
+    records = iter([{"A": "x", "B": 1}, {"A": "y", "C": "ignored"}])
+    excel.write_excel(tmp_path.joinpath("stream.xlsx"), records, ["A", "B"])
+
+    df = pd.read_excel(tmp_path.joinpath("stream.xlsx"))
+    assert list(df.columns) == ["A", "B"]
+    assert list(df["A"]) == ["x", "y"]
+    assert df["B"][0] == 1
+    assert np.isnan(df["B"][1])
+
+
+def test_write_excel_empty(tmp_path):
+    excel.write_excel(tmp_path.joinpath("stream.xlsx"), [], ["A", "B"])
+    pd.DataFrame({"A": [], "B": []}).to_excel(str(tmp_path.joinpath("pandas.xlsx")), index=False)
+
+    assert readcells(tmp_path.joinpath("stream.xlsx")) == readcells(tmp_path.joinpath("pandas.xlsx"))
+
+
+def test_write_excel_header_style(tmp_path):
+    excel.write_excel(tmp_path.joinpath("stream.xlsx"), [{"A": "x", "B": 1}], ["A", "B"])
+
+    sheet = openpyxl.load_workbook(tmp_path.joinpath("stream.xlsx")).active
+    for cell in sheet[1]:
+        assert readstyle(cell) == (True, "thin", "thin", "thin", "thin", "center", "top")
+    for cell in sheet[2]:
+        assert readstyle(cell) == (False, None, None, None, None, None, None)
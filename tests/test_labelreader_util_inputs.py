@@ -0,0 +1,116 @@
+#  Copyright (c) 2026  Natural History Museum of Denmark (NHMD)
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import pytest
+import sys
+import glob
+
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent.joinpath('src')))
+
+from labelreader.util import inputs
+
+TESTDATAPATH = Path(__file__).parent
+
+
+def maketestfiles(path):
+    """Create a directory tree with a few empty image and text files"""
+    for name in ["b_0002.jpg", "a_0001.jpg", "notes.txt", "sub/c_0003.tif", "sub/d.pdf"]:
+        filepath = path.joinpath(name)
+        filepath.parent.mkdir(parents=True, exist_ok=True)
+        filepath.touch()
+
+
+def test_hasglobpattern():
+    assert inputs.hasglobpattern("*.jpg")
+    assert inputs.hasglobpattern("image_000?.jpg")
+    assert inputs.hasglobpattern("image_[0-9].jpg")
+    assert not inputs.hasglobpattern("image_0001.jpg")
+
+
+def test_iterinputs(tmp_path):
+    maketestfiles(tmp_path)
+
+    # Directories are searched recursively and sorted
+    files = list(inputs.iterinputs([str(tmp_path)]))
+    assert [Path(f).name for f in files] == ["a_0001.jpg", "b_0002.jpg", "c_0003.tif", "d.pdf"]
+
+    # Glob patterns are sorted
+    files = list(inputs.iterinputs([str(tmp_path.joinpath("*.jpg"))]))
+    assert [Path(f).name for f in files] == ["a_0001.jpg", "b_0002.jpg"]
+
+    # Suffix filter
+    files = list(inputs.iterinputs([str(tmp_path)], suffixes=[".pdf"]))
+    assert [Path(f).name for f in files] == ["d.pdf"]
+
+    # Explicit file names are passed through in the given order
+    files = list(inputs.iterinputs(["z.jpg", str(tmp_path.joinpath("notes.txt"))]))
+    assert files == ["z.jpg", str(tmp_path.joinpath("notes.txt"))]
+
+
+def test_natsortkey():
+    names = ["scan_10.jpg", "scan_2.jpg", "scan_1.jpg", "scan_01.jpg", "Scan_3.jpg", "scan.jpg"]
+    assert sorted(names, key=inputs.natsortkey) == ["Scan_3.jpg", "scan.jpg", "scan_01.jpg", "scan_1.jpg",
+                                                    "scan_2.jpg", "scan_10.jpg"]
+
+
+def test_iterinputs_natural_order(tmp_path):
+    # Scans numbered without leading zeros keep the scanning order, e.g. front and back side scans
+    for i in [1, 2, 9, 10, 11]:
+        tmp_path.joinpath("sheet_" + str(i) + ".jpg").touch()
+    files = list(inputs.iterinputs([str(tmp_path)]))
+    assert [Path(f).name for f in files] == ["sheet_1.jpg", "sheet_2.jpg", "sheet_9.jpg", "sheet_10.jpg",
+                                             "sheet_11.jpg"]
+
+    files = list(inputs.iterinputs([str(tmp_path.joinpath("sheet_?.jpg")), str(tmp_path.joinpath("sheet_1*.jpg"))]))
+    assert [Path(f).name for f in files] == ["sheet_1.jpg", "sheet_2.jpg", "sheet_9.jpg", "sheet_1.jpg",
+                                             "sheet_10.jpg", "sheet_11.jpg"]
+
+
+def test_iterglob(tmp_path):
+    maketestfiles(tmp_path)
+    tmp_path.joinpath("sub", "deeper").mkdir()
+    tmp_path.joinpath("sub", "deeper", "e_0004.jpg").touch()
+    tmp_path.joinpath(".hidden.jpg").touch()
+
+    # Same files as glob
+    for pattern in ["*.jpg", "**/*.jpg", "**", "s*/*", "sub/**/*.jpg", "*/d.pdf", "[ab]_*.jpg", "nothere/*.jpg"]:
+        files = list(inputs.iterglob(str(tmp_path.joinpath(pattern))))
+        assert sorted(files) == sorted(f for f in glob.glob(str(tmp_path.joinpath(pattern)), recursive=True)
+                                       if Path(f).is_file())
+
+    files = list(inputs.iterglob(str(tmp_path.joinpath("**", "*.jpg"))))
+    assert [Path(f).name for f in files] == ["a_0001.jpg", "b_0002.jpg", "e_0004.jpg"]
+
+
+def test_iterinputs_filelist(tmp_path):
+    maketestfiles(tmp_path)
+    listpath = tmp_path.joinpath("files.txt")
+    listpath.write_text("# Scans of the first box\nb_0002.jpg\n\nsub\n" + str(tmp_path.joinpath("a_*.jpg")) + "\n")
+
+    files = list(inputs.iterinputs(["@" + str(listpath)]))
+    assert files == [str(tmp_path.joinpath("b_0002.jpg")), str(tmp_path.joinpath("sub", "c_0003.tif")),
+                     str(tmp_path.joinpath("sub", "d.pdf")), str(tmp_path.joinpath("a_0001.jpg"))]
+
+
+def test_iterinputs_lazy(tmp_path):
+    maketestfiles(tmp_path)
+
+    def items():
+        yield str(tmp_path)
+        raise AssertionError("Items must be consumed lazily")
+
+    files = inputs.iterinputs(items())
+    assert Path(next(files)).name == "a_0001.jpg"
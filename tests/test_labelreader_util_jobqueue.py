@@ -0,0 +1,149 @@
+#  Copyright (c) 2026  Natural History Museum of Denmark (NHMD)
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import pytest
+import sys
+import time
+
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent.joinpath('src')))
+
+from labelreader.util import jobqueue
+from labelreader.util.sink import RecordSink
+
+TESTDATAPATH = Path(__file__).parent
+
+
+def process(worker, unit, sink):
+    """Append one row per input file of a unit to the shard of the worker and record the unit"""
+    for filepath in unit["inputs"]:
+        sink.append({"Input": filepath, "Worker": worker.name})
+    worker.record([(filepath, "") for filepath in unit["inputs"]], len(unit["inputs"]))
+
+
+def test_jobqueue_lease(tmp_path):
+    queue = jobqueue.JobQueue(tmp_path.joinpath("jobs.sqlite"), lease_seconds=0.2, max_attempts=2)
+    assert queue.add([["a.jpg", "b.jpg"], ["c.jpg"]]) == 2
+    assert queue.add([["a.jpg", "b.jpg"], ["c.jpg"]]) == 0  # Adding the same units again is ignored
+
+    assert queue.lease("w1") == {"seq": 0, "inputs": ["a.jpg", "b.jpg"]}
+    assert queue.lease("w2") == {"seq": 1, "inputs": ["c.jpg"]}
+    assert queue.lease("w3") is None
+    assert queue.leased_by_others("w1") == 1
+
+    # Only the worker holding the lease can complete the unit
+    assert not queue.complete(0, "w2")
+    assert queue.complete(0, "w1", "shards/w1.jsonl", 0, 2)
+
+    # An expired lease is given to another worker and the first worker can no longer complete the unit
+    time.sleep(0.3)
+    assert queue.lease("w3") == {"seq": 1, "inputs": ["c.jpg"]}
+    assert not queue.complete(1, "w2")
+    assert not queue.finished()
+
+    # After too many attempts the unit is given up
+    time.sleep(0.3)
+    assert queue.lease("w1") is None
+    assert queue.counts() == {"pending": 0, "leased": 0, "done": 1, "failed": 1}
+    assert queue.finished()
+    queue.close()
+
+
+def test_jobqueue_fail(tmp_path):
+    queue = jobqueue.JobQueue(tmp_path.joinpath("jobs.sqlite"), max_attempts=2)
+    queue.add([["a.jpg"]])
+    queue.lease("w1")
+    queue.fail(0, "w1", "error")
+    assert queue.counts()["pending"] == 1
+    queue.lease("w1")
+    queue.fail(0, "w1", "error")
+    assert queue.counts()["failed"] == 1
+    queue.close()
+
+
+def test_queueworker_merge(tmp_path):
+    queue = jobqueue.JobQueue(tmp_path.joinpath("jobs.sqlite"))
+    units = [["a.jpg", "b.jpg"], ["c.jpg"], ["d.jpg", "e.jpg"], ["f.jpg"]]
+    queue.add(units)
+
+    # Two workers take turns, so the shards hold the units out of order
+    workers = [jobqueue.QueueWorker(queue, name="w" + str(i), poll_seconds=0.01) for i in range(2)]
+    sinks = [RecordSink(worker.shardpath) for worker in workers]
+    leases = [worker.leases() for worker in workers]
+    for i in [1, 0, 0, 1]:
+        process(workers[i], next(leases[i]), sinks[i])
+    for i in range(2):
+        assert list(leases[i]) == []
+        sinks[i].close()
+
+    assert queue.finished()
+    assert queue.claim_merge("w0")
+    assert not queue.claim_merge("w1")
+
+    rows = list(jobqueue.merge_shards(queue))
+    assert [row["Input"] for row in rows] == ["a.jpg", "b.jpg", "c.jpg", "d.jpg", "e.jpg", "f.jpg"]
+    assert [row["Worker"] for row in rows] == ["w1", "w1", "w0", "w0", "w0", "w1"]
+    queue.close()
+
+
+def test_queueworker_expired(tmp_path):
+    # Rows of a unit processed again after its lease expired are merged once
+    queue = jobqueue.JobQueue(tmp_path.joinpath("jobs.sqlite"), lease_seconds=0.2)
+    queue.add([["a.jpg"], ["b.jpg"]])
+    slow = jobqueue.QueueWorker(queue, name="slow", poll_seconds=0.01)
+    fast = jobqueue.QueueWorker(queue, name="fast", poll_seconds=0.01)
+    slow_sink, fast_sink = RecordSink(slow.shardpath), RecordSink(fast.shardpath)
+
+    slow_unit = next(slow.leases())
+    time.sleep(0.3)
+    for unit in fast.leases():
+        process(fast, unit, fast_sink)
+    process(slow, slow_unit, slow_sink)  # Too late
+    slow_sink.close()
+    fast_sink.close()
+
+    rows = list(jobqueue.merge_shards(queue))
+    assert [(row["Input"], row["Worker"]) for row in rows] == [("a.jpg", "fast"), ("b.jpg", "fast")]
+    queue.close()
+
+
+def test_queueworker_fail(tmp_path):
+    # A unit that raises is given back to the queue and the worker continues with the other units
+    queue = jobqueue.JobQueue(tmp_path.joinpath("jobs.sqlite"), max_attempts=2)
+    queue.add([["a.jpg"], ["b.jpg"], ["c.jpg"]])
+    worker = jobqueue.QueueWorker(queue, name="w0", poll_seconds=0.01)
+    sink = RecordSink(worker.shardpath)
+    attachment = tmp_path.joinpath("b.tif")
+
+    attempts = 0
+    for unit in worker.leases():
+        try:
+            if unit["inputs"] == ["b.jpg"]:
+                attempts += 1
+                attachment.touch()
+                sink.append({"Input": "b.jpg", "Worker": worker.name})  # A row written before the error
+                raise ValueError("corrupt image")
+            process(worker, unit, sink)
+        except ValueError as e:
+            worker.fail([(filepath, "") for filepath in unit["inputs"]], 1, repr(e), [attachment])
+    sink.close()
+
+    assert attempts == 2
+    assert worker.failed == 2
+    assert not attachment.exists()
+    assert queue.counts() == {"pending": 0, "leased": 0, "done": 2, "failed": 1}
+    rows = list(jobqueue.merge_shards(queue))
+    assert [row["Input"] for row in rows] == ["a.jpg", "c.jpg"]
+    queue.close()
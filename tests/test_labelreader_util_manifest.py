@@ -0,0 +1,89 @@
+#  Copyright (c) 2026  Natural History Museum of Denmark (NHMD)
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import pytest
+import sys
+import hashlib
+
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent.joinpath('src')))
+
+from labelreader.util import manifest
+from labelreader.util import sink
+
+TESTDATAPATH = Path(__file__).parent
+
+
+def makeinputs(tmp_path, count=3):
+    """Create a number of small input files"""
+    filepaths = []
+    for i in range(count):
+        filepath = tmp_path.joinpath("sheet" + str(i) + ".jpg")
+        filepath.write_bytes(b"image" + bytes([i]))
+        filepaths.append(str(filepath))
+    return filepaths
+
+
+def test_filehash(tmp_path):
+    filepath = tmp_path.joinpath("sheet.jpg")
+    filepath.write_bytes(b"x" * 100)
+    assert manifest.filehash(filepath, chunksize=7) == hashlib.sha256(b"x" * 100).hexdigest()
+
+
+def test_runmanifest_resume(tmp_path):
+    filepaths = makeinputs(tmp_path)
+    manifestpath = tmp_path.joinpath("run.manifest.jsonl")
+
+    with manifest.RunManifest(manifestpath) as run:
+        # A front and back image pair is one unit
+        run.record([(filepaths[0], manifest.filehash(filepaths[0])),
+                    (filepaths[1], manifest.filehash(filepaths[1]))], rows=9, attachments=["100001.tif"])
+        run.record([(filepaths[2], manifest.filehash(filepaths[2]))], rows=0, attachments=["100002.tif"],
+                   status="partial")
+
+    run = manifest.RunManifest(manifestpath, resume=True)
+    assert run.rows == 9
+    assert run.units == 1
+    assert run.iscompleted(filepaths[0])
+    assert not run.iscompleted(filepaths[2])
+    assert list(run.pending(filepaths)) == [filepaths[2]]
+    assert run.skipped == 2
+    assert run.leftover_attachments() == {"100002.tif"}
+    run.close()
+
+    # A changed input file is processed again
+    Path(filepaths[1]).write_bytes(b"rescanned")
+    run = manifest.RunManifest(manifestpath, resume=True)
+    assert list(run.pending(filepaths)) == filepaths[1:]
+    run.close()
+
+    # Without resume the manifest starts over
+    run = manifest.RunManifest(manifestpath)
+    assert list(run.pending(filepaths)) == filepaths
+    run.close()
+    assert list(sink.read_records(manifestpath)) == []
+
+
+def test_recordsink_keep(tmp_path):
+    # Records appended after the last completed unit are removed when resuming
+    filepath = tmp_path.joinpath("records.jsonl")
+    with sink.RecordSink(filepath) as records:
+        for i in range(5):
+            records.append({"A": i})
+
+    with sink.RecordSink(filepath, append=True, keep=3) as records:
+        records.append({"A": 10})
+
+    assert [record["A"] for record in sink.read_records(filepath)] == [0, 1, 2, 10]
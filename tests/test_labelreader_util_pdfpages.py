@@ -0,0 +1,85 @@
+#  Copyright (c) 2026  Natural History Museum of Denmark (NHMD)
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import pytest
+import sys
+import numpy as np
+
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent.joinpath('src')))
+
+from labelreader.util import pdfpages
+
+TESTDATAPATH = Path(__file__).parent
+
+
+def is_wand_installed():
+    # Importing wand.image fails if the ImageMagick library is not installed
+    try:
+        import wand.image
+        return True
+    except ImportError:
+        return False
+
+
+def test_channelmap():
+    assert pdfpages.channelmap("srgb", False) == "RGB"
+    assert pdfpages.channelmap("srgb", True) == "RGBA"
+    assert pdfpages.channelmap("gray", False) == "R"
+    assert pdfpages.channelmap("cmyk", False) == "CMYK"
+
+
+def fake_renderpage(filename, index, resolution, out=None):
+    if out is None:
+        out = np.empty((4, 3, 3), dtype=np.uint8)
+    out[:] = index
+    return out
+
+
+def test_iterpages(monkeypatch):
+    monkeypatch.setattr(pdfpages, "renderpage", fake_renderpage)
+    monkeypatch.setattr(pdfpages, "pagecount", lambda filename: 5)
+
+    pages = list(pdfpages.iterpages("cards.pdf", 600, reuse=False))
+    assert [no_page for no_page, _ in pages] == [1, 2, 3, 4, 5]
+    assert [int(img[0, 0, 0]) for _, img in pages] == [0, 1, 2, 3, 4]
+
+    # The same array is overwritten by the next page
+    buffers = set()
+    for no_page, img in pdfpages.iterpages("cards.pdf", 600, first=2, last=4):
+        assert int(img[0, 0, 0]) == no_page - 1
+        buffers.add(id(img))
+    assert len(buffers) == 1
+
+
+@pytest.mark.skipif(not is_wand_installed(), reason="wand is not installed")
+def test_renderpage(tmp_path):
+    from wand.image import Image
+    from wand.color import Color
+
+    filename = str(tmp_path.joinpath("pages.pdf"))
+    with Image() as pdf:
+        for color in ["white", "black", "red"]:
+            with Image(width=40, height=30, background=Color(color)) as page:
+                pdf.sequence.append(page)
+        pdf.save(filename=filename)
+
+    assert pdfpages.pagecount(filename) == 3
+    with Image(filename=filename, resolution=72) as img_wand_all:
+        expected = [np.array(img_wand) for img_wand in img_wand_all.sequence]
+    pages = list(pdfpages.iterpages(filename, 72, reuse=False))
+    assert len(pages) == 3
+    for (_, img), expected_img in zip(pages, expected):
+        assert np.array_equal(img, expected_img)
@@ -0,0 +1,132 @@
+#  Copyright (c) 2026  Natural History Museum of Denmark (NHMD)
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import pytest
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent.joinpath('src')))
+
+from labelreader.util import pipeline
+
+TESTDATAPATH = Path(__file__).parent
+
+
+def test_prefetch_order():
+    # Results come in input order even if the items take different time to process
+    def slow_square(x):
+        time.sleep(0.01 * (x % 3))
+        return x * x
+
+    assert list(pipeline.prefetch(range(10), slow_square, maxsize=2)) == [x * x for x in range(10)]
+    assert list(pipeline.prefetch([], slow_square)) == []
+
+
+def test_prefetch_bounded():
+    # The producer never gets more than maxsize results ahead of the consumer
+    produced = []
+
+    def record(x):
+        produced.append(x)
+        return x
+
+    for x in pipeline.prefetch(range(20), record, maxsize=2):
+        time.sleep(0.01)
+        # maxsize results in the queue plus one waiting to be put
+        assert len(produced) <= x + 1 + 2 + 1
+
+
+def test_prefetch_exception():
+    def fail_on_three(x):
+        if x == 3:
+            raise ValueError("three")
+        return x
+
+    results = []
+    with pytest.raises(ValueError):
+        for x in pipeline.prefetch(range(10), fail_on_three):
+            results.append(x)
+    assert results == [0, 1, 2]
+
+
+def test_prefetch_stop_early():
+    # Stopping the consumer early also stops the background thread
+    threads_before = threading.active_count()
+    for x in pipeline.prefetch(range(1000), lambda x: x, maxsize=1):
+        if x == 5:
+            break
+    assert threading.active_count() == threads_before
+
+
+def test_ordered_map():
+    def slow_square(x):
+        time.sleep(0.01 * (x % 3))
+        return x * x
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        assert list(pipeline.ordered_map(executor, slow_square, range(10), maxsize=3)) == \
+            [(x, x * x) for x in range(10)]
+
+        # Items are submitted lazily
+        submitted = []
+
+        def items():
+            for x in range(100):
+                submitted.append(x)
+                yield x
+
+        results = pipeline.ordered_map(executor, slow_square, items(), maxsize=3)
+        assert next(results) == (0, 0)
+        assert len(submitted) == 3
+
+
+def test_ordered_map_close():
+    finished = []
+
+    def slow_identity(x):
+        time.sleep(0.1)
+        finished.append(x)
+        return x
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        results = pipeline.ordered_map(executor, slow_identity, range(10), maxsize=4)
+        assert next(results) == (0, 0)
+        # Closing the iterator cancels the items not started and waits for the running ones
+        results.close()
+        count = len(finished)
+        assert 1 in finished
+        time.sleep(0.3)
+        assert len(finished) == count < 10
+
+
+def test_backgroundworker():
+    results = []
+    with pipeline.BackgroundWorker(maxsize=2) as worker:
+        for x in range(10):
+            worker.submit(results.append, x)
+    assert results == list(range(10))
+
+
+def test_backgroundworker_exception():
+    def fail():
+        raise IOError("disk full")
+
+    worker = pipeline.BackgroundWorker()
+    worker.submit(fail)
+    with pytest.raises(IOError):
+        worker.close()
@@ -0,0 +1,56 @@
+#  Copyright (c) 2026  Natural History Museum of Denmark (NHMD)
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import pytest
+import sys
+import numpy as np
+import pandas as pd
+
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent.joinpath('src')))
+
+from labelreader.util import records
+
+TESTDATAPATH = Path(__file__).parent
+
+
+def test_recordcollector():
+    collector = records.RecordCollector(["Alt Cat Number", "Publish"])
+    collector.append({"Alt Cat Number": "100001", "Publish": 1})
+    collector.append(None)  # Ignored
+    collector.extend([{"Alt Cat Number": "100002", "Publish": 1, "Notes_back": "note"}])
+    assert len(collector) == 2
+
+    df = collector.to_dataframe()
+    assert list(df.columns) == ["Alt Cat Number", "Publish", "Notes_back"]
+    assert list(df["Alt Cat Number"]) == ["100001", "100002"]
+    assert df["Publish"].dtype == np.int64
+    assert pd.isna(df["Notes_back"][0])
+
+    # Same content as growing a data frame with pd.concat
+    table = pd.DataFrame({"Alt Cat Number": [], "Publish": []})
+    for record in collector:
+        table = pd.concat([table, pd.DataFrame({key: [value] for key, value in record.items()})],
+                          axis=0, ignore_index=True)
+    assert list(table.columns) == list(df.columns)
+    assert list(table["Alt Cat Number"]) == list(df["Alt Cat Number"])
+    assert list(table["Publish"]) == list(df["Publish"])
+    assert list(table["Notes_back"].isna()) == list(df["Notes_back"].isna())
+
+
+def test_recordcollector_empty():
+    df = records.RecordCollector(["A", "B"]).to_dataframe()
+    assert list(df.columns) == ["A", "B"]
+    assert len(df) == 0
@@ -0,0 +1,80 @@
+#  Copyright (c) 2026  Natural History Museum of Denmark (NHMD)
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import pytest
+import sys
+import numpy as np
+import pandas as pd
+
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent.joinpath('src')))
+
+from labelreader.util import sink
+
+TESTDATAPATH = Path(__file__).parent
+
+
+def test_recordsink(tmp_path):
+    filepath = tmp_path.joinpath("records.jsonl")
+    with sink.RecordSink(filepath, columns=["A", "B"]) as records:
+        records.append({"A": "x", "B": np.int64(1)})
+        records.append_dataframe(pd.DataFrame({"A": ["y", "z"], "C": [np.nan, 2.5]}))
+        assert records.count == 3
+
+        # Records are on disk before the sink is closed
+        assert len(list(sink.read_records(filepath))) == 3
+
+    df = records.to_dataframe()
+    assert list(df.columns) == ["A", "B", "C"]
+    assert list(df["A"]) == ["x", "y", "z"]
+    assert df["B"][0] == 1
+    assert np.isnan(df["C"][1])
+    assert df["C"][2] == 2.5
+
+
+def test_recordsink_empty(tmp_path):
+    records = sink.RecordSink(tmp_path.joinpath("records.jsonl"), columns=["A", "B"])
+    records.close()
+    df = records.to_dataframe()
+    assert list(df.columns) == ["A", "B"]
+    assert len(df) == 0
+
+
+def test_read_records_incomplete(tmp_path):
+    # A crash can leave an incomplete last line, which is skipped
+    filepath = tmp_path.joinpath("records.jsonl")
+    filepath.write_text('{"A": "x"}\n{"A": "y"}\n{"A": ', encoding="utf-8")
+    assert list(sink.read_records(filepath)) == [{"A": "x"}, {"A": "y"}]
+
+    # Appending continues the file
+    with sink.RecordSink(filepath, append=True) as records:
+        records.append({"A": "z"})
+    assert [record["A"] for record in sink.read_records(filepath)] == ["x", "y", "z"]
+
+
+def test_recordsink_to_excel_transform(tmp_path):
+    records = sink.RecordSink(tmp_path.joinpath("records.jsonl"), columns=["A", "B"])
+    records.append({"A": "x", "B": None})
+    records.close()
+
+    def fill(record):
+        record["B"] = record["A"].upper()
+        return record
+
+    records.to_excel(tmp_path.joinpath("records.xlsx"), transform=fill)
+    df = pd.read_excel(tmp_path.joinpath("records.xlsx"))
+    assert list(df["B"]) == ["X"]
+    # The records on disk are not changed
+    assert list(sink.read_records(records.filepath)) == [{"A": "x", "B": None}]
@@ -0,0 +1,72 @@
+#  Copyright (c) 2026  Natural History Museum of Denmark (NHMD)
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import pytest
+import signal
+import sys
+import threading
+import time
+
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent.joinpath('src')))
+
+from labelreader.util import timelimit
+
+TESTDATAPATH = Path(__file__).parent
+
+requires_timer = pytest.mark.skipif(not timelimit.supported(), reason="timer signals are not supported")
+
+
+@requires_timer
+def test_time_limit_exceeded():
+    handler = signal.getsignal(signal.SIGALRM)
+    start = time.perf_counter()
+    with pytest.raises(timelimit.TimeLimitExceeded):
+        with timelimit.time_limit(0.1):
+            while True:
+                pass
+    assert time.perf_counter() - start < 5
+    assert signal.getsignal(signal.SIGALRM) == handler
+
+
+@requires_timer
+def test_time_limit_not_exceeded():
+    with timelimit.time_limit(5):
+        result = sum(range(1000))
+    assert result == 499500
+    # The timer is stopped when the block ends
+    assert signal.getitimer(signal.ITIMER_REAL) == (0.0, 0.0)
+
+
+@pytest.mark.parametrize("seconds", [None, 0, -1])
+def test_no_time_limit(seconds):
+    with timelimit.time_limit(seconds):
+        time.sleep(0.01)
+
+
+def test_time_limit_in_thread():
+    # Timer signals can not be handled outside the main thread, so the block runs without a limit
+    results = []
+
+    def run():
+        results.append(timelimit.supported())
+        with timelimit.time_limit(0.01):
+            time.sleep(0.05)
+        results.append("done")
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    thread.join()
+    assert results == [False, "done"]
@@ -15,6 +15,7 @@
 
 import pytest
 import sys
+import threading
 
 from pathlib import Path
 sys.path.append(str(Path(__file__).parent.parent.joinpath('src')))
@@ -24,7 +25,96 @@ from labelreader.util import util
 TESTDATAPATH = Path(__file__).parent
 
 
-# TODO: Missing tests for checkfilepath
+def test_checkfilepath(tmp_path):
+    assert util.checkfilepath(tmp_path.joinpath("label.tif")) == tmp_path.joinpath("label.tif")
+    tmp_path.joinpath("label.tif").touch()
+    assert util.checkfilepath(tmp_path.joinpath("label.tif")) == tmp_path.joinpath("label.2.tif")
+    tmp_path.joinpath("label.2.tif").touch()
+    assert util.checkfilepath(tmp_path.joinpath("label.tif")) == tmp_path.joinpath("label.3.tif")
+    tmp_path.joinpath("label.3.tif").touch()
+    assert util.checkfilepath(tmp_path.joinpath("label.tif")) == tmp_path.joinpath("label.4.tif")
+
+    # Names with dots
+    tmp_path.joinpath("a.b.tif").touch()
+    tmp_path.joinpath("a.b.2.tif").touch()
+    assert util.checkfilepath(tmp_path.joinpath("a.b.tif")) == tmp_path.joinpath("a.b.3.tif")
+
+
+def test_checkfilepath_reserved(tmp_path):
+    # Reserved paths are treated as existing files
+    reserved = set()
+    first = util.checkfilepath(tmp_path.joinpath("label.tif"), reserved=reserved)
+    second = util.checkfilepath(tmp_path.joinpath("label.tif"), reserved=reserved)
+    assert first == tmp_path.joinpath("label.tif")
+    assert second == tmp_path.joinpath("label.2.tif")
+    assert reserved == {first, second}
+
+
+def test_checkfilepath_overwrite(tmp_path):
+    # A left over file may be overwritten once
+    tmp_path.joinpath("label.tif").touch()
+    overwrite = {tmp_path.joinpath("label.tif")}
+    first = util.checkfilepath(tmp_path.joinpath("label.tif"), overwrite=overwrite)
+    assert first == tmp_path.joinpath("label.tif")
+    assert overwrite == set()
+    second = util.checkfilepath(tmp_path.joinpath("label.tif"), overwrite=overwrite)
+    assert second == tmp_path.joinpath("label.2.tif")
+
+
+def test_filenameallocator(tmp_path):
+    # Same names as checkfilepath, also with gaps and names with dots
+    for name in ["label.tif", "label.3.tif", "a.b.tif", "other.jpg"]:
+        tmp_path.joinpath(name).touch()
+    allocator = util.FilenameAllocator()
+    for name in ["label.tif", "label.tif", "label.tif", "a.b.tif", "a.b.tif", "new.tif", "other.tif"]:
+        expected = util.checkfilepath(tmp_path.joinpath(name))
+        allocated = allocator.allocate(tmp_path.joinpath(name))
+        assert allocated == expected
+        expected.touch()
+
+    # Names in other directories are indexed separately
+    tmp_path.joinpath("sub").mkdir()
+    assert allocator.allocate(tmp_path.joinpath("sub", "label.tif")) == tmp_path.joinpath("sub", "label.tif")
+
+
+def test_filenameallocator_overwrite(tmp_path):
+    tmp_path.joinpath("label.tif").touch()
+    allocator = util.FilenameAllocator(overwrite=[tmp_path.joinpath("label.tif")])
+    assert allocator.allocate(tmp_path.joinpath("label.tif")) == tmp_path.joinpath("label.tif")
+    assert allocator.allocate(tmp_path.joinpath("label.tif")) == tmp_path.joinpath("label.2.tif")
+
+
+def test_filenameallocator_exclusive(tmp_path):
+    allocator = util.FilenameAllocator(exclusive=True)
+    assert allocator.allocate(tmp_path.joinpath("label.tif")) == tmp_path.joinpath("label.tif")
+    assert tmp_path.joinpath("label.tif").exists()
+
+    # A file created by another process after the directory was read is not allocated
+    tmp_path.joinpath("label.2.tif").touch()
+    assert allocator.allocate(tmp_path.joinpath("label.tif")) == tmp_path.joinpath("label.3.tif")
+
+    # Two allocators sharing an output directory
+    other = util.FilenameAllocator(exclusive=True)
+    assert other.allocate(tmp_path.joinpath("label.tif")) == tmp_path.joinpath("label.4.tif")
+    assert allocator.allocate(tmp_path.joinpath("label.tif")) == tmp_path.joinpath("label.5.tif")
+
+
+def test_filenameallocator_threads(tmp_path):
+    allocator = util.FilenameAllocator()
+    results = []
+
+    def allocate():
+        for i in range(50):
+            results.append(allocator.allocate(tmp_path.joinpath("label.tif")))
+
+    threads = [threading.Thread(target=allocate) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(set(results)) == 400
+    assert set(results) == set(util.numberedname(tmp_path.joinpath("label.tif"), i) for i in range(1, 401))
+
 
 def test_roman2int():
     # Check valid roman numerals
@@ -0,0 +1,65 @@
+#  Copyright (c) 2026  Natural History Museum of Denmark (NHMD)
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import sys
+import numpy as np
+
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent.joinpath('src')))
+
+import spidercardreader
+from labelreader.ocr.triage import BlankTriage
+from labelreader.util.attachments import AttachmentWriter
+from labelreader.util.manifest import RunManifest
+from labelreader.util.util import FilenameAllocator
+
+TESTDATAPATH = Path(__file__).parent
+
+
+class NoOCR:
+    """OCR reader that fails if a label is OCR'ed"""
+
+    def read_image(self, img):
+        raise AssertionError("blank labels must not be OCR'ed")
+
+    def get_text(self):
+        raise AssertionError("blank labels must not be OCR'ed")
+
+
+def test_blank_front_label(tmp_path):
+    img_label = np.full((200, 300), 255, dtype=np.uint8)
+    record = spidercardreader.transcribe_label(img_label, "scan_1.jpg label ID 3", False, NoOCR(), BlankTriage())
+    assert record is not None
+    assert record["Blank label"] == 1
+    assert record["Alt Cat Number"] == ""
+    assert list(record) == list(spidercardreader.empty_dataframe().columns)
+
+    args = {"output": str(tmp_path)}
+    manifest = RunManifest(tmp_path.joinpath("spidercards.manifest.jsonl"))
+    with AttachmentWriter() as writer:
+        outfilename = spidercardreader.attach_label(record, img_label, str(tmp_path.joinpath("scan_1.jpg")), "hash",
+                                                    3, False, args, FilenameAllocator(), manifest, writer)
+    manifest.close()
+    assert outfilename == "scan_1_labelID3.tif"
+    assert record["Attachment"] == outfilename
+    assert record["Original front image"] == "scan_1.jpg"
+    assert tmp_path.joinpath(outfilename).exists()
+
+
+def test_blank_back_label():
+    img_label = np.full((200, 300), 255, dtype=np.uint8)
+    record = spidercardreader.transcribe_label(img_label, "scan_2.jpg label ID 3", True, NoOCR(), BlankTriage())
+    assert record["Blank label_back"] == 1
+    assert list(record) == list(spidercardreader.empty_back_dataframe().columns)
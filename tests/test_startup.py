@@ -0,0 +1,89 @@
+#  Copyright (c) 2026  Natural History Museum of Denmark (NHMD)
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+# Start up time of the reader scripts. The scheduler launches many short jobs, so the slow imports are deferred to
+# the code paths that need them. The budgets are generous compared to the measured times, such that the tests
+# only fail if a slow import is added at the top of a reader again.
+
+import pytest
+import sys
+import json
+import time
+import subprocess
+
+from pathlib import Path
+
+SRCPATH = Path(__file__).parent.parent.joinpath('src')
+TESTDATAPATH = Path(__file__).parent
+
+READERS = ["spidercardreader", "csadcardreader", "butterflyatlasreader", "herbariumcardreader", "ocrreader"]
+
+# Modules that are only imported when they are used, not when a reader starts
+DEFERRED_MODULES = ["scipy.stats", "scipy.optimize", "scipy.linalg", "skimage.transform", "skimage.measure", "pygbif",
+                    "matplotlib", "wand", "openpyxl", "pandas"]
+
+HELP_BUDGET = 2.0  # Seconds for --help
+SMALL_BATCH_BUDGET = 4.0  # Seconds for a run without any input images
+
+
+def run_reader(arguments):
+    """Run a reader script and return the completed process and the elapsed time in seconds"""
+    tic = time.perf_counter()
+    completed = subprocess.run([sys.executable] + arguments, cwd=SRCPATH, capture_output=True, text=True)
+    return completed, time.perf_counter() - tic
+
+
+@pytest.mark.parametrize("reader", READERS)
+def test_help_deferred_imports(reader):
+    code = ("import contextlib, io, json, runpy, sys\n"
+            "sys.argv = ['" + reader + ".py', '--help']\n"
+            "with contextlib.redirect_stdout(io.StringIO()):\n"
+            "    try:\n"
+            "        runpy.run_path('" + reader + ".py', run_name='__main__')\n"
+            "    except SystemExit:\n"
+            "        pass\n"
+            "print(json.dumps(sorted(sys.modules)))\n")
+    completed, elapsed = run_reader(["-c", code])
+    assert completed.returncode == 0, completed.stderr
+    modules = json.loads(completed.stdout)
+    assert [module for module in DEFERRED_MODULES if module in modules] == []
+
+
+@pytest.mark.parametrize("reader", READERS)
+def test_help_startup_time(reader):
+    run_reader([reader + ".py", "--help"])  # Warm up the byte code cache
+    completed, elapsed = run_reader([reader + ".py", "--help"])
+    assert completed.returncode == 0, completed.stderr
+    assert "usage" in completed.stdout
+    assert elapsed < HELP_BUDGET
+
+
+def test_small_batch_startup_time(tmp_path):
+    inputpath = tmp_path.joinpath("input")
+    inputpath.mkdir()
+    outputpath = tmp_path.joinpath("output")
+    outputpath.mkdir()
+
+    completed, elapsed = run_reader(["spidercardreader.py", "-t", "tesseract", "-o", str(outputpath),
+                                     "-i", str(inputpath)])
+    assert completed.returncode == 0, completed.stderr
+    assert outputpath.joinpath("spidercards.xlsx").exists()
+    assert elapsed < SMALL_BATCH_BUDGET
+
+    completed, elapsed = run_reader(["herbariumcardreader.py", "-t", "tesseract", "-o", str(outputpath),
+                                     "-i", str(inputpath)])
+    assert completed.returncode == 0, completed.stderr
+    assert outputpath.joinpath("herbariumsheets.xlsx").exists()
+    assert elapsed < SMALL_BATCH_BUDGET
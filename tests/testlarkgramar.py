@@ -14,29 +14,36 @@
 #
 
 import argparse
+import sys
+from pathlib import Path
 from lark import Lark, Token
 
+sys.path.append(str(Path(__file__).parent.parent.joinpath('src')))
+
+from labelreader.grammars import grammars
+
 
 def main():
     ap = argparse.ArgumentParser(description='Parse a text file with the Lark grammar')
     ap.add_argument("-i", "--input", required=True, type=str,
                     help="file name for and path to input text")
-    ap.add_argument("-g", "--grammar", required=True, type=str,
-                    help="file name for and path to grammar")
+    ap.add_argument("-g", "--grammar", required=False, default=None, type=str,
+                    help="file name for and path to grammar. Default is the C-SAD grammar shipped with labelreader")
     args = vars(ap.parse_args())
 
 
-    # Read the grammar
-    gf = open(args["grammar"], "r")
-    grammar = gf.read()
-
     # Read text example to parse
     f = open(args["input"], "r")
     text = f.read()
 
-    # Create the parser
+    # Create the parser - it is cached on disk, so only the first run with a grammar is slow
     #parser = Lark(grammar, start='card', ambiguity='explicit')
-    parser = Lark(grammar, start='card')
+    if args["grammar"] is None:
+        parser = grammars.load_parser("csad.lark", start='card')
+    else:
+        gf = open(args["grammar"], "r")
+        grammar = gf.read()
+        parser = grammars.create_parser(grammar, name=Path(args["grammar"]).stem, start='card')
 
     # Parse tree
     ptree = parser.parse(text)
@@ -1,20 +1,32 @@
 import argparse
+import sys
 import cv2
-import zxingcpp
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent.joinpath('src')))
+
+from labelreader.barcode import barcode
 
 
 # construct the argument parser and parse the arguments
 ap = argparse.ArgumentParser()
 ap.add_argument("-i", "--image", required=False, default="/Users/kimstp/Documents/NHMD/data/Herbarium/NHMD-681096.jpg",
                 help="file name for and path to input image")
+ap.add_argument("-n", "--repeat", required=False, default=3, type=int,
+                help="number of repetitions used for timing")
 args = vars(ap.parse_args())
 
-img = cv2.imread(args["image"])
+img = cv2.cvtColor(cv2.imread(args["image"]), cv2.COLOR_BGR2RGB)
 
-dmcodes = zxingcpp.read_barcodes(img, formats=zxingcpp.DataMatrix)
+comparison = barcode.compare_decoding(img, repeat=args["repeat"])
+dmcodes = comparison["roi_codes"]
 
-if len(dmcodes) >0:
+if len(dmcodes) > 0:
     print("Data Matrix codes found:")
-    print(dmcodes[0].text)
+    for dmcode in dmcodes:
+        print(dmcode["text"] + " (" + dmcode["format"] + ") at " + str(dmcode["position"]))
 else:
     print("No Data Matrix codes found")
+
+print("Region of interest decoding: %.3f s" % comparison["roi_time"])
+print("Whole image decoding:        %.3f s" % comparison["full_time"])
+print("Speedup: %.1fx - same codes found: %s" % (comparison["speedup"], str(comparison["same"])))